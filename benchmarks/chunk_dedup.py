@@ -0,0 +1,108 @@
+"""
+Near-duplicate chunk detection: throughput and accuracy.
+
+Builds a synthetic corpus shaped like ours (documents re-issued as lightly
+edited versions, a shared boilerplate page, unrelated documents) and feeds it
+through fingerprint() + DedupIndex.assign() one document at a time, as
+do_ingest does. Reports fingerprinting and lookup throughput, the dedup
+ratio, and precision / recall against the known duplicates. Then it grows the
+index to --index-size random rows to show per-document latency at scale.
+
+No Weaviate or Gemini access is needed.
+
+    python -m benchmarks.chunk_dedup --docs 200 --index-size 1000000
+"""
+
+import argparse
+import random
+import tempfile
+import time
+
+import numpy as np
+
+from modules import chunk_dedup
+from modules.chunk_dedup import BANDS, NUM_PERM, DedupIndex, chunk_uuid, fingerprint
+
+WORDS = 130  # ~800 characters, the default chunk size
+
+
+def synthetic_docs(n_docs: int, chunks: int, seed: int = 0):
+    """
+    Yields (pdf_id, chunks, is_duplicate flags). A third of the documents are
+    new versions of an earlier one with a few words changed per chunk; every
+    document carries the same boilerplate chunk.
+    """
+    rng = random.Random(seed)
+    vocab = [f"w{i}" for i in range(20000)]
+    boilerplate = " ".join(rng.choices(vocab, k=WORDS))
+    originals = []
+    for d in range(n_docs):
+        if originals and rng.random() < 1 / 3:
+            base = rng.choice(originals)
+            body = []
+            for text in base:
+                words = text.split()
+                for _ in range(rng.randint(0, 3)):
+                    words[rng.randrange(len(words))] = rng.choice(vocab)
+                body.append(" ".join(words))
+            dup = [True] * len(body)
+        else:
+            body = [" ".join(rng.choices(vocab, k=WORDS)) for _ in range(chunks)]
+            originals.append(body)
+            dup = [False] * len(body)
+        yield f"pdf{d}", body + [boilerplate], dup + [d > 0]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--docs", type=int, default=200)
+    parser.add_argument("--chunks", type=int, default=40, help="chunks per document")
+    parser.add_argument("--index-size", type=int, default=1000000, help="rows for the scale test (0 to skip)")
+    args = parser.parse_args()
+
+    chunk_dedup.DEDUP_DIR = tempfile.mkdtemp()
+    index = DedupIndex("bench", "kb")
+
+    fp_s = assign_s = 0.0
+    total = tp = fp = fn = 0
+    for pdf_id, chunks, truth in synthetic_docs(args.docs, args.chunks):
+        t0 = time.perf_counter()
+        sigs = fingerprint(chunks)
+        t1 = time.perf_counter()
+        dup_of = index.assign(pdf_id, sigs, [chunk_uuid("bench", "kb", pdf_id, i) for i in range(len(chunks))])
+        index.commit(pdf_id)
+        t2 = time.perf_counter()
+        fp_s += t1 - t0
+        assign_s += t2 - t1
+        total += len(chunks)
+        for found, expected in zip(dup_of, truth):
+            tp += found is not None and expected
+            fp += found is not None and not expected
+            fn += found is None and expected
+
+    print(f"{args.docs} documents, {total} chunks")
+    print(f"fingerprint: {total / fp_s:,.0f} chunks/s   lookup + register: {total / assign_s:,.0f} chunks/s")
+    print(f"dedup ratio {index.stats()['dedup_ratio']:.1%}   "
+          f"precision {tp / max(tp + fp, 1):.3f}   recall {tp / max(tp + fn, 1):.3f}")
+
+    if args.index_size:
+        rng = np.random.default_rng(1)
+        big = DedupIndex("bench", "big")
+        step = 10000
+        t0 = time.perf_counter()
+        for start in range(0, args.index_size, step):
+            n = min(step, args.index_size - start)
+            big.assign(f"bulk{start}", rng.integers(0, 1 << 16, (n, NUM_PERM), dtype=np.uint16),
+                       [f"{start}-{i}" for i in range(n)])
+            big.commit(f"bulk{start}")
+        print(f"grew index to {big.size:,} rows in {time.perf_counter() - t0:.0f}s; "
+              f"signatures + band arrays {big.size * (NUM_PERM * 2 + BANDS * 16) / 1e6:,.0f} MB")
+
+        doc = fingerprint(next(synthetic_docs(1, args.chunks, seed=7))[1])
+        t0 = time.perf_counter()
+        big.assign("probe", doc, [f"probe-{i}" for i in range(len(doc))])
+        print(f"one {len(doc)}-chunk document against {big.size:,} rows: {(time.perf_counter() - t0) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
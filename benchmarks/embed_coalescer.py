@@ -0,0 +1,99 @@
+"""
+Query embedding with and without the coalescer (modules/embedding_gemini.py).
+
+Concurrent callers each embed one question at a time against a stubbed
+Gemini endpoint whose latency grows slowly with batch size and which allows
+a fixed number of requests per second. Reports HTTP calls, throughput,
+caller latency, batch fill rate and the queueing delay the window adds.
+
+    python -m benchmarks.embed_coalescer --callers 64 --seconds 5
+"""
+
+import argparse
+import threading
+import time
+
+import numpy as np
+
+from modules import embedding_gemini
+from modules.embedding_gemini import EmbedCoalescer
+
+
+class GeminiStub:
+    """Batch embed endpoint: base latency + per-item cost, capped at `rps` calls/s."""
+
+    def __init__(self, base_ms: float, per_item_ms: float, rps: float):
+        self.base = base_ms / 1000
+        self.per_item = per_item_ms / 1000
+        self.interval = 1 / rps
+        self.calls = 0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def embed_batch(self, texts, tenant_id=None):
+        with self._lock:
+            self.calls += 1
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        time.sleep(start - now + self.base + self.per_item * len(texts))
+        return [[0.0] * 8 for _ in texts]
+
+
+def run(embed, callers: int, seconds: float, tenants: int):
+    latencies = []
+    lock = threading.Lock()
+    deadline = time.monotonic() + seconds
+
+    def caller(i):
+        n = 0
+        local = []
+        while time.monotonic() < deadline:
+            t0 = time.perf_counter()
+            embed(f"question {i} {n}", f"tenant{i % tenants}")
+            local.append(time.perf_counter() - t0)
+            n += 1
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=caller, args=(i,)) for i in range(callers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return np.asarray(latencies) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--callers", type=int, default=64)
+    parser.add_argument("--tenants", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--window-ms", type=float, default=5)
+    parser.add_argument("--max-items", type=int, default=64)
+    parser.add_argument("--base-ms", type=float, default=40, help="stub latency per call")
+    parser.add_argument("--per-item-ms", type=float, default=0.3, help="stub latency per text")
+    parser.add_argument("--rps", type=float, default=200, help="stub calls per second")
+    args = parser.parse_args()
+
+    for label in ("direct", "coalesced"):
+        stub = GeminiStub(args.base_ms, args.per_item_ms, args.rps)
+        embedding_gemini._embed_batch = stub.embed_batch
+        if label == "direct":
+            coalescer = None
+            embed = lambda text, tenant: stub.embed_batch([text], tenant)[0]
+        else:
+            coalescer = EmbedCoalescer(args.window_ms, args.max_items)
+            embed = coalescer.embed
+        lat = run(embed, args.callers, args.seconds, args.tenants)
+        p50, p99 = np.percentile(lat, [50, 99])
+        print(f"{label:<10} {len(lat) / args.seconds:8.0f} embeds/s  {stub.calls / args.seconds:6.0f} calls/s  "
+              f"latency p50 {p50:6.1f} ms  p99 {p99:6.1f} ms")
+        if coalescer:
+            s = coalescer.stats()
+            print(f"{'':<10} avg batch {s['avg_batch']:.1f} (fill rate {s['fill_rate']:.0%}), "
+                  f"queue delay p50 {s['queue_delay_ms_p50']:.1f} ms  p99 {s['queue_delay_ms_p99']:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
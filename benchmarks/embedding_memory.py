@@ -0,0 +1,87 @@
+"""
+Memory and parse time of embeddings for one large document: nested Python
+lists from json (the old embed_texts result) vs the float32 array that
+embed_texts_batched now parses each response into.
+
+Responses are synthetic batchEmbedContents bodies, formatted the way Gemini
+returns them (indented JSON, 100 vectors per body). Peak and retained
+memory are measured with tracemalloc, parse speed in an untraced run.
+
+    python -m benchmarks.embedding_memory --chunks 20000
+"""
+
+import argparse
+import json
+import time
+import tracemalloc
+
+import numpy as np
+
+from modules.embedding_gemini import BATCH_LIMIT, MODEL_DIM, _empty, _parse_vectors
+
+
+def synthetic_bodies(count: int, dim: int, batch: int) -> list:
+    rng = np.random.default_rng(0)
+    bodies = []
+    for _ in range(count):
+        vecs = rng.normal(0, 1 / np.sqrt(dim), (batch, dim))
+        body = {"embeddings": [{"values": [float(f"{x:.9f}") for x in v]} for v in vecs]}
+        bodies.append(json.dumps(body, indent=2).encode())
+    return bodies
+
+
+def legacy(bodies: list, chunks: int, batch: int):
+    out = []
+    for start in range(0, chunks, batch):
+        body = bodies[(start // batch) % len(bodies)]
+        out.extend(e.get("values", []) for e in json.loads(body)["embeddings"])
+    return out
+
+
+def arrays(bodies: list, chunks: int, batch: int):
+    out = _empty(chunks)
+    for start in range(0, chunks, batch):
+        body = bodies[(start // batch) % len(bodies)]
+        _parse_vectors(body, batch, out[start:start + batch])
+    return out
+
+
+def measure(fn, *args):
+    # Timed without tracing; tracemalloc slows allocation-heavy code far more
+    t0 = time.perf_counter()
+    fn(*args)
+    seconds = time.perf_counter() - t0
+
+    tracemalloc.start()
+    result = fn(*args)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, seconds, retained, peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=20000, help="chunks in the synthetic document")
+    parser.add_argument("--dim", type=int, default=MODEL_DIM)
+    args = parser.parse_args()
+
+    batch = BATCH_LIMIT
+    chunks = args.chunks // batch * batch
+    bodies = synthetic_bodies(8, args.dim, batch)
+    print(f"{chunks} chunks x {args.dim} dims, {len(bodies[0]) / 1e3:.0f} KB per {batch}-vector response")
+
+    rows = []
+    for label, fn in (("json lists", legacy), ("float32 array", arrays)):
+        result, seconds, retained, peak = measure(fn, bodies, chunks, batch)
+        rows.append((label, result))
+        print(f"{label:<14} retained {retained / 1e6:8.1f} MB ({retained / chunks / 1e3:5.1f} KB/chunk)  "
+              f"peak {peak / 1e6:8.1f} MB  parse {chunks / seconds:8,.0f} vectors/s")
+
+    # Same vectors either way (the array rows are normalized, the lists are not)
+    ref = np.asarray(rows[0][1][:batch], dtype=np.float32)
+    ref /= np.linalg.norm(ref, axis=1, keepdims=True)
+    print(f"max abs difference: {np.abs(ref - rows[1][1][:batch]).max():.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Entity-linking latency: Aho-Corasick over KG labels vs question length.
+
+Builds a KGIndex with --labels synthetic multi-word labels, then links
+questions that mention a few of them among ordinary words. Reports compile
+time and per-question latency, and fails (exit 1) if p99 exceeds the budget.
+
+    python -m benchmarks.entity_linking --labels 100000 --budget-us 1000
+"""
+
+import argparse
+import random
+import sys
+import time
+
+import numpy as np
+
+from modules.entity_linker import link_entities
+from modules.kg_index import KGIndex
+
+FILLER = ("what is the relation between and how does work for in which year did "
+          "who founded where located compare").split()
+
+
+def synthetic_index(n_labels: int, seed: int = 0):
+    rng = random.Random(seed)
+    vocab = [f"w{i}" for i in range(20000)]
+    labels = set()
+    while len(labels) < n_labels:
+        labels.add(" ".join(rng.choices(vocab, k=rng.randint(1, 4))))
+    labels = sorted(labels)
+    index = KGIndex()
+    nodes = [{"id": f"n{i}", "label": label, "type": "X"} for i, label in enumerate(labels)]
+    edges = [{"source": f"n{rng.randrange(len(labels))}", "target": f"n{rng.randrange(len(labels))}",
+              "relation": "related_to"} for _ in range(len(labels) * 2)]
+    index.add("bench", nodes, edges)
+    return index, labels
+
+
+def questions(labels: list, n: int, words: int, seed: int = 1) -> list:
+    rng = random.Random(seed)
+    out = []
+    for _ in range(n):
+        parts = rng.choices(FILLER, k=words)
+        for label in rng.sample(labels, 2):
+            parts.insert(rng.randrange(len(parts) + 1), label)
+        out.append(" ".join(parts).capitalize() + "?")
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--labels", type=int, default=100000)
+    parser.add_argument("--questions", type=int, default=2000)
+    parser.add_argument("--words", type=int, default=20, help="filler words per question")
+    parser.add_argument("--budget-us", type=float, default=1000.0, help="p99 budget per question")
+    args = parser.parse_args()
+
+    index, labels = synthetic_index(args.labels)
+    qs = questions(labels, args.questions, args.words)
+
+    t0 = time.perf_counter()
+    link_entities(index, qs[0])
+    print(f"{len(labels)} labels, automaton compiled in {time.perf_counter() - t0:.2f}s")
+
+    lat = np.empty(len(qs))
+    linked = 0
+    for i, q in enumerate(qs):
+        t0 = time.perf_counter()
+        linked += len(link_entities(index, q))
+        lat[i] = time.perf_counter() - t0
+    p50, p99 = np.percentile(lat, 50) * 1e6, np.percentile(lat, 99) * 1e6
+    print(f"{len(qs)} questions, {linked / len(qs):.1f} entities linked each: "
+          f"p50 {p50:.0f} µs, p99 {p99:.0f} µs (budget {args.budget_us:.0f} µs)")
+
+    if p99 > args.budget_us:
+        print("FAIL: entity linking exceeds the per-question budget")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
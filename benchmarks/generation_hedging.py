@@ -0,0 +1,107 @@
+"""
+Hedged generation and the query latency budget against a Gemini stub with
+injected tail latency.
+
+The stub answers in a lognormal time around --base-ms, except that a
+--tail-rate share of requests stalls for --tail-ms (an overloaded replica,
+a slow connection). It honours the request timeout like requests does.
+Retrieval is stubbed out; each question goes through answer_query with the
+given --budget, so a question whose generation misses the budget comes back
+as the top-passages fallback.
+
+Reports latency percentiles, fallback answers and extra requests sent, with
+hedging off and at each --percentiles value.
+
+    python -m benchmarks.generation_hedging --queries 400 --tail-rate 0.05
+"""
+
+import argparse
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+from modules import generator_gemini, rate_limiter
+from pipelines import querying
+
+
+class TailLatencyStub:
+    def __init__(self, base_ms: float, tail_ms: float, tail_rate: float, seed: int = 0):
+        self.base = base_ms / 1000
+        self.tail = tail_ms / 1000
+        self.tail_rate = tail_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.requests = 0
+
+    def post(self, payload: dict, timeout: float = 60) -> dict:
+        with self._lock:
+            self.requests += 1
+            slow = self._rng.random() < self.tail_rate
+            latency = self.tail if slow else self.base * self._rng.lognormvariate(0, 0.25)
+        if latency > timeout:
+            time.sleep(timeout)
+            raise requests.exceptions.ReadTimeout(f"Read timed out. (read timeout={timeout:.3f})")
+        time.sleep(latency)
+        return {"candidates": [{"content": {"parts": [{"text": "stub answer"}]}}]}
+
+
+def install_stubs(stub: TailLatencyStub):
+    generator_gemini._post = stub.post
+    # Unthrottled: this measures tail latency, not quota
+    rate_limiter._LIMITERS["generate"] = rate_limiter.AdaptiveRateLimiter(max_rate=1e6)
+    querying.embed_query = lambda text, tenant_id=None: None
+    querying.query_embeddings = lambda q_emb, top_k=5, tenant_id=None: [
+        {"text": f"stub passage {i}"} for i in range(top_k)]
+    querying.kg_facts = lambda *args, **kwargs: []
+    querying.log_query = lambda *args, **kwargs: None
+
+
+def run(queries: int, concurrency: int, budget: float) -> tuple:
+    def one(_):
+        t0 = time.perf_counter()
+        answer = querying.answer_query("what?", "bench", budget=budget)
+        return time.perf_counter() - t0, answer.startswith("No answer could be generated in time")
+
+    with ThreadPoolExecutor(max_workers=concurrency) as ex:
+        results = list(ex.map(one, range(queries)))
+    return np.asarray([r[0] for r in results]) * 1000, sum(r[1] for r in results)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--queries", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--base-ms", type=float, default=200, help="median generation latency")
+    parser.add_argument("--tail-ms", type=float, default=5000, help="latency of a stalled request")
+    parser.add_argument("--tail-rate", type=float, default=0.05, help="share of requests that stall")
+    parser.add_argument("--budget", type=float, default=2.0, help="seconds per question")
+    parser.add_argument("--percentiles", default="95,90", help="hedging percentiles to compare")
+    args = parser.parse_args()
+
+    print(f"{args.queries} questions, {args.concurrency} concurrent, generation {args.base_ms:.0f} ms median, "
+          f"{args.tail_rate:.0%} stall for {args.tail_ms:.0f} ms, budget {args.budget:.1f} s")
+    print(f"{'hedging':<12}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}{'fallback':>10}"
+          f"{'hedged':>8}{'won':>6}{'extra req':>11}")
+
+    for label in ["off"] + [f"p{p}" for p in args.percentiles.split(",")]:
+        stub = TailLatencyStub(args.base_ms, args.tail_ms, args.tail_rate)
+        install_stubs(stub)
+        generator_gemini.HEDGE_PERCENTILE = 0 if label == "off" else float(label[1:])
+        generator_gemini.LATENCY = generator_gemini._LatencyTracker()
+        # Seed the latency history so hedging starts from a real percentile
+        for _ in range(generator_gemini.HEDGE_MIN_SAMPLES):
+            generator_gemini.LATENCY.record(args.base_ms / 1000 * random.lognormvariate(0, 0.25))
+
+        lat, fallbacks = run(args.queries, args.concurrency, args.budget)
+        stats = generator_gemini.LATENCY.stats
+        p50, p95, p99 = np.percentile(lat, [50, 95, 99])
+        print(f"{label:<12}{p50:>9.0f}{p95:>9.0f}{p99:>9.0f}{lat.max():>9.0f}{fallbacks:>10}"
+              f"{stats['hedged']:>8}{stats['hedge_wins']:>6}{stub.requests / args.queries - 1:>11.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+KB snapshot export / import throughput (pipelines/snapshot.py).
+
+By default Weaviate is replaced by an in-memory KB of --chunks chunks and
+--nodes / --edges graph objects with --dim vectors: the cursor pages come
+from that, and import batches are JSON-encoded as for the REST call, then
+dropped. This measures the client side (JSONL / npy I/O, batch encoding);
+time spent producing the stub pages is measured on its own and left out.
+The snapshot is compared with plain JSONL carrying the vectors inline.
+
+With --live the tenant's KB is exported from Weaviate and imported back as
+a new KB, which is purged and deleted afterwards.
+
+    python -m benchmarks.kb_snapshot --chunks 20000 --dim 768
+    python -m benchmarks.kb_snapshot --live --tenant <tenant> --kb <kb_id>
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+import uuid
+
+import numpy as np
+
+from modules import chunk_writer, kg_store
+from pipelines import snapshot
+
+_WORDS = ("the quarterly report describes steady growth in regional markets and new supply contracts "
+          "analysts noted that operating costs fell while investment in research continued").split()
+
+
+class StubKB:
+    def __init__(self, chunks: int, nodes: int, edges: int, dim: int, seed: int = 0):
+        rng = np.random.default_rng(seed)
+        words = random.Random(seed)
+        self.tenant_id, self.kb_id = "bench", str(uuid.uuid4())
+        self.dim = dim
+        self.vectors = {"DocumentChunk": rng.standard_normal((chunks, dim), dtype=np.float32),
+                        "KG_Node": rng.standard_normal((nodes, dim), dtype=np.float32)}
+        scope = {"tenant_id": self.tenant_id, "kb_id": self.kb_id}
+        pdf_ids = [str(uuid.uuid4()) for _ in range(max(1, chunks // 200))]
+        self.objects = {
+            "DocumentChunk": [{"text": " ".join(words.choices(_WORDS, k=130)), "pdf_id": words.choice(pdf_ids),
+                               **scope} for _ in range(chunks)],
+            "KG_Node": [{"node_id": f"ent_{i:016x}", "label": f"Entity {i}", "type": "Organization",
+                         "pdf_id": words.choice(pdf_ids), "pdf_name": "report.pdf", **scope}
+                        for i in range(nodes)],
+            "KG_Edge": [{"source": f"ent_{words.randrange(nodes):016x}", "target": f"ent_{words.randrange(nodes):016x}",
+                         "relation": "related_to", "pdf_id": words.choice(pdf_ids), "pdf_name": "report.pdf",
+                         **scope} for _ in range(edges)],
+        }
+        self.ids = {c: [str(uuid.uuid4()) for _ in objs] for c, objs in self.objects.items()}
+        self.posted = 0
+
+    def iter_objects(self, class_name, properties, with_vector=False, page_size=500):
+        # Fresh dicts with list vectors, like the client's parsed JSON
+        vectors = self.vectors.get(class_name)
+        for i, obj in enumerate(self.objects[class_name]):
+            extra = {"id": self.ids[class_name][i]}
+            if with_vector:
+                extra["vector"] = vectors[i].tolist()
+            yield {**obj, "_additional": extra}
+
+    def post(self, objects):
+        json.dumps({"objects": objects})
+        self.posted += len(objects)
+        return [None] * len(objects), 0.001
+
+    def install(self):
+        snapshot.iter_objects = self.iter_objects
+        snapshot.count_where = lambda class_name, where=None: len(self.objects[class_name])
+        snapshot.class_exists = lambda class_name: True
+        snapshot.class_properties = lambda class_name: list(self.objects[class_name][0])
+        snapshot.list_kb = lambda tenant_id: {self.kb_id: {"kb_name": "bench"}}
+        snapshot.list_documents = lambda tenant_id, kb_id: {}
+        snapshot.create_kb = lambda tenant_id, name: str(uuid.uuid4())
+        snapshot.set_documents = lambda *args: True
+        snapshot.create_schema = lambda: None
+        kg_store.create_kg_schema = lambda: None
+        chunk_writer.ChunkWriter._post = self.post
+
+    def source_seconds(self) -> float:
+        t0 = time.perf_counter()
+        for class_name, _ in snapshot.SNAPSHOT_CLASSES:
+            for _ in self.iter_objects(class_name, None, with_vector=class_name in self.vectors):
+                pass
+        return time.perf_counter() - t0
+
+    def write_inline_jsonl(self, path: str) -> tuple:
+        """The same objects as JSONL with the vectors inline. Returns (bytes, seconds)."""
+        t0 = time.perf_counter()
+        with open(path, "w") as f:
+            for class_name, _ in snapshot.SNAPSHOT_CLASSES:
+                for obj in self.iter_objects(class_name, None, with_vector=class_name in self.vectors):
+                    f.write(json.dumps(obj) + "\n")
+        return os.path.getsize(path), time.perf_counter() - t0 - self.source_seconds()
+
+
+def _row(label: str, nbytes: int, objects: int, seconds: float) -> str:
+    return (f"{label:<22}{nbytes / 1e6:>10.1f}{objects:>10}{seconds:>9.2f}"
+            f"{nbytes / 1e6 / seconds:>9.1f}{objects / seconds:>12,.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--nodes", type=int, default=5000)
+    parser.add_argument("--edges", type=int, default=10000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--live", action="store_true", help="export / import a real KB through Weaviate")
+    parser.add_argument("--tenant", type=str, default=None)
+    parser.add_argument("--kb", type=str, default=None)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="kb-snapshot-")
+    try:
+        out_dir = os.path.join(workdir, "snap")
+        if args.live:
+            if not args.tenant or not args.kb:
+                parser.error("--live needs --tenant and --kb")
+            tenant_id, kb_id, source = args.tenant, args.kb, 0.0
+        else:
+            stub = StubKB(args.chunks, args.nodes, args.edges, args.dim)
+            stub.install()
+            tenant_id, kb_id = stub.tenant_id, stub.kb_id
+            source = stub.source_seconds()
+
+        exported = snapshot.export_kb(tenant_id, kb_id, out_dir)
+        objects = sum(e["count"] for e in exported["classes"].values())
+        nbytes = sum(exported["files"].values())
+        export_seconds = exported["seconds"] - source
+
+        imported = snapshot.import_kb(out_dir, tenant_id, kb_name="snapshot benchmark copy")
+        import_seconds = imported["seconds"]
+
+        print(f"{objects} objects (" + ", ".join(f"{e['count']} {c}" for c, e in exported["classes"].items())
+              + ")" + ("" if args.live else f", {args.dim}-d vectors, in-memory Weaviate stub"))
+        print(f"{'':<22}{'MB':>10}{'objects':>10}{'seconds':>9}{'MB/s':>9}{'objects/s':>12}")
+        print(_row("export", nbytes, objects, export_seconds))
+        print(_row("import", nbytes, sum(imported["classes"].values()), import_seconds))
+        if not args.live:
+            inline_bytes, inline_seconds = stub.write_inline_jsonl(os.path.join(workdir, "inline.jsonl"))
+            print(_row("JSONL, inline vectors", inline_bytes, objects, inline_seconds)
+                  + f"   ({inline_bytes / nbytes:.1f}x the snapshot size)")
+        else:
+            from modules.knowledge_base_manager import delete_kb
+            snapshot.purge_kb(tenant_id, imported["kb_id"])
+            delete_kb(tenant_id, imported["kb_id"])
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
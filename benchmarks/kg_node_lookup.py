@@ -0,0 +1,108 @@
+"""
+KG node lookup: latency and hit@k of the ways query_kg can find nodes.
+
+Samples node labels from a live KB, derives query variants from them
+(exact, a typo, shuffled word order, lower-cased without the last word) and
+checks whether the source node comes back in the top k for:
+  - near_text on KG_Node (the previous query_kg; KG_Node has no vectorizer),
+  - label match in the in-memory graph index,
+  - near_vector over the embedded node labels (the term embedded once).
+
+Needs Weaviate, GEMINI_API_KEY and a KB ingested with node vectors.
+
+    python -m benchmarks.kg_node_lookup --tenant <tenant> --kb <kb_id> --samples 200
+"""
+
+import argparse
+import random
+import time
+
+import numpy as np
+
+from modules.embedding_gemini import embed_texts_batched
+from modules.kg_index import get_kg_index
+from modules.kg_store import search_nodes
+from modules.store_weaviate import get_client
+
+
+def variants(label: str, rng: random.Random) -> dict:
+    words = label.split()
+    out = {"exact": label}
+    if len(label) > 4:
+        i = rng.randrange(1, len(label) - 2)
+        out["typo"] = label[:i] + label[i + 1] + label[i] + label[i + 2:]
+    if len(words) > 1:
+        shuffled = words[:]
+        while shuffled == words:
+            rng.shuffle(shuffled)
+        out["reordered"] = " ".join(shuffled)
+        out["partial"] = " ".join(words[:-1]).lower()
+    return out
+
+
+def near_text(term: str, tenant_id: str, k: int):
+    client = get_client()
+    res = (
+        client.query.get("KG_Node", ["node_id", "pdf_id"])
+        .with_where({"path": ["tenant_id"], "operator": "Equal", "valueString": tenant_id})
+        .with_near_text({"concepts": [term]})
+        .with_limit(k)
+        .do()
+    )
+    if res.get("errors"):
+        raise RuntimeError(res["errors"][0].get("message"))
+    return res.get("data", {}).get("Get", {}).get("KG_Node") or []
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tenant", required=True)
+    parser.add_argument("--kb", required=True)
+    parser.add_argument("--samples", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    index = get_kg_index(args.tenant, args.kb)
+    picks = rng.sample(range(len(index.keys)), min(args.samples, len(index.keys)))
+    cases = [(i, kind, q) for i in picks for kind, q in variants(index.labels[i], rng).items()]
+    print(f"{len(picks)} nodes, {len(cases)} queries, hit@{args.k}")
+
+    t0 = time.perf_counter()
+    vectors = embed_texts_batched([q for _, _, q in cases], tenant_id=args.tenant)
+    print(f"query embedding: {(time.perf_counter() - t0) / len(cases) * 1000:.1f} ms/query (batched)")
+
+    def by_index(q, _):
+        return index.lookup(q, limit=args.k)
+
+    def by_vector(_, vec):
+        hits = search_nodes(vec, args.tenant, args.kb, limit=args.k)
+        return [index.find(h["pdf_id"], h["node_id"]) for h in hits]
+
+    def by_near_text(q, _):
+        hits = near_text(q, args.tenant, args.k)
+        return [index.find(h["pdf_id"], h["node_id"]) for h in hits]
+
+    print(f"{'method':<14} {'variant':<10} {'hit@k':>6} {'p50 ms':>8} {'p95 ms':>8} {'errors':>7}")
+    for name, fn in (("near_text", by_near_text), ("label index", by_index), ("near_vector", by_vector)):
+        stats = {}
+        for (i, kind, q), vec in zip(cases, vectors):
+            s = stats.setdefault(kind, {"hits": 0, "n": 0, "lat": [], "errors": 0})
+            s["n"] += 1
+            t0 = time.perf_counter()
+            try:
+                found = fn(q, vec)
+            except Exception:
+                s["errors"] += 1
+                continue
+            s["lat"].append(time.perf_counter() - t0)
+            # Any node with the same label counts: duplicates across documents are equally right
+            s["hits"] += any(j is not None and index.labels[j].lower() == index.labels[i].lower() for j in found)
+        for kind, s in stats.items():
+            lat = np.asarray(s["lat"] or [float("nan")]) * 1000
+            print(f"{name:<14} {kind:<10} {s['hits'] / s['n']:>6.2f} {np.percentile(lat, 50):>8.2f} "
+                  f"{np.percentile(lat, 95):>8.2f} {s['errors']:>7}")
+
+
+if __name__ == "__main__":
+    main()
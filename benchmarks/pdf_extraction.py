@@ -0,0 +1,181 @@
+"""
+PDF text extraction backends (modules/pdf_reader.py): pages/sec and text
+fidelity on generated PDFs with known text.
+
+Documents are written directly as PDF (Helvetica, no extra dependencies),
+with four page layouts:
+  plain    one column of running text
+  columns  two columns, drawn line by line across both; read left column, then right
+  table    ruled grid with a word or number per cell, drawn column by column; read row by row
+  mixed    a paragraph above a small ruled table
+
+Fidelity is difflib's ratio between the true and extracted word sequences,
+so it penalizes both lost words and wrong reading order. "auto" is the
+per-page routing read_pdf uses by default, "auto:document" one choice per file.
+
+    python -m benchmarks.pdf_extraction --docs 20 --pages 10
+"""
+
+import argparse
+import difflib
+import os
+import random
+import tempfile
+import time
+
+from modules import pdf_reader
+
+_WORDS = ("retrieval vector index graph entity query answer chunk tenant embedding latency "
+          "throughput document knowledge batch cache shard replica budget token window").split()
+
+PAGE_W, PAGE_H, MARGIN, LEADING = 612, 792, 72, 14
+
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _text(x: float, y: float, line: str, size: int = 10) -> str:
+    return f"BT /F1 {size} Tf {x:.1f} {y:.1f} Td ({_escape(line)}) Tj ET"
+
+
+def _sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(_WORDS) for _ in range(words))
+
+
+def _plain(rng):
+    ops, truth, y = [], [], PAGE_H - MARGIN
+    while y > MARGIN:
+        line = _sentence(rng, 11)
+        ops.append(_text(MARGIN, y, line))
+        truth.append(line)
+        y -= LEADING
+    return ops, truth
+
+
+def _columns(rng):
+    # Drawn line by line across both columns, as many producers do, so
+    # content-stream order is not reading order
+    col_w = (PAGE_W - 2 * MARGIN - 24) / 2
+    lines = int((PAGE_H - 2 * MARGIN) / LEADING)
+    left = [_sentence(rng, 5) for _ in range(lines)]
+    right = [_sentence(rng, 5) for _ in range(lines)]
+    ops = []
+    for i in range(lines):
+        y = PAGE_H - MARGIN - i * LEADING
+        ops.append(_text(MARGIN, y, left[i]))
+        ops.append(_text(MARGIN + col_w + 24, y, right[i]))
+    return ops, left + right
+
+
+def _table(rng, rows: int = 20, cols: int = 5, top: float = PAGE_H - MARGIN):
+    ops, truth = [], []
+    cell_w, cell_h = (PAGE_W - 2 * MARGIN) / cols, 22
+    for r in range(rows + 1):
+        y = top - r * cell_h
+        ops.append(f"{MARGIN} {y:.1f} m {PAGE_W - MARGIN} {y:.1f} l S")
+    for c in range(cols + 1):
+        x = MARGIN + c * cell_w
+        ops.append(f"{x:.1f} {top:.1f} m {x:.1f} {top - rows * cell_h:.1f} l S")
+    grid = [[rng.choice(_WORDS) if c == 0 else str(rng.randint(0, 99999)) for c in range(cols)]
+            for _ in range(rows)]
+    # Filled in column by column; read row by row
+    for c in range(cols):
+        for r in range(rows):
+            ops.append(_text(MARGIN + c * cell_w + 4, top - (r + 1) * cell_h + 7, grid[r][c]))
+    truth = [" ".join(row) for row in grid]
+    return ops, truth
+
+
+def _mixed(rng):
+    ops, truth, y = [], [], PAGE_H - MARGIN
+    for _ in range(15):
+        line = _sentence(rng, 11)
+        ops.append(_text(MARGIN, y, line))
+        truth.append(line)
+        y -= LEADING
+    table_ops, table_truth = _table(rng, rows=10, cols=4, top=y - 20)
+    return ops + table_ops, truth + table_truth
+
+
+LAYOUTS = {"plain": _plain, "columns": _columns, "table": _table, "mixed": _mixed}
+
+
+def write_pdf(path: str, pages: list):
+    """pages: list of content-stream operator lists."""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None,
+               "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>"]
+    kids = []
+    for ops in pages:
+        stream = "\n".join(ops).encode("latin-1")
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n".encode("latin-1") + stream + b"\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_W} {PAGE_H}] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>")
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, obj in enumerate(objects, start=1):
+        offsets.append(len(out))
+        body = obj if isinstance(obj, bytes) else obj.encode("latin-1")
+        out += f"{i} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += b"".join(f"{o:010d} 00000 n \n".encode() for o in offsets)
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+def generate(directory: str, docs: int, pages: int, seed: int = 0) -> list:
+    """[(path, [(layout, true text)] per page)]; each document mixes layouts."""
+    rng = random.Random(seed)
+    corpus = []
+    for d in range(docs):
+        layouts = [rng.choice(list(LAYOUTS)) for _ in range(pages)]
+        built = [LAYOUTS[name](rng) for name in layouts]
+        path = os.path.join(directory, f"doc{d}.pdf")
+        write_pdf(path, [ops for ops, _ in built])
+        corpus.append((path, [(name, " ".join(truth)) for name, (_, truth) in zip(layouts, built)]))
+    return corpus
+
+
+def fidelity(truth: str, text: str) -> float:
+    return difflib.SequenceMatcher(None, truth.split(), text.split(), autojunk=False).ratio()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--docs", type=int, default=20)
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--backends",
+                        default=",".join(pdf_reader.available_backends() + ["auto", "auto:document"]))
+    args = parser.parse_args()
+
+    corpus = generate(tempfile.mkdtemp(), args.docs, args.pages)
+    total_pages = args.docs * args.pages
+    print(f"{args.docs} documents x {args.pages} pages; backends installed: "
+          f"{', '.join(pdf_reader.available_backends())}")
+    print(f"{'backend':<12}{'pages/s':>9}" + "".join(f"{name:>9}" for name in LAYOUTS) + f"{'overall':>9}   routed to")
+
+    for backend in args.backends.split(","):
+        scores = {name: [] for name in LAYOUTS}
+        used = {}
+        t0 = time.perf_counter()
+        name, _, routing = backend.partition(":")
+        results = [pdf_reader.extract_pages(path, name, routing or None) for path, _ in corpus]
+        seconds = time.perf_counter() - t0
+        for (_, truth_pages), pages in zip(corpus, results):
+            for (layout, truth), (text, used_by) in zip(truth_pages, pages):
+                scores[layout].append(fidelity(truth, text))
+                used[used_by] = used.get(used_by, 0) + 1
+        means = {k: sum(v) / len(v) if v else float("nan") for k, v in scores.items()}
+        overall = sum(sum(v) for v in scores.values()) / total_pages
+        routed = ", ".join(f"{k} {v}" for k, v in sorted(used.items())) if name == "auto" else ""
+        print(f"{backend:<12}{total_pages / seconds:>9.1f}" + "".join(f"{means[k]:>9.3f}" for k in LAYOUTS)
+              + f"{overall:>9.3f}   {routed}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Simulation of the adaptive Gemini rate limiter against a local quota stub.
+
+The stub enforces a hard requests/sec quota and answers 429 past it, like the
+Gemini API does. The limiter is deliberately configured above the quota, so it
+has to find the real limit from 429 feedback. Reports sustained throughput as a
+fraction of quota, 429 counts and each tenant's share.
+
+    python -m benchmarks.rate_limiter_sim --quota 50 --seconds 10
+"""
+
+import argparse
+import threading
+import time
+from collections import Counter
+
+from modules.rate_limiter import AdaptiveRateLimiter, RateLimitedError
+
+
+class QuotaExceeded(Exception):
+    code = 429
+
+
+class QuotaStub:
+    """Server side: token bucket of `quota` req/s with a one-second burst."""
+
+    def __init__(self, quota: float, latency: float = 0.02):
+        self.quota = quota
+        self.latency = latency
+        self._tokens = quota
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+        self.accepted = 0
+        self.rejected = 0
+
+    def request(self):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.quota, self._tokens + (now - self._last) * self.quota)
+            self._last = now
+            ok = self._tokens >= 1
+            if ok:
+                self._tokens -= 1
+                self.accepted += 1
+            else:
+                self.rejected += 1
+        time.sleep(self.latency)
+        if not ok:
+            raise QuotaExceeded("429 RESOURCE_EXHAUSTED")
+        return "ok"
+
+
+def run(quota: float, seconds: float, overshoot: float, tenants: dict):
+    stub = QuotaStub(quota)
+    limiter = AdaptiveRateLimiter(max_rate=quota * overshoot)
+    served = Counter()
+    failed = Counter()
+    stop = time.monotonic() + seconds
+    # Skip the first seconds so the number reflects steady state, not the initial probe
+    warmup_end = time.monotonic() + min(2.0, seconds / 4)
+    steady = Counter()
+
+    def client(tenant):
+        while time.monotonic() < stop:
+            try:
+                limiter.call(stub.request, tenant_id=tenant, timeout=max(0.0, stop - time.monotonic()))
+            except RateLimitedError:
+                failed[tenant] += 1
+                continue
+            served[tenant] += 1
+            if time.monotonic() >= warmup_end:
+                steady[tenant] += 1
+
+    threads = [
+        threading.Thread(target=client, args=(tenant,))
+        for tenant, n in tenants.items() for _ in range(n)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    steady_seconds = seconds - min(2.0, seconds / 4)
+    throughput = sum(steady.values()) / steady_seconds
+    print(f"quota               : {quota:.1f} req/s (limiter starts at {quota * overshoot:.1f})")
+    print(f"steady throughput   : {throughput:.1f} req/s ({throughput / quota:.0%} of quota)")
+    print(f"stub 429 responses  : {stub.rejected} ({stub.rejected / max(1, stub.accepted):.1%} of accepted)")
+    print(f"calls given up      : {sum(failed.values())}")
+    print(f"final limiter rate  : {limiter.rate:.1f} req/s")
+    total = sum(served.values()) or 1
+    for tenant, n in tenants.items():
+        print(f"  tenant {tenant:<8} threads={n:<3} share={served[tenant] / total:.0%}")
+    return throughput / quota
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--quota", type=float, default=50.0)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--overshoot", type=float, default=2.0, help="limiter max rate as a multiple of quota")
+    args = parser.parse_args()
+    run(args.quota, args.seconds, args.overshoot, {"bulk": 12, "medium": 4, "light": 1})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""
+Load test for the HTTP server (modules/server.py) against stubbed backends.
+
+Gemini (embedding, generation, streamed generation), Weaviate search and the
+ingest pipeline itself are replaced by sleeps of configurable latency, so the
+numbers show what the server adds: auth, thread-pool hand-off, SSE streaming,
+upload handling and the job queue. Registry / monitor files go to a temp dir.
+
+Clients keep one connection pool each and loop over a weighted mix of
+requests for the given duration. Reports throughput and latency percentiles
+per request kind (time to first token for streamed answers).
+
+    python -m benchmarks.server_load --clients 64 --seconds 20
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import threading
+import time
+
+import aiohttp
+import numpy as np
+from aiohttp import web
+
+from modules import embedding_gemini, knowledge_base_manager, server, worker
+from pipelines import monitor, querying
+
+
+def install_stubs(embed_ms: float, search_ms: float, generate_ms: float, ingest_ms: float, pieces: int):
+    tmp = tempfile.mkdtemp()
+    knowledge_base_manager.KB_FILE = os.path.join(tmp, "knowledge_bases.json")
+    monitor.MONITOR_FILE = os.path.join(tmp, "monitor_data.json")
+    server.UPLOAD_DIR = os.path.join(tmp, "uploads")
+
+    def embed_batch(texts, tenant_id=None):
+        time.sleep(embed_ms / 1000)
+        return [[0.0] * 8 for _ in texts]
+
+    def search(q_emb, top_k=5, tenant_id=None):
+        time.sleep(search_ms / 1000)
+        return [{"text": "stub passage " * 40} for _ in range(top_k)]
+
+    def generate(prompt, tenant_id=None, deadline=None):
+        time.sleep(generate_ms / 1000)
+        return "stub answer " * pieces
+
+    def generate_stream(prompt, tenant_id=None, deadline=None):
+        for _ in range(pieces):
+            time.sleep(generate_ms / 1000 / pieces)
+            yield "stub answer "
+
+    def ingest(path, tenant_id, kb_id=None, pdf_id=None, content_hash=None, **kwargs):
+        time.sleep(ingest_ms / 1000)
+        return {"chunks": 10, "kb_id": kb_id, "pdf_id": pdf_id}
+
+    # Stubbed below the query coalescer, so it still batches concurrent questions
+    embedding_gemini._embed_batch = embed_batch
+    embedding_gemini._embed_single = lambda text, tenant_id=None: embed_batch([text])[0]
+    querying.query_embeddings = search
+    querying.generate_answer = generate
+    querying.generate_answer_stream = generate_stream
+    querying.kg_facts = lambda *args, **kwargs: []
+    worker.do_ingest = ingest
+    server.verify_tenant = lambda tenant_id, password: True
+
+
+def start_server(port: int, workers: int):
+    """Runs the app on its own event loop thread, like a separate process would."""
+    ready = threading.Event()
+
+    def run():
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        runner = web.AppRunner(server.create_app(), access_log=None)
+        loop.run_until_complete(runner.setup())
+        loop.run_until_complete(web.TCPSite(runner, "127.0.0.1", port).start())
+        ready.set()
+        loop.run_forever()
+
+    worker.start_worker(workers)
+    threading.Thread(target=run, daemon=True).start()
+    ready.wait()
+
+
+async def client(base: str, tenant: str, mix: list, deadline: float, samples: dict):
+    kinds, weights = zip(*mix)
+    async with aiohttp.ClientSession() as http:
+        async with http.post(f"{base}/login", json={"tenant_id": tenant, "password": "x"}) as r:
+            token = (await r.json())["token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        async with http.post(f"{base}/kbs", json={"name": "bench"}, headers=headers) as r:
+            await r.read()
+
+        job_ids = []
+        while time.monotonic() < deadline:
+            kind = random.choices(kinds, weights)[0]
+            t0 = time.perf_counter()
+            if kind == "query":
+                async with http.post(f"{base}/query", json={"question": "what?"}, headers=headers) as r:
+                    await r.read()
+                    ok = r.status == 200
+            elif kind == "stream":
+                async with http.post(f"{base}/query", json={"question": "what?", "stream": True},
+                                     headers=headers) as r:
+                    first = None
+                    async for line in r.content:
+                        if first is None and line.startswith(b"data:"):
+                            first = time.perf_counter() - t0
+                    ok = r.status == 200
+                if first is not None:
+                    samples.setdefault("stream first token", []).append(first)
+            elif kind == "ingest":
+                form = aiohttp.FormData()
+                form.add_field("file", os.urandom(64 << 10), filename="doc.pdf", content_type="application/pdf")
+                async with http.post(f"{base}/ingest", data=form, headers=headers) as r:
+                    body = await r.json()
+                    ok = r.status == 202
+                if ok:
+                    job_ids.append(body["job_id"])
+            else:
+                url = f"{base}/jobs/{job_ids[-1]}" if job_ids else f"{base}/jobs"
+                async with http.get(url, headers=headers) as r:
+                    await r.read()
+                    ok = r.status == 200
+            samples.setdefault(kind if ok else f"{kind} (failed)", []).append(time.perf_counter() - t0)
+
+
+def report(samples: dict, seconds: float):
+    print(f"{'kind':<20}{'count':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    total = 0
+    for kind, values in sorted(samples.items()):
+        lat = np.asarray(values) * 1000
+        if kind != "stream first token":
+            total += len(lat)
+        p50, p95, p99 = np.percentile(lat, [50, 95, 99])
+        print(f"{kind:<20}{len(lat):>8}{len(lat) / seconds:>9.1f}{p50:>9.1f}{p95:>9.1f}{p99:>9.1f}")
+    print(f"total {total / seconds:.1f} req/s")
+
+
+async def run(args):
+    base = f"http://127.0.0.1:{args.port}"
+    mix = [("query", args.query), ("stream", args.stream), ("ingest", args.ingest), ("status", args.status)]
+    mix = [(k, w) for k, w in mix if w > 0]
+    samples = {}
+    deadline = time.monotonic() + args.seconds
+    await asyncio.gather(*(client(base, f"tenant{i % args.tenants}", mix, deadline, samples)
+                           for i in range(args.clients)))
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=64, help="concurrent clients")
+    parser.add_argument("--tenants", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=20)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=4, help="ingestion worker threads")
+    parser.add_argument("--embed-ms", type=float, default=40)
+    parser.add_argument("--search-ms", type=float, default=15)
+    parser.add_argument("--generate-ms", type=float, default=600)
+    parser.add_argument("--ingest-ms", type=float, default=2000)
+    parser.add_argument("--pieces", type=int, default=20, help="streamed pieces per answer")
+    parser.add_argument("--query", type=float, default=5, help="weight of plain queries in the mix")
+    parser.add_argument("--stream", type=float, default=3, help="weight of streamed queries")
+    parser.add_argument("--ingest", type=float, default=1, help="weight of PDF uploads")
+    parser.add_argument("--status", type=float, default=1, help="weight of job status reads")
+    args = parser.parse_args()
+
+    install_stubs(args.embed_ms, args.search_ms, args.generate_ms, args.ingest_ms, args.pieces)
+    start_server(args.port, args.workers)
+    t0 = time.monotonic()
+    samples = asyncio.run(run(args))
+    report(samples, time.monotonic() - t0)
+    stats = embedding_gemini.get_coalescer().stats()
+    print(f"query embeds: {stats['items']} in {stats['http_calls']} calls, fill rate {stats['fill_rate']:.0%}, "
+          f"queue delay p50 {stats['queue_delay_ms_p50']:.1f} ms p99 {stats['queue_delay_ms_p99']:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+CLI cold-start benchmark using `python -X importtime`.
+
+Imports haystackapp in a fresh interpreter, reports cumulative import time and
+the slowest modules, and fails (exit 1) if startup exceeds a budget or if a
+heavy subsystem that should be lazy got imported eagerly.
+
+    python -m benchmarks.startup_importtime --budget-ms 250
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+# Must only be imported on the code paths that need them
+LAZY_MODULES = ["tkinter", "pdfplumber", "weaviate", "google.generativeai"]
+
+
+def measure(module: str = "haystackapp", runs: int = 5):
+    """
+    Returns (best total µs, {module: cumulative µs} of the best run).
+    """
+    best_total, best_modules = None, None
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    for _ in range(runs):
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            capture_output=True, text=True, cwd=root,
+        )
+        if proc.returncode != 0:
+            raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+
+        modules = {}
+        for line in proc.stderr.splitlines():
+            if not line.startswith("import time:") or "cumulative" in line:
+                continue
+            _, cumulative, name = line[len("import time:"):].split("|")
+            modules[name.strip()] = int(cumulative)
+
+        total = modules.get(module, 0)
+        if best_total is None or total < best_total:
+            best_total, best_modules = total, modules
+    return best_total, best_modules
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--module", default="haystackapp")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=250.0)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    total, modules = measure(args.module, args.runs)
+    print(f"import {args.module}: {total / 1000:.1f} ms (best of {args.runs}, budget {args.budget_ms:.0f} ms)")
+    print("slowest top-level imports (cumulative):")
+    for name, us in sorted(modules.items(), key=lambda kv: kv[1], reverse=True)[:args.top]:
+        print(f"  {us / 1000:8.1f} ms  {name}")
+
+    failed = False
+    eager = [m for m in LAZY_MODULES if m in modules]
+    if eager:
+        print(f"FAIL: imported eagerly, should be lazy: {', '.join(eager)}")
+        failed = True
+    if total / 1000 > args.budget_ms:
+        print(f"FAIL: startup {total / 1000:.1f} ms exceeds budget {args.budget_ms:.0f} ms")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
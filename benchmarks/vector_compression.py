@@ -0,0 +1,161 @@
+"""
+Memory vs recall@10 for DocumentChunk vector settings.
+
+For every combination of embedding size (outputDimensionality / EMBED_DIM) and
+compression (none, pq, bq) it reports:
+  - in-memory bytes per million chunks (compressed vectors + HNSW links),
+  - on-disk bytes per million for the full-precision vectors,
+  - recall@10 against exact search on full 768-dim vectors, both straight
+    from the compressed codes and after rescoring top_k * factor candidates
+    with the full-precision vectors (what query_embeddings does).
+
+Runs in-process on a synthetic corpus shaped like Matryoshka embeddings
+(clustered, variance concentrated in the leading dimensions), so no
+Weaviate or Gemini access is needed.
+
+    python -m benchmarks.vector_compression --n 20000 --queries 100
+"""
+
+import argparse
+
+import numpy as np
+
+FULL_DIM = 768
+K = 10
+# Layer-0 HNSW links: 2 * maxConnections neighbour ids of 8 bytes each
+MAX_CONNECTIONS = 64
+GRAPH_BYTES = 2 * MAX_CONNECTIONS * 8
+
+
+def synthetic_corpus(n: int, n_queries: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((64, FULL_DIM)).astype(np.float32)
+    labels = rng.integers(0, len(centers), n)
+    x = centers[labels] * 0.6 + rng.standard_normal((n, FULL_DIM)).astype(np.float32)
+    # Matryoshka-like: information concentrated in the leading dimensions
+    x *= (1.0 / np.sqrt(np.arange(1, FULL_DIM + 1, dtype=np.float32))) ** 0.5
+    # Queries are noisy views of corpus chunks, as real questions are of passages
+    picks = rng.integers(0, n, n_queries)
+    q = x[picks] + 0.5 * rng.standard_normal((n_queries, FULL_DIM)).astype(np.float32) * x.std(axis=0)
+    return x, q
+
+
+def normalize(v: np.ndarray) -> np.ndarray:
+    return v / (np.linalg.norm(v, axis=-1, keepdims=True) + 1e-12)
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    idx = np.argpartition(-scores, k, axis=1)[:, :k]
+    order = np.take_along_axis(scores, idx, axis=1).argsort(axis=1)[:, ::-1]
+    return np.take_along_axis(idx, order, axis=1)
+
+
+def recall(found: np.ndarray, truth: np.ndarray) -> float:
+    return float(np.mean([len(set(f) & set(t)) / len(t) for f, t in zip(found, truth)]))
+
+
+def train_pq(x: np.ndarray, segments: int, iters: int = 8, sample: int = 10000, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    sub = x.shape[1] // segments
+    train = x[rng.choice(len(x), min(sample, len(x)), replace=False)]
+    codebooks = np.empty((segments, 256, sub), dtype=np.float32)
+    for s in range(segments):
+        xs = train[:, s * sub:(s + 1) * sub]
+        c = xs[rng.choice(len(xs), 256, replace=False)].copy()
+        for _ in range(iters):
+            assign = (-2 * xs @ c.T + (c * c).sum(1)).argmin(1)
+            counts = np.bincount(assign, minlength=256)
+            for d in range(sub):
+                sums = np.bincount(assign, weights=xs[:, d], minlength=256)
+                nonempty = counts > 0
+                c[nonempty, d] = sums[nonempty] / counts[nonempty]
+        codebooks[s] = c
+    return codebooks
+
+
+def encode_pq(x: np.ndarray, codebooks: np.ndarray) -> np.ndarray:
+    segments, _, sub = codebooks.shape
+    codes = np.empty((len(x), segments), dtype=np.uint8)
+    for s in range(segments):
+        xs = x[:, s * sub:(s + 1) * sub]
+        c = codebooks[s]
+        codes[:, s] = (-2 * xs @ c.T + (c * c).sum(1)).argmin(1)
+    return codes
+
+
+def pq_scores(q: np.ndarray, codes: np.ndarray, codebooks: np.ndarray) -> np.ndarray:
+    segments, _, sub = codebooks.shape
+    out = np.empty((len(q), len(codes)), dtype=np.float32)
+    seg_idx = np.arange(segments)
+    for i, qi in enumerate(q):
+        # Asymmetric distance: per-segment lookup table of query · centroid
+        lut = np.einsum("sd,skd->sk", qi.reshape(segments, sub), codebooks)
+        out[i] = lut[seg_idx, codes].sum(1)
+    return out
+
+
+def run_setting(x_full, q_full, truth, dim, compression, pq_ratio, rescore_factor):
+    x = normalize(x_full[:, :dim])
+    q = normalize(q_full[:, :dim])
+
+    if compression == "none":
+        mem = dim * 4
+        scores = q @ x.T
+    elif compression == "pq":
+        segments = max(1, dim // pq_ratio)
+        while dim % segments:
+            segments -= 1
+        codebooks = train_pq(x, segments)
+        codes = encode_pq(x, codebooks)
+        mem = segments
+        scores = pq_scores(q, codes, codebooks)
+    elif compression == "bq":
+        mem = dim // 8
+        # Ranking by ±1 dot product is ranking by Hamming distance
+        scores = np.sign(q) @ np.sign(x).T
+    else:
+        raise ValueError(compression)
+
+    direct = top_k(scores, K)
+    candidates = top_k(scores, K * rescore_factor)
+    exact = np.einsum("qd,qcd->qc", q, x[candidates])
+    rescored = np.take_along_axis(candidates, top_k(exact, K), axis=1)
+
+    return {
+        "dim": dim,
+        "compression": compression,
+        "mem_gb_per_million": (mem + GRAPH_BYTES) * 1e6 / 1e9,
+        "vector_gb_per_million": mem * 1e6 / 1e9,
+        "disk_gb_per_million": dim * 4 * 1e6 / 1e9,
+        "recall": recall(direct, truth),
+        "recall_rescored": recall(rescored, truth),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=20000, help="synthetic chunks")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--dims", type=str, default="768,512,256,128")
+    parser.add_argument("--compression", type=str, default="none,pq,bq")
+    parser.add_argument("--pq-ratio", type=int, default=4, help="dimensions per PQ segment")
+    parser.add_argument("--rescore-factor", type=int, default=4)
+    args = parser.parse_args()
+
+    x, q = synthetic_corpus(args.n, args.queries)
+    truth = top_k(normalize(q) @ normalize(x).T, K)
+
+    print(f"{args.n} chunks, {args.queries} queries, recall@{K} vs exact {FULL_DIM}-dim search, "
+          f"rescore over top {K * args.rescore_factor}")
+    print(f"{'dim':>5} {'comp':>5} {'RAM GB/1M':>10} {'vec GB/1M':>10} {'disk GB/1M':>11} "
+          f"{'recall':>7} {'rescored':>9}")
+    for dim in [int(d) for d in args.dims.split(",")]:
+        for comp in args.compression.split(","):
+            r = run_setting(x, q, truth, dim, comp, args.pq_ratio, args.rescore_factor)
+            print(f"{r['dim']:>5} {r['compression']:>5} {r['mem_gb_per_million']:>10.2f} "
+                  f"{r['vector_gb_per_million']:>10.3f} {r['disk_gb_per_million']:>11.2f} "
+                  f"{r['recall']:>7.3f} {r['recall_rescored']:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
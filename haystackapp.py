@@ -5,24 +5,57 @@ Supports:
   python haystackapp.py --file doc.pdf        → ingest only
   python haystackapp.py --query "text"        → query only
   python haystackapp.py --file doc.pdf --query "text" → ingest + answer
+  python haystackapp.py --queries-file q.jsonl [--output a.jsonl] → batch answers (JSONL)
+  python haystackapp.py --ingest-dir ./pdfs [--workers 4]    → bulk ingest a directory or glob
+  python haystackapp.py --serve [--host 0.0.0.0 --port 8000]  → HTTP server (see modules/server.py)
+  python haystackapp.py --export-kb ./snap                  → snapshot the active KB (see pipelines/snapshot.py)
+  python haystackapp.py --import-kb ./snap [--into-kb ID]   → load a snapshot as a new KB (or restore into ID)
+  any of the above with --profile sampling[+memory] → per-job / per-query profiles in PROFILE_DIR
 """
 
 from modules.weaviate_check import ensure_weaviate_running
 
 import argparse
+import json
+import os
 import subprocess
 from pipelines.ingestion import ingest_pdf
-from pipelines.querying import answer_query
+from pipelines.querying import answer_query, answer_queries_file
 from pipelines.monitor import get_stats
-import tkinter as tk
-from tkinter import filedialog
+from pipelines.bulk_ingest import bulk_ingest, format_report
+from pipelines.snapshot import export_kb, import_kb
 from modules.tenant_manager import verify_tenant_credentials as verify_tenant
-from modules.worker import start_worker, submit_job, get_job, list_jobs
-from modules.knowledge_base_manager import create_kb, list_kb, set_active_kb, get_active_kb
+from modules.worker import start_worker, submit_job, submit_purge_job, submit_gc_job, get_job, list_jobs, wait_for_job
+from modules.knowledge_base_manager import create_kb, list_kb, set_active_kb, get_active_kb, delete_kb
+from modules import profiling
 
 CURRENT_TENANT = None
 
 
+def print_bulk_progress(p):
+    eta = f"{p['eta']:.0f}s" if p["eta"] is not None else "?"
+    print(
+        f"\r{p['completed'] + p['failed']}/{p['total']} files "
+        f"({p['running']} running, {p['failed']} failed) "
+        f"{p['done_bytes'] / 1e6:.1f}/{p['total_bytes'] / 1e6:.1f} MB, ETA {eta}   ",
+        end="", flush=True,
+    )
+
+
+def run_bulk_ingest(source, report_path=None):
+    report = bulk_ingest(source, CURRENT_TENANT, on_progress=print_bulk_progress)
+    print()
+    print(format_report(report))
+    if report_path:
+        with open(report_path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Full report written to {report_path}")
+
+
+def print_snapshot_progress(p):
+    print(f"\r{p['class']}: {p['done']}/{p['total']} objects   ", end="", flush=True)
+
+
 def interactive_loop():
     global CURRENT_TENANT
     if not CURRENT_TENANT:
@@ -46,6 +79,7 @@ Commands:
   listkb
   usekb <kb_id>
   deletekb <kb_id>
+  gc
   exit
 ----------------------------
 """)
@@ -94,18 +128,17 @@ Commands:
                 print("No KB found with that ID or name.")
         elif cmd.startswith("deletekb "):
             kb_id = cmd.replace("deletekb ", "", 1).strip()
-            kbs = list_kb(CURRENT_TENANT)
-            if kb_id in kbs:
-                del kbs[kb_id]
-                from modules.knowledge_base_manager import _save, _load
-                data = _load()
-                data[CURRENT_TENANT] = kbs
-                _save(data)
+            if delete_kb(CURRENT_TENANT, kb_id):
+                job_id = submit_purge_job(CURRENT_TENANT, kb_id)
                 print(f"Deleted KB: {kb_id}")
+                print(f"Purging its chunks and graph in the background (job {job_id}).")
             else:
                 print("Invalid KB ID.")
+        elif cmd == "gc":
+            job_id = submit_gc_job()
+            print(f"Orphan cleanup started (job {job_id}).")
         else:
-            print("Commands: createkb <name>, listkb, usekb <kb_id>, deletekb <kb_id>, exit")
+            print("Commands: createkb <name>, listkb, usekb <kb_id>, deletekb <kb_id>, gc, exit")
 
     print("""
 ============================
@@ -113,6 +146,7 @@ Commands:
 ============================
 Commands:
   ingest
+  ingestdir <directory or glob>
   ask <your question>
   stats
   back
@@ -124,9 +158,15 @@ Enter command:
         cmd = input("insert your query here > ").strip()
         if cmd.lower() == "exit":
             break
-        if cmd.startswith("ingest"):
+        if cmd.startswith("ingestdir "):
+            source = cmd.replace("ingestdir ", "", 1).strip()
+            run_bulk_ingest(source)
+        elif cmd.startswith("ingest"):
             parts = cmd.split(" ", 1)
             if len(parts) == 1:
+                # tkinter is only needed for this dialog; keep it off the startup path
+                import tkinter as tk
+                from tkinter import filedialog
                 root = tk.Tk()
                 root.withdraw()
                 path = filedialog.askopenfilename(filetypes=[("PDF files", "*.pdf")])
@@ -141,14 +181,7 @@ Enter command:
             print("Knowledge base formation started...")
             job_id = submit_job(path, CURRENT_TENANT)
 
-            import time
-            while True:
-                job = get_job(job_id)
-                if job and job.get("status") in ["completed", "failed"]:
-                    break
-                time.sleep(1)
-
-            job = get_job(job_id)
+            job = wait_for_job(job_id)
             if job.get("status") == "completed":
                 print("Ingestion completed successfully.")
                 print("Knowledge base created.")
@@ -157,7 +190,10 @@ Enter command:
                 print(job)
         elif cmd.startswith("ask "):
             q = cmd.replace("ask ", "", 1).strip()
-            ans = answer_query(q, CURRENT_TENANT)
+            try:
+                ans = answer_query(q, CURRENT_TENANT)
+            except RuntimeError as e:
+                ans = f"Query failed: {e}"
             print(ans)
 
         elif cmd == "back":
@@ -171,17 +207,56 @@ Enter command:
             else:
                 print("No stats for this tenant.")
         else:
-            print("Commands: ingest <file>, ask <query>, exit")
+            print("Commands: ingest <file>, ingestdir <dir or glob>, ask <query>, exit")
 
 
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--file", type=str, default=None, help="PDF path to ingest")
     parser.add_argument("--query", type=str, default=None, help="Query to ask")
+    parser.add_argument("--queries-file", type=str, default=None,
+                        help="JSONL file of questions to answer in batch")
+    parser.add_argument("--output", type=str, default=None,
+                        help="JSONL output for --queries-file (resumed if it exists)")
+    parser.add_argument("--concurrency", type=int, default=4,
+                        help="Parallel answer generations in batch mode")
+    parser.add_argument("--ingest-dir", type=str, default=None,
+                        help="Directory or glob of PDFs to bulk ingest")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Ingestion worker threads")
+    parser.add_argument("--report", type=str, default=None,
+                        help="Write the bulk ingest report as JSON to this path")
+    parser.add_argument("--serve", action="store_true",
+                        help="Run the HTTP server instead of the CLI (tenants log in per request)")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Bind address for --serve")
+    parser.add_argument("--port", type=int, default=8000, help="Port for --serve")
+    parser.add_argument("--export-kb", type=str, default=None,
+                        help="Write a snapshot of the active KB to this directory")
+    parser.add_argument("--import-kb", type=str, default=None,
+                        help="Load a snapshot directory as a new KB of the tenant")
+    parser.add_argument("--into-kb", type=str, default=None,
+                        help="With --import-kb: restore into this existing KB, replacing its contents")
+    parser.add_argument("--profile", type=str, default=None,
+                        help="Profile every ingest / query: cprofile or sampling, optionally +memory "
+                             "(files in PROFILE_DIR)")
     args = parser.parse_args()
 
+    if args.profile:
+        try:
+            profiling.parse_spec(args.profile)
+        except ValueError as e:
+            parser.error(str(e))
+        profiling.PROFILE_MODE = args.profile
+
     ensure_weaviate_running()
-    start_worker()
+
+    if args.serve:
+        # aiohttp is only needed in server mode; keep it off the CLI startup path
+        from modules.server import run_server
+        run_server(args.host, args.port, workers=args.workers)
+        return
+
+    start_worker(args.workers)
 
     global CURRENT_TENANT
     if not CURRENT_TENANT:
@@ -198,20 +273,61 @@ def main():
     if not active:
         print("No active knowledge base. Please create one using createkb <name> in interactive mode.")
 
-    if not args.file and not args.query:
+    if not (args.file or args.query or args.queries_file or args.ingest_dir or args.export_kb or args.import_kb):
         interactive_loop()
         return
 
     if args.file:
         result = ingest_pdf(args.file, CURRENT_TENANT)
-        print(f"Ingested: {result['chunks']} chunks")
+        print(f"Ingested: {result['chunks']} chunks "
+              f"({result['duplicate_chunks']} near duplicates reused, {result['dedup_ratio']:.0%})")
         print("Ingestion completed successfully.")
-        print("Knowledge base created.")
+        if result["graph"] == "failed":
+            print(f"Knowledge graph failed (the document is still searchable): {result['kg_error']}")
+        else:
+            print("Knowledge base created.")
+
+    if args.import_kb:
+        res = import_kb(args.import_kb, CURRENT_TENANT, kb_id=args.into_kb, progress=print_snapshot_progress)
+        print()
+        print(f"Imported into KB {res['kb_id']}: "
+              + ", ".join(f"{n} {c}" for c, n in res["classes"].items())
+              + f" ({res['bytes'] / 1e6:.1f} MB in {res['seconds']:.1f}s)")
+
+    if args.export_kb:
+        if not get_active_kb(CURRENT_TENANT):
+            print("No active knowledge base to export.")
+        else:
+            res = export_kb(CURRENT_TENANT, get_active_kb(CURRENT_TENANT), args.export_kb,
+                            progress=print_snapshot_progress)
+            print()
+            print(f"Exported to {args.export_kb}: "
+                  + ", ".join(f"{e['count']} {c}" for c, e in res["classes"].items())
+                  + f" ({sum(res['files'].values()) / 1e6:.1f} MB in {res['seconds']:.1f}s)")
+
+    if args.ingest_dir:
+        run_bulk_ingest(args.ingest_dir, args.report)
 
     if args.query:
-        ans = answer_query(args.query, CURRENT_TENANT)
+        try:
+            ans = answer_query(args.query, CURRENT_TENANT)
+        except RuntimeError as e:
+            ans = f"Query failed: {e}"
         print(ans)
 
+    if args.queries_file:
+        out_path = args.output or os.path.splitext(args.queries_file)[0] + ".answers.jsonl"
+
+        def on_answer(summary):
+            done = summary["skipped"] + summary["answered"] + summary["failed"]
+            print(f"\r{done}/{summary['total']} answered ({summary['failed']} failed)", end="", flush=True)
+
+        summary = answer_queries_file(args.queries_file, out_path, CURRENT_TENANT,
+                                      generate_workers=args.concurrency, on_answer=on_answer)
+        print()
+        print(f"Batch done: {summary['answered']} answered, {summary['failed']} failed, "
+              f"{summary['skipped']} already in {out_path}")
+
 
 if __name__ == "__main__":
     main()
@@ -1,4 +1,49 @@
+"""
+Tenant authentication, plus bearer-token sessions for the HTTP server.
+Sessions live in memory; restarting the server logs everyone out.
+"""
+
+import os
+import secrets
+import threading
+import time
+
 from modules.tenant_manager import verify_tenant_credentials
 
+SESSION_TTL = int(os.getenv("SESSION_TTL_SECONDS", "43200"))
+
+# token → (tenant_id, expires_at)
+_SESSIONS = {}
+_LOCK = threading.Lock()
+
+
 def verify_tenant(tenant_id: str, password: str) -> bool:
-    return verify_tenant_credentials(tenant_id, password)
\ No newline at end of file
+    return verify_tenant_credentials(tenant_id, password)
+
+
+def create_session(tenant_id: str) -> str:
+    token = secrets.token_urlsafe(32)
+    now = time.monotonic()
+    with _LOCK:
+        # Drop expired sessions while we're here, so the table can't grow without bound
+        for t in [t for t, (_, exp) in _SESSIONS.items() if exp <= now]:
+            del _SESSIONS[t]
+        _SESSIONS[token] = (tenant_id, now + SESSION_TTL)
+    return token
+
+
+def session_tenant(token: str):
+    """Tenant id for a live session token, else None."""
+    with _LOCK:
+        entry = _SESSIONS.get(token)
+        if entry is None:
+            return None
+        if entry[1] <= time.monotonic():
+            del _SESSIONS[token]
+            return None
+        return entry[0]
+
+
+def end_session(token: str) -> bool:
+    with _LOCK:
+        return _SESSIONS.pop(token, None) is not None
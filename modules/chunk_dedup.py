@@ -0,0 +1,374 @@
+"""
+Near-duplicate chunk detection, one persistent index per tenant + KB.
+
+Chunks are fingerprinted with MinHash over word 3-gram shingles (64
+permutations, lowest 16 bits kept per value). Tokenizing, shingling and
+hashing run as NumPy array operations over blocks of chunks. LSH banding (16 bands of 4) finds candidates, and a
+candidate is a duplicate when the estimated Jaccard similarity reaches
+DEDUP_MIN_JACCARD.
+
+A duplicate chunk is not embedded or stored again: the index records that its
+document references the already-stored chunk object (by uuid). When that
+object's own document is purged, it is handed over to a referencing document
+instead of being deleted.
+
+New chunks are only claimed by assign(); the document commits them once they
+are stored. A document matching another one's claimed chunks waits for that
+commit (or the release of a failed store), so nothing is ever deduplicated
+against a chunk that doesn't reach Weaviate.
+
+Per KB the index is two append-only files under DEDUP_DIR: signatures
+(.sig) and an event log (.jsonl) replayed on load.
+"""
+
+import json
+import os
+import threading
+import uuid
+
+import numpy as np
+
+DEDUP_DIR = os.getenv("DEDUP_DIR", "chunk_dedup")
+MIN_JACCARD = float(os.getenv("DEDUP_MIN_JACCARD", "0.8"))
+SHINGLE = 3
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS  # 4 x uint16 = one uint64 band key
+# Rows added since the last merge are looked up in dicts until there are this many
+MERGE_MIN_ROWS = 50000
+
+_rng = np.random.default_rng(4242)
+# Multiply-shift hashing: (a * x + b) mod 2^64, top 32 bits; a odd
+_A = _rng.integers(0, np.iinfo(np.uint64).max, NUM_PERM, dtype=np.uint64, endpoint=True) | np.uint64(1)
+_B = _rng.integers(0, np.iinfo(np.uint64).max, NUM_PERM, dtype=np.uint64, endpoint=True)
+
+
+# Bytes that make up words: ASCII letters, digits, "_" and any UTF-8 multi-byte sequence
+_WORD_BYTE = np.zeros(256, dtype=np.bool_)
+for _c in b"abcdefghijklmnopqrstuvwxyz0123456789_":
+    _WORD_BYTE[_c] = True
+_WORD_BYTE[0x80:] = True
+_BASE = np.uint64(1099511628211)
+_BASE_INV = np.uint64(pow(1099511628211, -1, 1 << 64))
+
+
+def _powers(base: np.uint64, n: int) -> np.ndarray:
+    out = np.ones(n, dtype=np.uint64)
+    if n > 1:
+        out[1:] = base
+        out = np.cumprod(out, dtype=np.uint64)
+    return out
+
+
+def _block_shingles(texts: list):
+    """
+    (shingle hashes, owning text per shingle) for a block of texts, sorted by text.
+    Tokens are hashed with a polynomial rolling hash taken from prefix sums,
+    so no Python loop runs per token.
+    """
+    data = np.frombuffer(b"\n".join(t.lower().encode("utf-8", "ignore") for t in texts), dtype=np.uint8)
+    word = np.concatenate([[False], _WORD_BYTE[data], [False]])
+    edges = np.flatnonzero(word[1:] != word[:-1])
+    starts, ends = edges[::2], edges[1::2]
+
+    # Token hash = sum(byte_j * B^(j - start)) mod 2^64, from prefix sums of byte_j * B^j
+    prefix = np.zeros(len(data) + 1, dtype=np.uint64)
+    np.cumsum(data.astype(np.uint64) * _powers(_BASE, len(data)), dtype=np.uint64, out=prefix[1:])
+    tokens = (prefix[ends] - prefix[starts]) * _powers(_BASE_INV, len(data) + 1)[starts]
+
+    text_starts = np.concatenate([[0], np.cumsum([len(t.encode("utf-8", "ignore")) + 1 for t in texts])[:-1]])
+    owner = np.searchsorted(text_starts, starts, side="right") - 1
+
+    # Word 3-grams that stay inside one text
+    k = len(tokens) - SHINGLE + 1
+    same = owner[:max(k, 0)] == owner[SHINGLE - 1:]
+    h = tokens[:max(k, 0)].copy()
+    for j in range(1, SHINGLE):
+        h = h * _BASE + tokens[j:j + max(k, 0)]
+    hashes, owners = [h[same]], [owner[:max(k, 0)][same]]
+
+    # Texts too short for a 3-gram fall back to their words, empty ones to a constant
+    short = np.bincount(owners[0], minlength=len(texts)) == 0
+    if short.any():
+        words = short[owner]
+        hashes.append(tokens[words])
+        owners.append(owner[words])
+        empty = short & (np.bincount(owner, minlength=len(texts)) == 0)
+        hashes.append(np.zeros(int(empty.sum()), dtype=np.uint64))
+        owners.append(np.flatnonzero(empty))
+
+    h, owner = np.concatenate(hashes), np.concatenate(owners)
+    order = np.argsort(owner, kind="stable")
+    return h[order], owner[order]
+
+
+def fingerprint(texts: list, block: int = 64) -> np.ndarray:
+    """(len(texts), NUM_PERM) uint16 MinHash signatures."""
+    out = np.empty((len(texts), NUM_PERM), dtype=np.uint16)
+    for start in range(0, len(texts), block):
+        part = texts[start:start + block]
+        x, owner = _block_shingles(part)
+        # One hash per shingle × permutation, min per text
+        hashed = (x[:, None] * _A[None, :] + _B[None, :]) >> np.uint64(32)
+        bounds = np.searchsorted(owner, np.arange(len(part)))
+        out[start:start + len(part)] = np.minimum.reduceat(hashed, bounds, axis=0).astype(np.uint16)
+    return out
+
+
+def chunk_uuid(tenant_id: str, kb_id: str, pdf_id: str, index: int) -> str:
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"{tenant_id}/{kb_id}/{pdf_id}/{index}"))
+
+
+class DedupIndex:
+    def __init__(self, tenant_id: str, kb_id: str):
+        base = os.path.join(DEDUP_DIR, tenant_id, kb_id)
+        self.sig_path = base + ".sig"
+        self.log_path = base + ".jsonl"
+        self.lock = threading.Lock()
+
+        self.sigs = np.zeros((1024, NUM_PERM), dtype=np.uint16)
+        self.size = 0
+        self.uuids = []        # row -> stored chunk uuid
+        self.owner = []        # row -> pdf_id holding the object, None once removed
+        self.refs = {}         # uuid -> {pdf_id: count} of documents reusing it
+        self.claimed = {}      # pdf_id -> Event set on commit / release, while its new chunks are unstored
+
+        # LSH buckets: per band, rows sorted by band key (NumPy, compact at
+        # millions of rows) plus a small dict of rows added since the last merge
+        self.band_keys = np.zeros((BANDS, 0), dtype=np.uint64)
+        self.band_rows = np.zeros((BANDS, 0), dtype=np.int64)
+        self.pending = [dict() for _ in range(BANDS)]
+        self.merged = 0
+        self._load()
+        self._merge()
+
+    # ---------- lookup ----------
+
+    def _append_row(self, sig: np.ndarray, chunk_id: str, pdf_id: str):
+        if self.size == len(self.sigs):
+            self.sigs = np.concatenate([self.sigs, np.zeros_like(self.sigs)])
+        row = self.size
+        self.sigs[row] = sig
+        self.size += 1
+        self.uuids.append(chunk_id)
+        self.owner.append(pdf_id)
+        for b, key in enumerate(sig.view(np.uint64).tolist()):
+            self.pending[b].setdefault(key, []).append(row)
+
+    def _merge(self):
+        """Folds pending rows into the sorted band arrays."""
+        keys = self.sigs[:self.size].view(np.uint64).T
+        order = np.argsort(keys, axis=1, kind="stable")
+        self.band_keys = np.take_along_axis(keys, order, axis=1)
+        self.band_rows = order
+        self.pending = [dict() for _ in range(BANDS)]
+        self.merged = self.size
+
+    def _candidates(self, sigs: np.ndarray) -> list:
+        """Rows sharing a band with each signature, from the sorted arrays (one searchsorted per band)."""
+        keys = sigs.view(np.uint64)
+        found = [set() for _ in range(len(sigs))]
+        for b in range(BANDS):
+            lo = np.searchsorted(self.band_keys[b], keys[:, b], side="left")
+            hi = np.searchsorted(self.band_keys[b], keys[:, b], side="right")
+            for i in np.flatnonzero(hi > lo).tolist():
+                found[i].update(self.band_rows[b, lo[i]:hi[i]].tolist())
+        return found
+
+    def _nearest(self, sig: np.ndarray, rows: set):
+        rows = rows | {r for b, key in enumerate(sig.view(np.uint64).tolist()) for r in self.pending[b].get(key, ())}
+        rows = [r for r in rows if self.owner[r] is not None]
+        if not rows:
+            return None
+        rows = np.asarray(rows)
+        jaccard = (self.sigs[rows] == sig).mean(axis=1)
+        best = int(np.argmax(jaccard))
+        return int(rows[best]) if jaccard[best] >= MIN_JACCARD else None
+
+    # ---------- updates ----------
+
+    def assign(self, pdf_id: str, sigs: np.ndarray, uuids: list, checkpoint=None) -> list:
+        """
+        For each chunk of a document: None if it is new (and now claimed
+        under its own uuid; commit() once stored, release() on failure), else
+        the uuid of the stored chunk it duplicates. Matches and claims happen
+        in one step, so concurrent jobs never both store the same chunk.
+        Blocks while a match is another document's unstored claim;
+        checkpoint(), if given, is called every second meanwhile.
+        """
+        while True:
+            with self.lock:
+                candidates = self._candidates(sigs)
+                claim = self._blocking_claim(pdf_id, sigs, candidates)
+                if claim is None:
+                    return self._assign(pdf_id, sigs, uuids, candidates)
+            while not claim.wait(1.0):
+                if checkpoint:
+                    checkpoint()
+
+    def _blocking_claim(self, pdf_id: str, sigs: np.ndarray, candidates: list):
+        """The claim of another document that one of these chunks would match, if any."""
+        if not self.claimed:
+            return None
+        for sig, rows in zip(sigs, candidates):
+            row = self._nearest(sig, rows)
+            if row is not None and self.owner[row] != pdf_id and self.owner[row] in self.claimed:
+                return self.claimed[self.owner[row]]
+        return None
+
+    def _assign(self, pdf_id: str, sigs: np.ndarray, uuids: list, candidates: list) -> list:
+        dup_of, events = [], []
+        os.makedirs(os.path.dirname(self.sig_path), exist_ok=True)
+        added = []
+        for i, (sig, chunk_id, rows) in enumerate(zip(sigs, uuids, candidates)):
+            row = self._nearest(sig, rows)
+            if row is None:
+                self._append_row(sig, chunk_id, pdf_id)
+                added.append(i)
+                events.append({"add": chunk_id, "pdf": pdf_id})
+                dup_of.append(None)
+            else:
+                target = self.uuids[row]
+                counts = self.refs.setdefault(target, {})
+                counts[pdf_id] = counts.get(pdf_id, 0) + 1
+                events.append({"ref": target, "pdf": pdf_id})
+                dup_of.append(target)
+        if added:
+            events.append({"claim": pdf_id})
+            self.claimed.setdefault(pdf_id, threading.Event())
+        with open(self.sig_path, "ab") as f:
+            np.ascontiguousarray(sigs[added]).tofile(f)
+        self._log(events)
+        if self.size - self.merged > max(MERGE_MIN_ROWS, self.merged // 8):
+            self._merge()
+        return dup_of
+
+    def commit(self, pdf_id: str):
+        """Marks a document's claimed chunks as stored, so other documents may reuse them."""
+        with self.lock:
+            claim = self.claimed.pop(pdf_id, None)
+            if claim is None:
+                return
+            self._log([{"commit": pdf_id}])
+        claim.set()
+
+    def release(self, pdf_id: str) -> dict:
+        """
+        Forgets a document. Returns {uuid: new owner pdf_id} for its stored
+        chunks that other documents reuse; those objects must be re-assigned
+        rather than deleted.
+        """
+        with self.lock:
+            moves = self._release(pdf_id)
+            self._log([{"release": pdf_id}])
+            claim = self.claimed.pop(pdf_id, None)
+        if claim is not None:
+            claim.set()
+        return moves
+
+    def _release(self, pdf_id: str) -> dict:
+        moves = {}
+        for counts in self.refs.values():
+            counts.pop(pdf_id, None)
+        for row, owner in enumerate(self.owner):
+            if owner != pdf_id:
+                continue
+            chunk_id = self.uuids[row]
+            counts = self.refs.get(chunk_id)
+            if counts:
+                new_owner = next(iter(counts))
+                counts[new_owner] -= 1
+                if not counts[new_owner]:
+                    del counts[new_owner]
+                self.owner[row] = new_owner
+                moves[chunk_id] = new_owner
+            else:
+                self.owner[row] = None
+                self.refs.pop(chunk_id, None)
+        return moves
+
+    def stats(self) -> dict:
+        live = sum(1 for o in self.owner if o is not None)
+        reused = sum(sum(c.values()) for c in self.refs.values())
+        return {"stored": live, "reused": reused,
+                "dedup_ratio": reused / (live + reused) if live + reused else 0.0}
+
+    # ---------- persistence ----------
+
+    def _log(self, events: list):
+        os.makedirs(os.path.dirname(self.log_path), exist_ok=True)
+        with open(self.log_path, "a") as f:
+            for e in events:
+                f.write(json.dumps(e) + "\n")
+
+    def _load(self):
+        if not os.path.exists(self.log_path):
+            return
+        raw = np.fromfile(self.sig_path, dtype=np.uint16) if os.path.exists(self.sig_path) else np.zeros(0, np.uint16)
+        sigs = raw[:len(raw) // NUM_PERM * NUM_PERM].reshape(-1, NUM_PERM)
+        with open(self.log_path, "r") as f:
+            lines = f.readlines()
+        claimed = set()
+        for line in lines:
+            if not line.endswith("\n"):
+                break  # torn last line from an interrupted write
+            e = json.loads(line)
+            if "add" in e:
+                if len(self.uuids) >= len(sigs):
+                    break
+                self.uuids.append(e["add"])
+                self.owner.append(e["pdf"])
+            elif "ref" in e:
+                counts = self.refs.setdefault(e["ref"], {})
+                counts[e["pdf"]] = counts.get(e["pdf"], 0) + 1
+            elif "claim" in e:
+                claimed.add(e["claim"])
+            elif "commit" in e:
+                claimed.discard(e["commit"])
+            elif "release" in e:
+                self._release(e["release"])
+                claimed.discard(e["release"])
+
+        self.size = len(self.uuids)
+        if self.size:
+            self.sigs = sigs[:self.size].copy()
+        if len(sigs) > self.size:
+            # Signatures written by an assign() that never got to log its events
+            with open(self.sig_path, "r+b") as f:
+                f.truncate(self.size * NUM_PERM * 2)
+        # Claims never committed: the process died before those chunks were stored
+        for pdf_id in sorted(claimed):
+            self._release(pdf_id)
+        if claimed:
+            self._log([{"release": pdf_id} for pdf_id in sorted(claimed)])
+
+
+_INDEXES = {}
+_LOCK = threading.Lock()
+
+
+def get_dedup_index(tenant_id: str, kb_id: str) -> DedupIndex:
+    with _LOCK:
+        key = (tenant_id, kb_id)
+        if key not in _INDEXES:
+            _INDEXES[key] = DedupIndex(tenant_id, kb_id)
+        return _INDEXES[key]
+
+
+def drop_dedup_index(tenant_id: str, kb_id: str):
+    with _LOCK:
+        _INDEXES.pop((tenant_id, kb_id), None)
+        base = os.path.join(DEDUP_DIR, tenant_id, kb_id)
+        for path in (base + ".sig", base + ".jsonl"):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def drop_kb_dedup_indexes(kb_id: str):
+    """Drops a KB's index whatever tenant it belongs to (used by the orphan GC)."""
+    with _LOCK:
+        for key in [k for k in _INDEXES if k[1] == kb_id]:
+            del _INDEXES[key]
+    if os.path.isdir(DEDUP_DIR):
+        for tenant in os.listdir(DEDUP_DIR):
+            drop_dedup_index(tenant, kb_id)
@@ -0,0 +1,193 @@
+"""
+Streaming writer for DocumentChunk objects.
+
+Objects are posted to Weaviate's REST batch endpoint (/v1/batch/objects) by a
+few worker threads. The producer only ever holds the batch it is filling plus
+a bounded queue of full batches, so memory stays flat however large the
+document is, and add() blocks when Weaviate falls behind (backpressure).
+
+Batch size adapts to observed latency: it grows while batches return well
+under TARGET_BATCH_SECONDS and shrinks when they take longer or fail.
+Per-object errors from the batch response are collected; only the failed
+objects are retried.
+
+    with ChunkWriter() as writer:
+        for text, vector, meta in stream:
+            writer.add({"text": text, **meta}, vector)
+    print(writer.summary)
+"""
+
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+import requests
+
+from modules.http_session import get_session
+from modules.store_weaviate import CLASS_NAME, WEAVIATE_URL
+
+TARGET_BATCH_SECONDS = float(os.getenv("WEAVIATE_BATCH_TARGET_SECONDS", "1.0"))
+WRITER_WORKERS = int(os.getenv("WEAVIATE_BATCH_WORKERS", "4"))
+
+# Errors kept verbatim in the summary; the rest are only counted
+_MAX_ERRORS = 100
+_STOP = object()
+
+
+def _json_vector(vector) -> list:
+    """
+    float32 vectors as JSON-ready floats. Rounding to 8 decimals keeps them
+    within a few float32 ulps but serializes ~45% shorter than the float64
+    expansion of a float32 value.
+    """
+    if isinstance(vector, list):
+        return vector
+    return np.round(np.asarray(vector, dtype=np.float64), 8).tolist()
+
+
+class ChunkWriter:
+    def __init__(self, class_name: str = CLASS_NAME, workers: int = WRITER_WORKERS,
+                 batch_size: int = 100, min_batch: int = 10, max_batch: int = 1000,
+                 target_seconds: float = TARGET_BATCH_SECONDS, queued_batches: int = 2,
+                 retries: int = 3, timeout: float = 60.0):
+        self.class_name = class_name
+        self.url = f"{WEAVIATE_URL}/v1/batch/objects"
+        self.min_batch = min_batch
+        self.max_batch = max_batch
+        self.target_seconds = target_seconds
+        self.retries = retries
+        self.timeout = timeout
+
+        self._batch_size = batch_size
+        self._current = []
+        self._queue = queue.Queue(maxsize=max(1, workers * queued_batches))
+        self._lock = threading.Lock()
+        self._session = get_session()
+        self._closed = False
+        self._started = time.monotonic()
+        self.summary = {"inserted": 0, "failed": 0, "retried": 0, "batches": 0,
+                        "errors": [], "elapsed": 0.0, "objects_per_second": 0.0}
+
+        self._threads = [threading.Thread(target=self._worker, daemon=True) for _ in range(workers)]
+        for t in self._threads:
+            t.start()
+
+    # ---------- producer side ----------
+
+    def add(self, properties: dict, vector=None, uuid: str = None):
+        """Queues one object; blocks while all workers are busy and the queue is full."""
+        obj = {"class": self.class_name, "properties": properties}
+        if vector is not None:
+            obj["vector"] = _json_vector(vector)
+        if uuid:
+            obj["id"] = uuid
+        self._current.append(obj)
+        if len(self._current) >= self._batch_size:
+            self._flush()
+
+    def write(self, items) -> dict:
+        """
+        Writes an iterable of (text, vector, metadata) or (text, vector, metadata, uuid)
+        and closes the writer. Returns the summary.
+        """
+        for item in items:
+            text, vector, meta = item[:3]
+            self.add({"text": text, **meta}, vector, item[3] if len(item) > 3 else None)
+        return self.close()
+
+    def _flush(self):
+        if self._current:
+            self._queue.put(self._current)
+            self._current = []
+
+    def close(self) -> dict:
+        if not self._closed:
+            self._closed = True
+            self._flush()
+            for _ in self._threads:
+                self._queue.put(_STOP)
+            for t in self._threads:
+                t.join()
+            elapsed = time.monotonic() - self._started
+            self.summary["elapsed"] = elapsed
+            self.summary["objects_per_second"] = self.summary["inserted"] / elapsed if elapsed else 0.0
+        return self.summary
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # ---------- workers ----------
+
+    def _worker(self):
+        while True:
+            batch = self._queue.get()
+            if batch is _STOP:
+                return
+            try:
+                self._send(batch)
+            except Exception as e:
+                # A dead worker would leave producers blocked on a full queue
+                self._record_failed([(obj, f"{type(e).__name__}: {e}") for obj in batch])
+
+    def _post(self, objects: list):
+        """Returns (per-object error message or None, seconds taken)."""
+        t0 = time.monotonic()
+        resp = self._session.post(self.url, json={"objects": objects}, timeout=self.timeout)
+        seconds = time.monotonic() - t0
+        resp.raise_for_status()
+        errors = []
+        for item in resp.json():
+            errs = ((item.get("result") or {}).get("errors") or {}).get("error") or []
+            errors.append("; ".join(e.get("message", "") for e in errs) or None)
+        return errors, seconds
+
+    def _send(self, batch: list):
+        # (object, last error) for everything not yet inserted
+        pending = [(obj, None) for obj in batch]
+        for attempt in range(self.retries + 1):
+            if attempt:
+                with self._lock:
+                    self.summary["retried"] += len(pending)
+                time.sleep(min(2 ** attempt * 0.25, 5.0))
+            objects = [obj for obj, _ in pending]
+            try:
+                errors, seconds = self._post(objects)
+            except (requests.RequestException, ValueError) as e:
+                # Whole request failed (timeout, 5xx, 429, bad response): back off, resend all
+                pending = [(obj, str(e)) for obj in objects]
+                self._adapt(None)
+                continue
+
+            self._adapt(seconds)
+            pending = [(obj, err) for obj, err in zip(objects, errors) if err]
+            with self._lock:
+                self.summary["batches"] += 1
+                self.summary["inserted"] += len(objects) - len(pending)
+            if not pending:
+                return
+        self._record_failed(pending)
+
+    def _record_failed(self, pending: list):
+        with self._lock:
+            self.summary["failed"] += len(pending)
+            room = _MAX_ERRORS - len(self.summary["errors"])
+            self.summary["errors"].extend(
+                {"id": obj.get("id"), "error": err} for obj, err in pending[:max(room, 0)]
+            )
+
+    def _adapt(self, seconds):
+        """AIMD on batch size: grow while fast, halve on slow or failed batches."""
+        with self._lock:
+            if seconds is None or seconds > self.target_seconds:
+                self._batch_size = max(self.min_batch, self._batch_size // 2)
+            elif seconds < self.target_seconds / 2:
+                self._batch_size = min(self.max_batch, int(self._batch_size * 1.25) + 1)
+
+    @property
+    def batch_size(self) -> int:
+        return self._batch_size
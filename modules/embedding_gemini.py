@@ -1,61 +1,273 @@
 """
-this file is for embed_texts(texts) → list of embedding vectors.
+this file is for embed_texts(texts) → (n, dim) float32 array of normalized embedding vectors.
 helps in embedding text through gemini
+embed_texts_batched(texts) packs up to 100 texts into one batchEmbedContents call.
+numpy is imported on first embed, not at import, to keep CLI startup fast.
+embed_query(text) coalesces concurrent single-query embeds into shared batch calls.
 """
 
 import os
 import logging
-import requests
+import queue
+import threading
+import time
+from collections import deque
 from dotenv import load_dotenv
 from typing import List
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, Future, as_completed
+from modules.rate_limiter import get_limiter, RateLimitedError
+from modules.http_session import get_session
 
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if not GEMINI_API_KEY:
-    raise RuntimeError("GEMINI_API_KEY not set in environment.")
-
 # Gemini embedding endpoint
 _EMBED_URL = (
     "https://generativelanguage.googleapis.com/v1beta/models/"
-    "text-embedding-004:embedContent?key=" + GEMINI_API_KEY
+    "text-embedding-004:embedContent?key={key}"
+)
+_BATCH_EMBED_URL = (
+    "https://generativelanguage.googleapis.com/v1beta/models/"
+    "text-embedding-004:batchEmbedContents?key={key}"
 )
+# Gemini accepts at most 100 requests per batchEmbedContents call
+BATCH_LIMIT = 100
+
+# Optional reduced vector size. text-embedding-004 is Matryoshka-trained, so a
+# truncated output (e.g. 256) keeps most of the quality at a fraction of the memory.
+# Ingestion and querying must use the same value for a given DocumentChunk class.
+EMBED_DIM = int(os.getenv("EMBED_DIM", "0")) or None
+# Full output size of text-embedding-004
+MODEL_DIM = 768
+
+def _api_key() -> str:
+    # Checked on first call rather than at import, so CLI paths that never
+    # embed don't need the key (or pay for the check)
+    key = os.getenv("GEMINI_API_KEY")
+    if not key:
+        raise RuntimeError("GEMINI_API_KEY not set in environment.")
+    return key
 
-def _embed_single(text: str) -> List[float]:
-    payload = {
+def _post(payload: dict, url: str = _EMBED_URL) -> bytes:
+    r = get_session().post(url.format(key=_api_key()), json=payload, timeout=30)
+    r.raise_for_status()
+    return r.content
+
+def _request(text: str) -> dict:
+    req = {
         "model": "models/text-embedding-004",
         "content": {"parts": [{"text": text}]},
     }
+    if EMBED_DIM:
+        req["outputDimensionality"] = EMBED_DIM
+    return req
 
-    r = requests.post(_EMBED_URL, json=payload, timeout=30)
-    r.raise_for_status()
-    data = r.json()
+def normalize(vectors):
+    """L2-normalizes the rows of a float32 array in place (zero rows stay zero)."""
+    import numpy as np
+
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    np.divide(vectors, norms, out=vectors, where=norms > 0)
+    return vectors
+
+def _parse_vectors(body: bytes, n: int, out=None):
+    """
+    The n "values" arrays of an embedding response as an (n, dim) float32
+    array, read from the raw bytes without building a Python float per
+    component. Written into `out` when given. Rows come back normalized.
+    """
+    import numpy as np
 
-    if "embedding" in data:
-        return data["embedding"].get("values", [])
+    spans, pos = [], 0
+    for _ in range(n):
+        key = body.find(b'"values"', pos)
+        if key < 0:
+            break
+        start = body.index(b"[", key) + 1
+        pos = body.index(b"]", start)
+        spans.append(body[start:pos])
+    if len(spans) != n:
+        raise RuntimeError(f"Embedding response has {len(spans)} vectors for {n} texts: {body[:200]!r}")
 
-    # Fallback (rare fir bhi kabhi hua toh)
-    if "responses" in data and isinstance(data["responses"], list):
-        emb = data["responses"][0].get("embedding", {}).get("values", [])
-        return emb
+    flat = np.fromstring(b",".join(spans), dtype=np.float32, sep=",")
+    if flat.size % n:
+        raise RuntimeError("Embedding response vectors differ in length")
+    vectors = flat.reshape(n, -1)
+    if out is not None:
+        if out.shape != vectors.shape:
+            raise RuntimeError(f"Embedding response has shape {vectors.shape}, expected {out.shape}")
+        out[...] = vectors
+        vectors = out
+    return normalize(vectors)
 
-    raise RuntimeError(f"Unexpected embedding response: {data}")
+def _empty(n: int):
+    import numpy as np
+    return np.empty((n, EMBED_DIM or MODEL_DIM), dtype=np.float32)
 
-def _embed_parallel(texts: List[str], workers: int = 4) -> List[List[float]]:
-    embeddings = [None] * len(texts)
+def _embed_single(text: str, tenant_id: str = None):
+    payload = _request(text)
+
+    # Shared limiter: waits for quota and retries 429s instead of failing the ingest
+    body = get_limiter("embed").call(lambda: _post(payload), tenant_id=tenant_id)
+    return _parse_vectors(body, 1)[0]
+
+def _embed_parallel(texts: List[str], workers: int = 4, tenant_id: str = None):
+    embeddings = _empty(len(texts))
     with ThreadPoolExecutor(max_workers=workers) as ex:
-        futures = {ex.submit(_embed_single, texts[i]): i for i in range(len(texts))}
+        futures = {ex.submit(_embed_single, texts[i], tenant_id): i for i in range(len(texts))}
         for fut in as_completed(futures):
             idx = futures[fut]
             try:
                 embeddings[idx] = fut.result()
+            except RateLimitedError:
+                raise
             except Exception as e:
                 raise RuntimeError(f"Embedding failed for chunk {idx}: {e}")
     return embeddings
 
-def embed_texts(texts: List[str]) -> List[List[float]]:
-    return _embed_parallel(texts, workers=4)
+def embed_texts(texts: List[str], tenant_id: str = None):
+    """(len(texts), dim) float32 array of normalized embeddings, one row per text."""
+    return _embed_parallel(texts, workers=4, tenant_id=tenant_id)
+
+def _embed_batch(texts: List[str], tenant_id: str = None, out=None):
+    payload = {"requests": [_request(t) for t in texts]}
+    body = get_limiter("embed").call(lambda: _post(payload, _BATCH_EMBED_URL), tenant_id=tenant_id)
+    return _parse_vectors(body, len(texts), out)
+
+def embed_texts_batched(texts: List[str], batch_size: int = BATCH_LIMIT, workers: int = 4,
+                        tenant_id: str = None):
+    """
+    Same result as embed_texts, but one HTTP call per batch_size texts.
+    Each call parses into its own rows of the preallocated result.
+    """
+    batch_size = min(batch_size, BATCH_LIMIT)
+    starts = list(range(0, len(texts), batch_size))
+    embeddings = _empty(len(texts))
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        futures = {
+            ex.submit(_embed_batch, texts[i:i + batch_size], tenant_id, embeddings[i:i + batch_size]): i
+            for i in starts
+        }
+        for fut in as_completed(futures):
+            start = futures[fut]
+            try:
+                fut.result()
+            except RateLimitedError:
+                raise
+            except Exception as e:
+                raise RuntimeError(f"Embedding failed for batch at {start}: {e}")
+    return embeddings
+
+
+# ---------- query embedding coalescer ----------
+
+# Single-text embed calls arriving within this window (or until the batch is
+# full) go out as one batchEmbedContents call. 0 disables coalescing.
+COALESCE_WINDOW_MS = float(os.getenv("EMBED_COALESCE_MS", "5"))
+COALESCE_MAX_ITEMS = min(int(os.getenv("EMBED_COALESCE_MAX", "64")), BATCH_LIMIT)
+
+
+class EmbedCoalescer:
+    """
+    Collects concurrent single-text embed requests for up to window_ms (or
+    max_items) and sends them as one batch call per tenant, then hands each
+    caller its own vector. Repeated texts in a batch are embedded once.
+    """
+
+    def __init__(self, window_ms: float = COALESCE_WINDOW_MS, max_items: int = COALESCE_MAX_ITEMS,
+                 workers: int = 8):
+        self.window = window_ms / 1000
+        self.max_items = max_items
+        self._queue = queue.Queue()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="embed-coalesce")
+        self._lock = threading.Lock()
+        self._batches = 0
+        self._items = 0
+        self._calls = 0
+        # Recent per-item queueing delays (seconds), for percentiles
+        self._delays = deque(maxlen=10000)
+        threading.Thread(target=self._dispatch_loop, daemon=True).start()
+
+    def embed(self, text: str, tenant_id: str = None):
+        fut = Future()
+        self._queue.put((text, tenant_id, fut, time.monotonic()))
+        return fut.result()
+
+    def _dispatch_loop(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = batch[0][3] + self.window
+            while len(batch) < self.max_items:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            now = time.monotonic()
+            by_tenant = {}
+            for item in batch:
+                by_tenant.setdefault(item[1], []).append(item)
+            with self._lock:
+                self._batches += 1
+                self._items += len(batch)
+                self._calls += len(by_tenant)
+                self._delays.extend(now - item[3] for item in batch)
+            for tenant_id, items in by_tenant.items():
+                self._pool.submit(self._send, tenant_id, items)
+
+    def _send(self, tenant_id: str, items: list):
+        texts = list(dict.fromkeys(item[0] for item in items))
+        try:
+            vectors = dict(zip(texts, _embed_batch(texts, tenant_id=tenant_id)))
+        except Exception as e:
+            for item in items:
+                item[2].set_exception(e)
+            return
+        for item in items:
+            item[2].set_result(vectors[item[0]])
+
+    def stats(self) -> dict:
+        with self._lock:
+            delays = sorted(self._delays)
+            batches, items, calls = self._batches, self._items, self._calls
+
+        def pct(p):
+            return delays[min(len(delays) - 1, int(p * len(delays)))] * 1000 if delays else 0.0
+
+        return {
+            "batches": batches,
+            "items": items,
+            "http_calls": calls,
+            "avg_batch": items / batches if batches else 0.0,
+            "fill_rate": items / (batches * self.max_items) if batches else 0.0,
+            "queue_delay_ms_p50": pct(0.50),
+            "queue_delay_ms_p99": pct(0.99),
+        }
+
+
+_coalescer = None
+_COALESCER_LOCK = threading.Lock()
+
+
+def get_coalescer() -> EmbedCoalescer:
+    global _coalescer
+    if _coalescer is None:
+        with _COALESCER_LOCK:
+            if _coalescer is None:
+                _coalescer = EmbedCoalescer()
+    return _coalescer
+
+
+def embed_query(text: str, tenant_id: str = None):
+    """
+    Embeds one query text (1-D float32 array), batched with whatever other
+    queries arrive at the same moment (see EmbedCoalescer).
+    """
+    if COALESCE_WINDOW_MS <= 0:
+        return _embed_single(text, tenant_id=tenant_id)
+    return get_coalescer().embed(text, tenant_id=tenant_id)
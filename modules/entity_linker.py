@@ -0,0 +1,138 @@
+"""
+Entity linking: finds KG node labels mentioned in a question.
+A token-level Aho-Corasick automaton is compiled once per KG index over its
+normalized labels, so one linear pass over the question finds every label,
+however many labels the KB has. When nodes are added, a new automaton is
+compiled on a background thread while queries keep using the previous one.
+"""
+
+import re
+import threading
+
+# Labels shorter than this match too much ordinary text to be useful
+MIN_LABEL_CHARS = 3
+
+_TOKEN = re.compile(r"\w+")
+
+# Serializes compiles; _BUILDING holds the ids of indexes with one in progress
+_COMPILE_LOCK = threading.Lock()
+_BUILDING = set()
+
+
+def tokenize(text: str) -> list:
+    return _TOKEN.findall((text or "").lower())
+
+
+class EntityLinker:
+    def __init__(self, labels):
+        # State 0 is the root; goto[s] maps a token to the next state
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [None]     # normalized label ending at this state
+        self.depth = [0]
+        self.dict_link = [0]  # nearest state on the fail chain with an output
+        for label in labels:
+            self._insert(label)
+        self._build_links()
+
+    def _insert(self, label: str):
+        tokens = tokenize(label)
+        if not tokens or len(" ".join(tokens)) < MIN_LABEL_CHARS:
+            return
+        state = 0
+        for tok in tokens:
+            nxt = self.goto[state].get(tok)
+            if nxt is None:
+                nxt = len(self.goto)
+                self.goto[state][tok] = nxt
+                self.goto.append({})
+                self.fail.append(0)
+                self.out.append(None)
+                self.depth.append(self.depth[state] + 1)
+                self.dict_link.append(0)
+            state = nxt
+        self.out[state] = " ".join(tokens)
+
+    def _build_links(self):
+        queue = list(self.goto[0].values())
+        head = 0
+        while head < len(queue):
+            state = queue[head]
+            head += 1
+            for tok, nxt in self.goto[state].items():
+                f = self.fail[state]
+                while f and tok not in self.goto[f]:
+                    f = self.fail[f]
+                target = self.goto[f].get(tok, 0)
+                self.fail[nxt] = target if target != nxt else 0
+                self.dict_link[nxt] = self.fail[nxt] if self.out[self.fail[nxt]] else self.dict_link[self.fail[nxt]]
+                queue.append(nxt)
+
+    def find(self, text: str) -> list:
+        """
+        Normalized labels mentioned in text: longest match first at each
+        position, non-overlapping, in order of appearance.
+        """
+        goto, fail, out, depth, dict_link = self.goto, self.fail, self.out, self.depth, self.dict_link
+        matches = []  # (start token, end token, label)
+        state = 0
+        for i, tok in enumerate(tokenize(text)):
+            while state and tok not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(tok, 0)
+            s = state if out[state] else dict_link[state]
+            while s:
+                matches.append((i + 1 - depth[s], i + 1, out[s]))
+                s = dict_link[s]
+
+        matches.sort(key=lambda m: (m[0], m[0] - m[1]))
+        found, end = [], 0
+        for start, stop, label in matches:
+            if start >= end:
+                found.append(label)
+                end = stop
+        return found
+
+
+def _compile(index):
+    size = len(index.keys)
+    by_key = {}
+    # A copy: the index may gain labels meanwhile (they go into the next compile)
+    for label, ids in list(index.label_index.items()):
+        by_key.setdefault(" ".join(tokenize(label)), []).extend(ids)
+    index._linker = (size, EntityLinker(by_key.keys()), by_key)
+
+
+def _recompile(index):
+    try:
+        with _COMPILE_LOCK:
+            _compile(index)
+    finally:
+        _BUILDING.discard(id(index))
+
+
+def _compiled(index):
+    """
+    (linker, {token key: [node idx]}) for a KGIndex. The first call compiles
+    it; after nodes were added, the previous automaton is returned while a
+    background thread compiles the new one.
+    """
+    linker = index._linker
+    if linker is None:
+        with _COMPILE_LOCK:
+            if index._linker is None:
+                _compile(index)
+        linker = index._linker
+    elif linker[0] != len(index.keys) and id(index) not in _BUILDING:
+        with _COMPILE_LOCK:
+            if id(index) in _BUILDING:
+                return linker[1], linker[2]
+            _BUILDING.add(id(index))
+        threading.Thread(target=_recompile, args=(index,), daemon=True).start()
+    return linker[1], linker[2]
+
+
+def link_entities(index, text: str) -> list:
+    """Node idx of every KG entity mentioned in text, in order of mention."""
+    linker, by_key = _compiled(index)
+    return [i for key in linker.find(text) for i in by_key[key]]
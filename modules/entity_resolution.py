@@ -0,0 +1,447 @@
+"""
+Entity resolution: maps each document's local KG node ids (n1, n2, ...) to
+stable KB-wide entity ids, so the same entity from many PDFs is one graph node.
+
+Per tenant + KB, incrementally as documents arrive:
+  - blocking on the normalized label (+ type) finds exact repeats,
+  - MinHash over character 3-grams with LSH banding finds near-identical labels,
+    optionally confirmed by cosine similarity of the node embeddings,
+  - union-find records merges of previously separate entities.
+State is kept in memory and persisted under KG_ENTITY_DIR: a full snapshot
+(.json + .npz) plus an append-only log of what each document changed since
+(.jsonl, new embeddings in .vec), folded into the snapshot every
+COMPACT_DOCS entries. Mentions are counted per document, so a document
+resolved again (requeued, re-ingested) replaces its earlier contribution
+and a purged one's is taken back (forget_document).
+"""
+
+import json
+import os
+import threading
+import uuid
+import zlib
+
+import numpy as np
+
+KG_ENTITY_DIR = os.getenv("KG_ENTITY_DIR", "kg_entities")
+ENTITY_PREFIX = "ent_"
+
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+# Estimated Jaccard of the label 3-grams needed to merge on its own,
+# and the lower bar that also needs the embeddings to agree
+JACCARD_MATCH = float(os.getenv("KG_JACCARD_MATCH", "0.8"))
+JACCARD_CANDIDATE = float(os.getenv("KG_JACCARD_CANDIDATE", "0.5"))
+COSINE_MATCH = float(os.getenv("KG_COSINE_MATCH", "0.9"))
+# A band value shared by this many labels is boilerplate ("... inc"), not evidence
+MAX_BUCKET = 64
+# Log entries after which the full state is written out and the log cleared
+COMPACT_DOCS = int(os.getenv("KG_ENTITY_COMPACT_DOCS", "256"))
+
+_PRIME = (1 << 31) - 1
+_rng = np.random.default_rng(1729)
+_A = _rng.integers(1, _PRIME, NUM_PERM, dtype=np.uint64)
+_B = _rng.integers(0, _PRIME, NUM_PERM, dtype=np.uint64)
+
+
+# Legal-form and article tokens that don't tell entities apart
+_NOISE = {"the", "inc", "ltd", "llc", "corp", "co", "plc", "gmbh", "ag", "sa"}
+
+
+def normalize_label(label: str) -> str:
+    tokens = "".join(c if c.isalnum() else " " for c in (label or "").lower()).split()
+    return " ".join(t for t in tokens if t not in _NOISE) or " ".join(tokens)
+
+
+def minhash(text: str) -> np.ndarray:
+    padded = f" {text} "
+    shingles = {padded[i:i + 3] for i in range(max(len(padded) - 2, 1))}
+    x = np.fromiter((zlib.crc32(s.encode()) for s in shingles), dtype=np.uint64, count=len(shingles))
+    # (a * x + b) mod p for every permutation × shingle, min over shingles (fits in uint64)
+    return (((_A[:, None] * x[None, :]) + _B[:, None]) % _PRIME).min(axis=1).astype(np.uint32)
+
+
+def _types_compatible(a: str, b: str) -> bool:
+    return not a or not b or a.lower() == b.lower()
+
+
+def _numbers(norm: str) -> list:
+    # "Model 3" / "Model 5", "2019 report" / "2020 report" are different entities
+    return [t for t in norm.split() if t.isdigit()]
+
+
+class EntityResolver:
+    def __init__(self, tenant_id: str, kb_id: str):
+        self.tenant_id = tenant_id
+        self.kb_id = kb_id
+        self.entities = {}   # gid -> {"label", "type", "mentions", "variants"}
+        self.parent = {}     # union-find; only merged (non-root) gids are stored
+        self.sigs = {}       # gid -> MinHash signature
+        self.vecs = {}       # gid -> unit-length embedding
+        self.by_label = {}   # "normalized label|type" -> gid
+        self.buckets = {}    # (band, band bytes) -> [gid]
+        self.docs = {}       # pdf_id -> {gid: mentions the document contributed}
+        self.seq = 0         # last log entry applied
+        self.logged = 0      # log entries since the last snapshot
+        self._ops = []       # changes made by the document being resolved, for the log
+        self.lock = threading.Lock()
+
+    # ---------- union-find ----------
+
+    def find(self, gid: str) -> str:
+        root = gid
+        while root in self.parent:
+            root = self.parent[root]
+        while gid != root:
+            self.parent[gid], gid = root, self.parent[gid]
+        return root
+
+    def union(self, a: str, b: str) -> str:
+        """Merges two entities; the one seen more often keeps its id."""
+        a, b = self.find(a), self.find(b)
+        if a == b:
+            return a
+        if (self.entities[a]["mentions"], b) < (self.entities[b]["mentions"], a):
+            a, b = b, a
+        self.parent[b] = a
+        self.entities[a]["mentions"] += self.entities[b]["mentions"]
+        return a
+
+    def aliases(self) -> dict:
+        return {gid: self.find(gid) for gid in list(self.parent)}
+
+    # ---------- indexing ----------
+
+    def _index(self, gid: str, norm: str, type_: str, sig: np.ndarray, vec):
+        """Makes one label spelling of an entity findable; repeats are no-ops."""
+        key = f"{norm}|{type_.lower()}"
+        if key in self.by_label:
+            return
+        self.by_label[key] = gid
+        self.sigs.setdefault(gid, sig)
+        if vec is not None:
+            self.vecs.setdefault(gid, vec)
+        for b in range(BANDS):
+            bucket = self.buckets.setdefault((b, sig[b * ROWS:(b + 1) * ROWS].tobytes()), [])
+            if len(bucket) <= MAX_BUCKET:
+                bucket.append(gid)
+
+    def _candidates(self, sig: np.ndarray) -> set:
+        found = set()
+        for b in range(BANDS):
+            bucket = self.buckets.get((b, sig[b * ROWS:(b + 1) * ROWS].tobytes()), ())
+            if len(bucket) <= MAX_BUCKET:
+                found.update(bucket)
+        return {self.find(g) for g in found}
+
+    def _new_gid(self, norm: str, type_: str) -> str:
+        # Deterministic, so a rebuilt state hands out the same ids for the same labels
+        name = f"{self.tenant_id}/{self.kb_id}/{norm}|{type_.lower()}"
+        gid = ENTITY_PREFIX + uuid.uuid5(uuid.NAMESPACE_URL, name).hex[:16]
+        while gid in self.entities:
+            gid = ENTITY_PREFIX + uuid.uuid4().hex[:16]
+        return gid
+
+    def _match(self, norm: str, type_: str, sig: np.ndarray, vec) -> list:
+        """Existing roots this mention belongs to, best first."""
+        exact = self.by_label.get(f"{norm}|{type_.lower()}")
+        if exact:
+            # A spelling already indexed brings no new evidence
+            return [self.find(exact)]
+
+        numbers = _numbers(norm)
+        cands = [g for g in self._candidates(sig)
+                 if g in self.sigs and _types_compatible(self.entities[g]["type"], type_)
+                 and _numbers(normalize_label(self.entities[g]["label"])) == numbers]
+        if not cands:
+            return []
+        jaccard = (np.stack([self.sigs[g] for g in cands]) == sig).mean(axis=1)
+        scored = []
+        for gid, j in zip(cands, jaccard.tolist()):
+            if j >= JACCARD_MATCH:
+                scored.append((j, gid))
+            elif j >= JACCARD_CANDIDATE and vec is not None and gid in self.vecs:
+                if float(self.vecs[gid] @ vec) >= COSINE_MATCH:
+                    scored.append((j, gid))
+        scored.sort(reverse=True)
+        return [g for _, g in scored]
+
+    # ---------- changes (recorded for the log, replayed on load) ----------
+
+    def _new(self, gid: str, label: str, type_: str):
+        self.entities[gid] = {"label": label, "type": type_, "mentions": 0, "variants": []}
+        self._ops.append(["new", gid, label, type_])
+
+    def _mention(self, gid: str, pdf_id: str):
+        self.entities[gid]["mentions"] += 1
+        counts = self.docs.setdefault(pdf_id, {})
+        counts[gid] = counts.get(gid, 0) + 1
+        self._ops.append(["mention", gid])
+
+    def _variant(self, gid: str, norm: str, type_: str):
+        self.entities[gid]["variants"].append([norm, type_])
+        self._ops.append(["variant", gid, norm, type_])
+
+    def _union(self, a: str, b: str) -> str:
+        self._ops.append(["union", a, b])
+        return self.union(a, b)
+
+    def _index_mention(self, gid: str, norm: str, type_: str, sig: np.ndarray, vec):
+        if f"{norm}|{type_.lower()}" in self.by_label:
+            return
+        # Only an embedding the entity didn't have yet needs to be logged
+        self._ops.append(["index", gid, norm, type_, vec if vec is not None and gid not in self.vecs else None])
+        self._index(gid, norm, type_, sig, vec)
+
+    def _forget(self, pdf_id: str) -> bool:
+        """Takes a document's mentions back; False if it contributed none."""
+        counts = self.docs.pop(pdf_id, None)
+        if not counts:
+            return False
+        for gid, n in counts.items():
+            self.entities[self.find(gid)]["mentions"] -= n
+        return True
+
+    def _replay(self, event: dict, vecs: np.ndarray):
+        if "forget" in event:
+            self._forget(event["forget"])
+            return
+        pdf_id = event["pdf"]
+        for op in event["ops"]:
+            kind = op[0]
+            if kind == "new":
+                self._new(op[1], op[2], op[3])
+            elif kind == "mention":
+                self._mention(op[1], pdf_id)
+            elif kind == "variant":
+                self._variant(op[1], op[2], op[3])
+            elif kind == "union":
+                self._union(op[1], op[2])
+            elif kind == "index":
+                vec = None if op[4] is None else vecs[op[4][0]:op[4][0] + op[4][1]]
+                self._index_mention(op[1], op[2], op[3], minhash(op[2]), vec)
+        self._ops = []
+
+    def resolve(self, nodes: list, vectors: list = None, pdf_id: str = None):
+        """
+        Assigns an entity id to every node of one document.
+        Returns ({local id: entity id}, set of entity ids merged away).
+        """
+        self._ops = []
+        mapping, merged = {}, set()
+        for pos, n in enumerate(nodes):
+            label = n.get("label") or n.get("id") or ""
+            type_ = n.get("type") or ""
+            norm = normalize_label(label)
+            sig = minhash(norm)
+            vec = None
+            if vectors is not None:
+                vec = np.asarray(vectors[pos], dtype=np.float32)
+                vec = vec / (np.linalg.norm(vec) + 1e-12)
+
+            roots = self._match(norm, type_, sig, vec)
+            if roots:
+                gid = roots[0]
+                self._mention(gid, pdf_id)
+                if f"{norm}|{type_.lower()}" not in self.by_label:
+                    self._variant(gid, norm, type_)
+                # A mention that matches several entities ties them together
+                for other in roots[1:]:
+                    root = self._union(gid, other)
+                    merged.add(other if root == gid else gid)
+                    gid = root
+            else:
+                gid = self._new_gid(norm, type_)
+                self._new(gid, label, type_)
+                self._mention(gid, pdf_id)
+            self._index_mention(gid, norm, type_, sig, vec)
+            mapping[n.get("id")] = self.find(gid)
+        return mapping, merged
+
+    # ---------- persistence ----------
+
+    def _paths(self):
+        base = os.path.join(KG_ENTITY_DIR, self.tenant_id, self.kb_id)
+        return base + ".json", base + ".npz"
+
+    def _log_paths(self):
+        base = os.path.join(KG_ENTITY_DIR, self.tenant_id, self.kb_id)
+        return base + ".jsonl", base + ".vec"
+
+    def _log(self, event: dict):
+        """Appends one log entry; past COMPACT_DOCS entries the full state is saved instead."""
+        self.seq += 1
+        self.logged += 1
+        if self.logged >= COMPACT_DOCS:
+            self.save()
+            return
+        log_path, vec_path = self._log_paths()
+        os.makedirs(os.path.dirname(log_path), exist_ok=True)
+        ops = event.get("ops", [])
+        if any(op[0] == "index" and op[4] is not None for op in ops):
+            with open(vec_path, "ab") as f:
+                offset = f.tell() // 4
+                for op in ops:
+                    if op[0] == "index" and op[4] is not None:
+                        vec = np.asarray(op[4], dtype=np.float32)
+                        vec.tofile(f)
+                        op[4] = [offset, len(vec)]
+                        offset += len(vec)
+        with open(log_path, "a") as f:
+            f.write(json.dumps({"seq": self.seq, **event}) + "\n")
+
+    def log_document(self, pdf_id: str):
+        """Logs what the last resolve() changed for this document."""
+        self._log({"pdf": pdf_id, "ops": self._ops})
+        self._ops = []
+
+    def forget(self, pdf_id: str):
+        """Takes back a purged document's mentions (caller holds the lock)."""
+        if self._forget(pdf_id):
+            self._log({"forget": pdf_id})
+
+    def save(self):
+        """Writes the full state and clears the log."""
+        meta_path, arr_path = self._paths()
+        os.makedirs(os.path.dirname(meta_path), exist_ok=True)
+        gids = list(self.sigs)
+        vec_gids = [g for g in gids if g in self.vecs]
+        dims = {len(self.vecs[g]) for g in vec_gids}
+        if len(dims) > 1:
+            vec_gids = []  # embedding size changed mid-KB; fall back to MinHash only
+        np.savez(
+            arr_path + ".tmp.npz",
+            gids=np.array(gids, dtype=np.str_),
+            sigs=np.stack([self.sigs[g] for g in gids]) if gids else np.zeros((0, NUM_PERM), np.uint32),
+            vec_gids=np.array(vec_gids, dtype=np.str_),
+            vecs=np.stack([self.vecs[g] for g in vec_gids]) if vec_gids else np.zeros((0, 0), np.float32),
+        )
+        os.replace(arr_path + ".tmp.npz", arr_path)
+        with open(meta_path + ".tmp", "w") as f:
+            json.dump({"entities": self.entities, "parent": self.parent, "docs": self.docs, "seq": self.seq}, f)
+        os.replace(meta_path + ".tmp", meta_path)
+        # Entries up to seq are in the snapshot now; a crash before this point replays none of them
+        for path in self._log_paths():
+            if os.path.exists(path):
+                os.remove(path)
+        self.logged = 0
+
+    @classmethod
+    def load(cls, tenant_id: str, kb_id: str) -> "EntityResolver":
+        resolver = cls(tenant_id, kb_id)
+        meta_path, arr_path = resolver._paths()
+        if os.path.exists(meta_path) and os.path.exists(arr_path):
+            resolver._load_snapshot(meta_path, arr_path)
+        log_path, vec_path = resolver._log_paths()
+        if os.path.exists(log_path):
+            vecs = np.fromfile(vec_path, dtype=np.float32) if os.path.exists(vec_path) else np.zeros(0, np.float32)
+            with open(log_path, "r") as f:
+                for line in f:
+                    if not line.endswith("\n"):
+                        break  # torn last line from an interrupted write
+                    event = json.loads(line)
+                    if event["seq"] > resolver.seq:
+                        resolver._replay(event, vecs)
+                        resolver.seq = event["seq"]
+                        resolver.logged += 1
+        return resolver
+
+    def _load_snapshot(self, meta_path: str, arr_path: str):
+        with open(meta_path, "r") as f:
+            meta = json.load(f)
+        self.entities = meta["entities"]
+        self.parent = meta["parent"]
+        self.docs = meta.get("docs", {})
+        self.seq = meta.get("seq", 0)
+        with np.load(arr_path, allow_pickle=False) as z:
+            vecs = dict(zip(z["vec_gids"].tolist(), z["vecs"]))
+            for gid, sig in zip(z["gids"].tolist(), z["sigs"]):
+                ent = self.entities[gid]
+                self._index(gid, normalize_label(ent["label"]), ent["type"], sig, vecs.get(gid))
+        # Other spellings merged into an entity are few; their signatures are recomputed
+        for gid, ent in self.entities.items():
+            for norm, type_ in ent["variants"]:
+                self._index(gid, norm, type_, minhash(norm), None)
+
+
+_RESOLVERS = {}
+_LOCK = threading.Lock()
+
+
+def get_resolver(tenant_id: str, kb_id: str) -> EntityResolver:
+    with _LOCK:
+        key = (tenant_id, kb_id)
+        if key not in _RESOLVERS:
+            _RESOLVERS[key] = EntityResolver.load(tenant_id, kb_id)
+        return _RESOLVERS[key]
+
+
+def resolve_kg(kg: dict, tenant_id: str, kb_id: str, pdf_id: str, vectors=None):
+    """
+    Rewrites one document's graph onto KB-wide entity ids. A document
+    resolved before (a requeued or re-ingested build) first has its earlier
+    mentions taken back. Returns (kg with one node per entity and
+    deduplicated edges, the node vectors in the same order as an (n, dim)
+    float32 array, entity ids merged away).
+    """
+    nodes = kg.get("nodes", [])
+    resolver = get_resolver(tenant_id, kb_id)
+    with resolver.lock:
+        resolver.forget(pdf_id)
+        mapping, merged = resolver.resolve(nodes, vectors, pdf_id)
+        resolver.log_document(pdf_id)
+        # Later mentions in the same document may have merged earlier ones' entities
+        mapping = {local: resolver.find(gid) for local, gid in mapping.items()}
+
+    out_nodes, keep, seen = [], [], set()
+    for pos, n in enumerate(nodes):
+        gid = mapping[n.get("id")]
+        if gid in seen:
+            continue
+        seen.add(gid)
+        out_nodes.append({"id": gid, "label": n.get("label"), "type": n.get("type")})
+        keep.append(pos)
+
+    out_edges, seen_edges = [], set()
+    for e in kg.get("edges", []):
+        # Endpoints the extractor never declared as nodes keep a document-local id
+        src = mapping.get(e.get("source"), e.get("source"))
+        dst = mapping.get(e.get("target"), e.get("target"))
+        key = (src, dst, e.get("relation"))
+        if src == dst or key in seen_edges:
+            continue
+        seen_edges.add(key)
+        out_edges.append({"source": src, "target": dst, "relation": e.get("relation")})
+
+    out_vecs = np.asarray(vectors, dtype=np.float32)[keep] if vectors is not None else None
+    return {"nodes": out_nodes, "edges": out_edges}, out_vecs, merged
+
+
+def forget_document(tenant_id: str, kb_id: str, pdf_id: str):
+    """Takes a purged document's mentions back out of the KB's entity counts."""
+    resolver = get_resolver(tenant_id, kb_id)
+    with resolver.lock:
+        resolver.forget(pdf_id)
+
+
+def drop_resolver(tenant_id: str, kb_id: str):
+    with _LOCK:
+        _RESOLVERS.pop((tenant_id, kb_id), None)
+        resolver = EntityResolver(tenant_id, kb_id)
+        for path in resolver._paths() + resolver._log_paths():
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def drop_kb_resolvers(kb_id: str):
+    """Drops a KB's resolver state whatever tenant it belongs to (used by the orphan GC)."""
+    with _LOCK:
+        for key in [k for k in _RESOLVERS if k[1] == kb_id]:
+            del _RESOLVERS[key]
+    if os.path.isdir(KG_ENTITY_DIR):
+        for tenant in os.listdir(KG_ENTITY_DIR):
+            resolver = EntityResolver(tenant, kb_id)
+            for path in resolver._paths() + resolver._log_paths():
+                if os.path.exists(path):
+                    os.remove(path)
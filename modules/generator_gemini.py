@@ -1,26 +1,128 @@
 """
-Gemini text-generation helper provides generate_answer(prompt) → string.
+Gemini text-generation helper provides generate_answer(prompt) → string,
+and generate_answer_stream(prompt) → iterator of text pieces as Gemini produces them.
+Raises RuntimeError (RateLimitedError when quota is the cause) instead of returning error text.
+
+Both take a deadline (time.monotonic() value) and raise DeadlineExceeded
+once it passes; request timeouts and retry backoff are cut to what is left
+of it. generate_answer also hedges: when the request has not answered by
+HEDGE_PERCENTILE of recent latencies, a duplicate goes out and whichever
+answers first wins. benchmarks/generation_hedging.py measures the effect
+against a stub with injected tail latency.
 """
 
 import os
-import requests
+import json
+import random
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from dotenv import load_dotenv
 import time
+from modules.rate_limiter import get_limiter, RateLimitedError
+from modules.http_session import get_session
 
 load_dotenv()
 
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if not GEMINI_API_KEY:
-    raise RuntimeError("GEMINI_API_KEY not set in environment.")
-
 _GEN_URL = (
     "https://generativelanguage.googleapis.com/v1beta/models/"
-    "gemini-2.5-flash:generateContent?key=" + GEMINI_API_KEY
+    "gemini-2.5-flash:generateContent?key={key}"
+)
+_STREAM_URL = (
+    "https://generativelanguage.googleapis.com/v1beta/models/"
+    "gemini-2.5-flash:streamGenerateContent?alt=sse&key={key}"
 )
 
+# Time a call may take when the caller passes no deadline
+GENERATE_TIMEOUT = float(os.getenv("GENERATE_TIMEOUT_SECONDS", "60"))
+# Percentile of recent latencies after which a duplicate request is sent (0 disables hedging)
+HEDGE_PERCENTILE = float(os.getenv("GENERATE_HEDGE_PERCENTILE", "95"))
+# Hedge delay until HEDGE_MIN_SAMPLES latencies have been seen
+HEDGE_DEFAULT_SECONDS = float(os.getenv("GENERATE_HEDGE_AFTER", "10"))
+HEDGE_MIN_SAMPLES = 20
+# No hedging while the limiter is cut this far below its max rate; duplicates would add to the 429s
+HEDGE_MAX_PRESSURE = 0.3
+# Failed requests (not counting 429s, which the limiter retries) before giving up
+MAX_ATTEMPTS = 3
+
+# Requests run here so the caller can wait on the first of two; a request
+# that lost the race finishes (or times out at the deadline) in the background
+_POOL = ThreadPoolExecutor(max_workers=int(os.getenv("GENERATE_THREADS", "64")),
+                           thread_name_prefix="gemini-generate")
+
+
+class DeadlineExceeded(RuntimeError):
+    """The caller's latency budget ran out before Gemini answered."""
+
+
+class _LatencyTracker:
+    """Recent generateContent latencies and hedging counters."""
+
+    def __init__(self, size: int = 500):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "hedged": 0, "hedge_wins": 0, "deadline_exceeded": 0}
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+    def hedge_after(self):
+        """Seconds to wait before hedging, or None when hedging is off."""
+        if HEDGE_PERCENTILE <= 0:
+            return None
+        with self._lock:
+            samples = sorted(self._samples)
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return HEDGE_DEFAULT_SECONDS
+        return samples[min(len(samples) - 1, int(len(samples) * HEDGE_PERCENTILE / 100))]
+
+
+LATENCY = _LatencyTracker()
+
+
+def _remaining(deadline: float) -> float:
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise DeadlineExceeded("Latency budget exhausted before Gemini answered")
+    return remaining
+
+
+def _backoff(failures: int, deadline: float) -> float:
+    # Jittered exponential, never sleeping through more than half of what is left
+    return min(random.uniform(0.5, 1.0) * 2 ** (failures - 1), (deadline - time.monotonic()) / 2)
+
+
+def _api_key() -> str:
+    # Checked on first call rather than at import
+    key = os.getenv("GEMINI_API_KEY")
+    if not key:
+        raise RuntimeError("GEMINI_API_KEY not set in environment.")
+    return key
+
 
-def generate_answer(prompt: str, max_tokens: int = 512) -> str:
-    payload = {
+def _post(payload: dict, timeout: float = 60) -> dict:
+    r = get_session().post(_GEN_URL.format(key=_api_key()), json=payload, timeout=timeout)
+    r.raise_for_status()
+    return r.json()
+
+
+def _open_stream(payload: dict, timeout: float = 60):
+    r = get_session().post(_STREAM_URL.format(key=_api_key()), json=payload, timeout=timeout, stream=True)
+    try:
+        r.raise_for_status()
+    except Exception:
+        r.close()
+        raise
+    return r
+
+
+def _payload(prompt: str, max_tokens: int) -> dict:
+    return {
         "contents": [
             {"parts": [{"text": prompt}]}
         ],
@@ -30,15 +132,121 @@ def generate_answer(prompt: str, max_tokens: int = 512) -> str:
         }
     }
 
-    attempts = 3
-    for attempt in range(attempts):
+
+def _limited(limiter, fn, tenant_id: str, deadline: float):
+    """fn(timeout) under the shared limiter (429s are retried there), never past the deadline."""
+    try:
+        return limiter.call(lambda: fn(_remaining(deadline)), tenant_id=tenant_id, timeout=_remaining(deadline))
+    except RateLimitedError:
+        # Gave up waiting for quota because the budget ran out
+        _remaining(deadline)
+        raise
+
+
+def generate_answer(prompt: str, max_tokens: int = 512, tenant_id: str = None, deadline: float = None) -> str:
+    """
+    Hedged, deadline-bounded generateContent call. deadline is a
+    time.monotonic() value (default GENERATE_TIMEOUT from now); raises
+    DeadlineExceeded when it passes without an answer.
+    """
+    payload = _payload(prompt, max_tokens)
+    deadline = deadline or time.monotonic() + GENERATE_TIMEOUT
+    limiter = get_limiter("generate")
+    LATENCY.count("calls")
+
+    def post(timeout):
+        t0 = time.monotonic()
+        data = _post(payload, timeout=timeout)
+        LATENCY.record(time.monotonic() - t0)
+        return data
+
+    def attempt():
+        data = _limited(limiter, post, tenant_id, deadline)
+        return data["candidates"][0]["content"]["parts"][0].get("text", "")
+
+    in_flight = {}  # future → True for the hedge
+    failures, hedged, last_error = 0, False, None
+    started = retry_at = time.monotonic()
+    hedge_after = LATENCY.hedge_after()
+    while True:
         try:
-            r = requests.post(_GEN_URL, json=payload, timeout=60)
-            r.raise_for_status()
-            data = r.json()
-            return data["candidates"][0]["content"]["parts"][0].get("text", "")
+            remaining = _remaining(deadline)
+        except DeadlineExceeded:
+            LATENCY.count("deadline_exceeded")
+            raise
+        now = time.monotonic()
+        if not in_flight:
+            if failures >= MAX_ATTEMPTS:
+                raise RuntimeError(f"Gemini API error: {last_error}")
+            if now < retry_at:
+                time.sleep(min(retry_at - now, remaining))
+                continue
+            in_flight[_POOL.submit(attempt)] = False
+            started = now
+
+        wait_for = remaining
+        can_hedge = (not hedged and hedge_after is not None and limiter.pressure < HEDGE_MAX_PRESSURE)
+        if can_hedge:
+            wait_for = min(wait_for, max(0.0, started + hedge_after - now))
+        done, _ = wait(in_flight, timeout=wait_for, return_when=FIRST_COMPLETED)
+
+        for fut in done:
+            is_hedge = in_flight.pop(fut)
+            try:
+                text = fut.result()
+            except (RateLimitedError, DeadlineExceeded):
+                if in_flight:
+                    continue
+                if isinstance(fut.exception(), DeadlineExceeded):
+                    LATENCY.count("deadline_exceeded")
+                raise
+            except Exception as e:
+                # Transient network / server error: retry unless the other request is still going
+                failures += 1
+                last_error = e
+                retry_at = time.monotonic() + _backoff(failures, deadline)
+                continue
+            if is_hedge:
+                LATENCY.count("hedge_wins")
+            return text
+
+        if not done and can_hedge and time.monotonic() >= started + hedge_after:
+            hedged = True
+            LATENCY.count("hedged")
+            in_flight[_POOL.submit(attempt)] = True
+
+
+def generate_answer_stream(prompt: str, max_tokens: int = 512, tenant_id: str = None, deadline: float = None):
+    """
+    Yields the answer in pieces as they arrive (server-sent events).
+    Opening the stream is retried like generate_answer, within the deadline
+    (DeadlineExceeded if it can't be opened in time); once text has been
+    yielded, an error is raised instead of starting over.
+    """
+    payload = _payload(prompt, max_tokens)
+    deadline = deadline or time.monotonic() + GENERATE_TIMEOUT
+    limiter = get_limiter("generate")
+    for attempt in range(MAX_ATTEMPTS):
+        try:
+            resp = _limited(limiter, lambda timeout: _open_stream(payload, timeout), tenant_id, deadline)
+            break
+        except (RateLimitedError, DeadlineExceeded):
+            raise
         except Exception as e:
-            if attempt < attempts - 1:
-                time.sleep(2 ** attempt)
+            if attempt < MAX_ATTEMPTS - 1:
+                time.sleep(max(0.0, _backoff(attempt + 1, deadline)))
                 continue
-            return f"Gemini API error: {str(e)}"
+            raise RuntimeError(f"Gemini API error: {e}")
+
+    with resp:
+        try:
+            for line in resp.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data:"):
+                    continue
+                data = json.loads(line[5:])
+                for cand in data.get("candidates", [])[:1]:
+                    for part in cand.get("content", {}).get("parts", []):
+                        if part.get("text"):
+                            yield part["text"]
+        except Exception as e:
+            raise RuntimeError(f"Gemini stream error: {e}")
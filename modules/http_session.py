@@ -0,0 +1,30 @@
+"""
+Shared requests.Session for outbound HTTP (Gemini, Weaviate batch writes).
+One pooled session per process keeps connections (and TLS handshakes) warm
+across calls and threads instead of opening a new connection per request.
+"""
+
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Connections kept open per host; match it to the busiest thread pool (SERVER_THREADS)
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "64"))
+
+_session = None
+_LOCK = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    global _session
+    if _session is None:
+        with _LOCK:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=HTTP_POOL_SIZE)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
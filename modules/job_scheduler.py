@@ -0,0 +1,195 @@
+"""
+Job scheduler for the ingestion worker pool (modules/worker.py).
+
+Picks the next job in three steps:
+  1. priority class, strictly: interactive before bulk before background
+  2. within a class, weighted fair queuing across tenants (start-time fair
+     queuing on job cost), so one tenant's 5,000-file bulk load shares the
+     workers with everyone else's instead of queueing them behind it
+  3. within a tenant, earliest deadline first, then submission order
+
+A job's cost is its file size in MB for ingests (at least 1), otherwise 1.
+Tenant weights come from TENANT_WEIGHTS="acme=4,beta=2" (default 1): a
+tenant with weight 2 gets twice the share of a weight-1 tenant while both
+have work queued.
+"""
+
+import heapq
+import itertools
+import os
+import threading
+import time
+
+PRIORITIES = ("interactive", "bulk", "background")
+
+
+def _parse_weights(spec: str) -> dict:
+    weights = {}
+    for part in spec.split(","):
+        name, _, value = part.partition("=")
+        if name.strip() and value.strip():
+            weights[name.strip()] = float(value)
+    return weights
+
+
+TENANT_WEIGHTS = _parse_weights(os.getenv("TENANT_WEIGHTS", ""))
+
+
+class JobCancelled(Exception):
+    """Raised at a pipeline checkpoint once a job is cancelled or past its deadline."""
+
+    def __init__(self, message: str, status: str = "cancelled"):
+        super().__init__(message)
+        self.status = status
+
+
+def job_cost(job: dict) -> float:
+    path = job.get("path")
+    if job.get("type") == "ingest" and path:
+        try:
+            return max(1.0, os.path.getsize(path) / 1e6)
+        except OSError:
+            pass
+    return 1.0
+
+
+class _FairQueue:
+    """One priority class: a heap of jobs per tenant plus fair-queuing tags."""
+
+    def __init__(self):
+        self.tenants = {}   # tenant → heap of (deadline, seq, job)
+        self.finish = {}    # tenant → virtual finish tag of its last dispatched job
+        self.vtime = 0.0
+
+    def copy(self):
+        other = _FairQueue()
+        other.tenants = {t: list(heap) for t, heap in self.tenants.items()}
+        other.finish = dict(self.finish)
+        other.vtime = self.vtime
+        return other
+
+    def push(self, entry: tuple):
+        heapq.heappush(self.tenants.setdefault(entry[2]["tenant_id"], []), entry)
+
+    def _start(self, tenant) -> float:
+        # A tenant returning after an idle spell starts at the current virtual
+        # time; it doesn't get to spend the share it didn't use
+        return max(self.vtime, self.finish.get(tenant, 0.0))
+
+    def pop(self, weight) -> dict:
+        tenant = min(self.tenants, key=lambda t: (self._start(t), self.tenants[t][0][1]))
+        heap = self.tenants[tenant]
+        job = heapq.heappop(heap)[2]
+        if not heap:
+            del self.tenants[tenant]
+        start = self._start(tenant)
+        self.finish[tenant] = start + job["_cost"] / weight(tenant)
+        self.vtime = start
+        return job
+
+    def remove(self, job: dict) -> bool:
+        heap = self.tenants.get(job["tenant_id"], [])
+        for i, entry in enumerate(heap):
+            if entry[2] is job:
+                heap.pop(i)
+                heapq.heapify(heap)
+                if not heap:
+                    del self.tenants[job["tenant_id"]]
+                return True
+        return False
+
+
+class JobScheduler:
+    """
+    Thread-safe priority / fair-share queue of job dicts. A job carries
+    "job_id", "tenant_id", "priority" (one of PRIORITIES) and optionally
+    "_deadline" (time.monotonic() value).
+    """
+
+    def __init__(self, weights: dict = None):
+        self.weights = dict(TENANT_WEIGHTS if weights is None else weights)
+        lock = threading.Lock()
+        self._ready = threading.Condition(lock)
+        self._deadline_changed = threading.Condition(lock)
+        self._classes = {p: _FairQueue() for p in PRIORITIES}
+        self._queued = {}       # job_id → job
+        self._deadlines = []    # heap of (deadline, job_id); stale entries skipped
+        self._seq = itertools.count()
+        self._version = 0
+        self._order = (-1, [])
+
+    def _weight(self, tenant) -> float:
+        return self.weights.get(tenant, 1.0)
+
+    def put(self, job: dict):
+        if job.get("priority", "interactive") not in PRIORITIES:
+            raise ValueError(f"Unknown priority {job.get('priority')!r} (expected one of {', '.join(PRIORITIES)})")
+        job.setdefault("_cost", job_cost(job))
+        deadline = job.get("_deadline")
+        with self._ready:
+            self._classes[job.get("priority", "interactive")].push(
+                (float("inf") if deadline is None else deadline, next(self._seq), job))
+            self._queued[job["job_id"]] = job
+            self._version += 1
+            self._ready.notify()
+            if deadline is not None:
+                heapq.heappush(self._deadlines, (deadline, job["job_id"]))
+                self._deadline_changed.notify()
+
+    def get(self) -> dict:
+        """Blocks until a job is queued and returns the one that should run next."""
+        with self._ready:
+            while not self._queued:
+                self._ready.wait()
+            for name in PRIORITIES:
+                queue = self._classes[name]
+                if queue.tenants:
+                    job = queue.pop(self._weight)
+                    del self._queued[job["job_id"]]
+                    self._version += 1
+                    return job
+
+    def remove(self, job_id: str):
+        """Takes a queued job out of the queue; returns it, or None if it isn't queued."""
+        with self._ready:
+            job = self._queued.pop(job_id, None)
+            if job is not None:
+                self._classes[job.get("priority", "interactive")].remove(job)
+                self._version += 1
+            return job
+
+    def wait_expired(self) -> list:
+        """Blocks until some queued job's deadline passes; removes and returns those jobs."""
+        with self._deadline_changed:
+            while True:
+                now = time.monotonic()
+                expired = []
+                while self._deadlines and self._deadlines[0][0] <= now:
+                    _, job_id = heapq.heappop(self._deadlines)
+                    job = self._queued.pop(job_id, None)
+                    if job is not None:
+                        self._classes[job.get("priority", "interactive")].remove(job)
+                        expired.append(job)
+                if expired:
+                    self._version += 1
+                    return expired
+                self._deadline_changed.wait(self._deadlines[0][0] - now if self._deadlines else None)
+
+    def order(self) -> list:
+        """Queued jobs in the order they would be dispatched if nothing else arrived."""
+        with self._ready:
+            if self._order[0] == self._version:
+                return self._order[1]
+            classes = [self._classes[p].copy() for p in PRIORITIES]
+            version = self._version
+        order = []
+        for queue in classes:
+            while queue.tenants:
+                order.append(queue.pop(self._weight))
+        with self._ready:
+            self._order = (version, order)
+        return order
+
+    def __len__(self):
+        with self._ready:
+            return len(self._queued)
@@ -1,10 +1,16 @@
 """
 KG Extractor this is just the extractor file
-Uses Gemini to extract nodes & edges from full PDF text.
+extract_kg(full_text) → {"nodes", "edges"}, by KG_STRATEGY:
+  local      heuristic patterns + sentence co-occurrence (modules/kg_local.py), no LLM call
+  llm        Gemini extracts nodes & edges from the full PDF text
+  local+llm  the local graph, upgraded with Gemini's typed nodes and relations
 """
 
 import os
-import google.generativeai as genai
+from modules.rate_limiter import get_limiter, RateLimitedError
+
+KG_STRATEGY = os.getenv("KG_STRATEGY", "local").lower()
+STRATEGIES = ("local", "llm", "local+llm")
 
 KG_SCHEMA = {
     "type": "object",
@@ -37,13 +43,69 @@ KG_SCHEMA = {
     "required": ["nodes", "edges"]
 }
 
-# Configuration of Gemini client
-API_KEY = os.getenv("GEMINI_API_KEY")
-genai.configure(api_key=API_KEY)
 MODEL = "models/gemini-2.5-flash"
 
-
-def extract_kg(full_text: str) -> dict:
+_genai = None
+
+
+def _get_genai():
+    # google.generativeai is slow to import; only ingestion needs it
+    global _genai
+    if _genai is None:
+        import google.generativeai as genai
+        genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+        _genai = genai
+    return _genai
+
+
+def extract_kg(full_text: str, tenant_id: str = None, strategy: str = None) -> dict:
+    strategy = (strategy or KG_STRATEGY).lower()
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown KG strategy {strategy!r} (expected one of {', '.join(STRATEGIES)})")
+    if strategy == "llm":
+        return extract_kg_llm(full_text, tenant_id=tenant_id)
+
+    from modules.kg_local import extract_kg_local
+    kg = extract_kg_local(full_text)
+    if strategy == "local+llm":
+        kg = merge_kg(kg, extract_kg_llm(full_text, tenant_id=tenant_id))
+    return kg
+
+
+def merge_kg(base: dict, upgrade: dict) -> dict:
+    """
+    Union of two graphs of one document. Nodes with the same label are one
+    node, taking the upgrade's type; upgrade nodes and edges are renumbered
+    after the base ones. A pair related in both keeps the upgrade's relation.
+    """
+    from modules.kg_local import normalize_label
+
+    nodes = [dict(n) for n in base.get("nodes", [])]
+    by_label = {normalize_label(n.get("label") or n["id"]): n for n in nodes}
+    ids = {}
+    for n in upgrade.get("nodes", []):
+        key = normalize_label(n.get("label") or n.get("id") or "")
+        if key in by_label:
+            if n.get("type"):
+                by_label[key]["type"] = n["type"]
+            ids[n.get("id")] = by_label[key]["id"]
+            continue
+        node = {"id": f"n{len(nodes) + 1}", "label": n.get("label"), "type": n.get("type")}
+        nodes.append(node)
+        by_label[key] = node
+        ids[n.get("id")] = node["id"]
+
+    edges = {}
+    for e in base.get("edges", []):
+        edges[frozenset((e["source"], e["target"]))] = dict(e)
+    for e in upgrade.get("edges", []):
+        source, target = ids.get(e.get("source")), ids.get(e.get("target"))
+        if source and target and source != target:
+            edges[frozenset((source, target))] = {"source": source, "target": target, "relation": e.get("relation")}
+    return {"nodes": nodes, "edges": list(edges.values())}
+
+
+def extract_kg_llm(full_text: str, tenant_id: str = None) -> dict:
 
     prompt = """
 You are a Knowledge Graph extraction engine.
@@ -71,14 +133,19 @@ Return ONLY a valid JSON object in the following format:
 - Merge duplicate entities into a single node.
 
 ### DOCUMENT TEXT
------------------{}
+-----------------
 """
 
     import re, json
     try:
-        model = genai.GenerativeModel(MODEL)
-        response = model.generate_content(prompt.format(full_text))
+        model = _get_genai().GenerativeModel(MODEL)
+        response = get_limiter("generate").call(
+            # Concatenated, not .format(): the JSON example's braces would be read as fields
+            lambda: model.generate_content(prompt + full_text), tenant_id=tenant_id
+        )
         raw = response.text.strip()
+    except RateLimitedError:
+        raise
     except Exception as e:
         raise RuntimeError("Gemini KG extraction failed: {}".format(e))
 
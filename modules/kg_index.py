@@ -0,0 +1,497 @@
+"""
+In-memory knowledge-graph index, one per tenant + KB.
+Adjacency is stored in CSR form (int32 offsets, int32 neighbour ids, interned
+int32 relation ids), built once from KG_Node / KG_Edge in Weaviate and
+persisted as .npz under KG_INDEX_DIR for fast reload. store_kg appends new
+documents incrementally: their graphs go to a small append-only delta log
+next to the .npz, which is only rewritten when the delta is compacted.
+Purges drop the index so it is rebuilt on next use.
+
+Loading, rebuilding and updating an index hold that KB's own lock; queries
+read without it and do not wait for a rebuild (get_kg_index(wait=False)
+runs it in the background). The adjacency a query reads (CSR arrays plus
+the uncompacted delta) is one immutable _Adjacency that writers replace in
+a single assignment.
+"""
+
+import json
+import os
+import threading
+
+import numpy as np
+
+from modules.entity_resolution import ENTITY_PREFIX, get_resolver
+from modules.store_weaviate import class_exists, iter_objects
+
+KG_INDEX_DIR = os.getenv("KG_INDEX_DIR", "kg_index")
+
+# Pending incremental edges are folded into the CSR arrays past this size
+_COMPACT_MIN_EDGES = 1024
+
+
+def _normalize(label: str) -> str:
+    return " ".join((label or "").lower().split())
+
+
+def node_key(pdf_id: str, node_id: str) -> str:
+    # Resolved entity ids are KB-wide; raw extractor ids (n1, n2, ...) only unique per document
+    if node_id and node_id.startswith(ENTITY_PREFIX):
+        return node_id
+    return f"{pdf_id}:{node_id}"
+
+
+class _Adjacency:
+    __slots__ = ("offsets", "nbrs", "rels", "outgoing", "delta")
+
+    def __init__(self, offsets, nbrs, rels, outgoing, delta):
+        self.offsets = offsets
+        self.nbrs = nbrs
+        self.rels = rels
+        self.outgoing = outgoing
+        self.delta = delta        # node idx -> [(neighbour, relation, outgoing)] not yet in CSR
+
+
+class KGIndex:
+    def __init__(self):
+        self.keys = []            # node key per index
+        self.node_ids = []        # original node_id per index
+        self.labels = []
+        self.types = []
+        self.key_to_idx = {}
+        self.aliases = {}         # merged entity id -> surviving entity id
+        self.label_index = {}     # normalized label -> [node idx]
+        self.relation_names = []
+        self.relation_ids = {}
+
+        self._adj = _Adjacency(np.zeros(1, dtype=np.int32), np.zeros(0, dtype=np.int32),
+                               np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.bool_), {})
+
+        # Incremental edges not yet in the CSR arrays: (src, dst, rel)
+        self._delta = []
+        # Last delta log entry folded into this index
+        self.seq = 0
+
+        # Entity-linking automaton over the labels (modules.entity_linker)
+        self._linker = None
+
+    # ---------- building ----------
+
+    def _intern_relation(self, relation: str) -> int:
+        rid = self.relation_ids.get(relation)
+        if rid is None:
+            rid = len(self.relation_names)
+            self.relation_ids[relation] = rid
+            self.relation_names.append(relation)
+        return rid
+
+    def key_of(self, pdf_id: str, node_id: str) -> str:
+        key = node_key(pdf_id, node_id)
+        return self.aliases.get(key, key)
+
+    def find(self, pdf_id: str, node_id: str):
+        """Node idx of a stored node / edge endpoint, or None."""
+        return self.key_to_idx.get(self.key_of(pdf_id, node_id))
+
+    def _add_node(self, key: str, node_id: str, label: str = None, type_: str = None) -> int:
+        idx = self.key_to_idx.get(key)
+        if idx is not None:
+            return idx
+        idx = len(self.keys)
+        self.key_to_idx[key] = idx
+        self.keys.append(key)
+        self.node_ids.append(node_id)
+        self.labels.append(label or node_id)
+        self.types.append(type_ or "")
+        self.label_index.setdefault(_normalize(label or node_id), []).append(idx)
+        return idx
+
+    def add(self, pdf_id: str, nodes: list, edges: list) -> bool:
+        """
+        Adds one document's extracted graph ({"id","label","type"} nodes,
+        {"source","target","relation"} edges). Edges go to the delta list
+        and are compacted into CSR once it grows. Returns whether it compacted.
+        """
+        for n in nodes:
+            self._add_node(self.key_of(pdf_id, n.get("id")), n.get("id"), n.get("label"), n.get("type"))
+        new = []
+        for e in edges:
+            src = self._add_node(self.key_of(pdf_id, e.get("source")), e.get("source"))
+            dst = self._add_node(self.key_of(pdf_id, e.get("target")), e.get("target"))
+            new.append((src, dst, self._intern_relation(e.get("relation") or "")))
+        self._delta.extend(new)
+
+        adj = self._adj
+        if len(self._delta) > max(_COMPACT_MIN_EDGES, len(adj.nbrs) // 10):
+            self.compact()
+            return True
+        if new:
+            # Copy on write: queries keep reading the previous delta meanwhile
+            delta = dict(adj.delta)
+            for src, dst, rel in new:
+                delta[src] = delta.get(src, []) + [(dst, rel, True)]
+                delta[dst] = delta.get(dst, []) + [(src, rel, False)]
+            self._adj = _Adjacency(adj.offsets, adj.nbrs, adj.rels, adj.outgoing, delta)
+        return False
+
+    def _csr_edges(self, adj: _Adjacency):
+        """Directed (src, dst, rel) arrays of the edges already in CSR form."""
+        rows = np.repeat(np.arange(len(adj.offsets) - 1, dtype=np.int32), np.diff(adj.offsets))
+        out = adj.outgoing
+        return rows[out], adj.nbrs[out], adj.rels[out]
+
+    def compact(self):
+        src, dst, rel = self._csr_edges(self._adj)
+        if self._delta:
+            d = np.asarray(self._delta, dtype=np.int32)
+            src = np.concatenate([src, d[:, 0]])
+            dst = np.concatenate([dst, d[:, 1]])
+            rel = np.concatenate([rel, d[:, 2]])
+
+        n = len(self.keys)
+        # Both directions, so traversal can follow edges either way
+        rows = np.concatenate([src, dst])
+        order = np.argsort(rows, kind="stable")
+        offsets = np.zeros(n + 1, dtype=np.int32)
+        np.cumsum(np.bincount(rows, minlength=n), out=offsets[1:])
+        self._adj = _Adjacency(
+            offsets,
+            np.concatenate([dst, src])[order].astype(np.int32),
+            np.concatenate([rel, rel])[order].astype(np.int32),
+            np.concatenate([np.ones(len(src), np.bool_), np.zeros(len(src), np.bool_)])[order],
+            {},
+        )
+        self._delta = []
+
+    # ---------- queries ----------
+
+    def neighbours(self, idx: int, adj: _Adjacency = None):
+        """(neighbour ids, relation ids, outgoing flags) of one node."""
+        adj = adj or self._adj
+        if idx < len(adj.offsets) - 1:
+            s, e = adj.offsets[idx], adj.offsets[idx + 1]
+            nbrs, rels, out = adj.nbrs[s:e], adj.rels[s:e], adj.outgoing[s:e]
+        else:
+            nbrs = rels = np.zeros(0, dtype=np.int32)
+            out = np.zeros(0, dtype=np.bool_)
+        extra = adj.delta.get(idx)
+        if extra:
+            nbrs = np.concatenate([nbrs, np.fromiter((x[0] for x in extra), np.int32, len(extra))])
+            rels = np.concatenate([rels, np.fromiter((x[1] for x in extra), np.int32, len(extra))])
+            out = np.concatenate([out, np.fromiter((x[2] for x in extra), np.bool_, len(extra))])
+        return nbrs, rels, out
+
+    def degrees(self) -> np.ndarray:
+        adj = self._adj
+        # Read after the adjacency: every node it references is already in keys
+        deg = np.zeros(len(self.keys), dtype=np.int32)
+        deg[:len(adj.offsets) - 1] = np.diff(adj.offsets)
+        for idx, extra in adj.delta.items():
+            deg[idx] += len(extra)
+        return deg
+
+    def lookup(self, term: str, limit: int = 5) -> list:
+        """
+        Node ids whose label matches the term: exact normalized matches first,
+        then labels containing it, highest degree first.
+        """
+        norm = _normalize(term)
+        exact = list(self.label_index.get(norm, []))
+        partial = [i for lbl, ids in list(self.label_index.items()) if norm in lbl and lbl != norm for i in ids]
+        deg = self.degrees()
+        ranked = sorted(exact, key=lambda i: -deg[i]) + sorted(partial, key=lambda i: -deg[i])
+        return ranked[:limit]
+
+    def _frontier_neighbours(self, frontier: np.ndarray, adj: _Adjacency) -> np.ndarray:
+        """All neighbours of a set of nodes, gathered from CSR in one pass."""
+        csr = frontier[frontier < len(adj.offsets) - 1]
+        starts = adj.offsets[csr]
+        lens = adj.offsets[csr + 1] - starts
+        total = int(lens.sum())
+        # Position i of the output reads nbrs[starts[k] + (i - first output slot of k)]
+        pos = np.repeat(starts - np.cumsum(lens) + lens, lens) + np.arange(total, dtype=np.int64)
+        out = adj.nbrs[pos]
+        if adj.delta:
+            extra = [x[0] for i in frontier.tolist() for x in adj.delta.get(i, ())]
+            if extra:
+                out = np.concatenate([out, np.asarray(extra, dtype=np.int32)])
+        return out
+
+    def k_hop(self, seeds: list, k: int = 2, max_nodes: int = 1000) -> dict:
+        """{node idx: hop distance} for everything within k hops of the seeds."""
+        adj = self._adj
+        dist = {int(s): 0 for s in seeds}
+        frontier = np.fromiter(dist, dtype=np.int32, count=len(dist))
+        for hop in range(1, k + 1):
+            if not len(frontier) or len(dist) >= max_nodes:
+                break
+            nxt = []
+            for j in np.unique(self._frontier_neighbours(frontier, adj)).tolist():
+                if j not in dist:
+                    dist[j] = hop
+                    nxt.append(j)
+                    if len(dist) >= max_nodes:
+                        break
+            frontier = np.asarray(nxt, dtype=np.int32)
+        return dist
+
+    def shortest_path(self, src: int, dst: int, max_hops: int = 6):
+        """Node idx list from src to dst (unweighted, level-synchronous BFS), or None."""
+        adj = self._adj
+        parent = np.full(len(self.keys), -2, dtype=np.int32)
+        parent[src] = -1
+        frontier = np.asarray([src], dtype=np.int32)
+        for _ in range(max_hops):
+            if src == dst or not len(frontier):
+                break
+            # (neighbour, parent) pairs, so each newly reached node records where it came from
+            if adj.delta:
+                per_node = [self.neighbours(i, adj)[0] for i in frontier.tolist()]
+                nbrs = np.concatenate(per_node)
+                parents = np.repeat(frontier, [len(x) for x in per_node])
+            else:
+                nbrs = self._frontier_neighbours(frontier, adj)
+                lens = np.zeros(len(frontier), dtype=np.int64)
+                in_csr = frontier < len(adj.offsets) - 1
+                lens[in_csr] = adj.offsets[frontier[in_csr] + 1] - adj.offsets[frontier[in_csr]]
+                parents = np.repeat(frontier, lens)
+            new = parent[nbrs] == -2
+            nbrs, parents = nbrs[new], parents[new]
+            nbrs, first = np.unique(nbrs, return_index=True)
+            parent[nbrs] = parents[first]
+            if parent[dst] != -2:
+                break
+            frontier = nbrs
+        if parent[dst] == -2:
+            return None
+        path = [dst]
+        while parent[path[-1]] != -1:
+            path.append(int(parent[path[-1]]))
+        return path[::-1]
+
+    def expand(self, seeds: list, limit: int = 20) -> list:
+        """Neighbours of the seeds ranked by degree (hubs first), seeds excluded."""
+        deg = self.degrees()
+        seen = set(seeds)
+        cand = []
+        for s in seeds:
+            for j in self.neighbours(s)[0].tolist():
+                if j not in seen:
+                    seen.add(j)
+                    cand.append(j)
+        cand.sort(key=lambda j: -deg[j])
+        return cand[:limit]
+
+    def facts(self, seeds: list, limit: int = 50) -> list:
+        """1-hop edges around the seeds as (source idx, relation, target idx)."""
+        out = []
+        for s in seeds:
+            nbrs, rels, outgoing = self.neighbours(s)
+            for j, r, o in zip(nbrs.tolist(), rels.tolist(), outgoing.tolist()):
+                out.append((s, self.relation_names[r], j) if o else (j, self.relation_names[r], s))
+                if len(out) >= limit:
+                    return out
+        return out
+
+    # ---------- persistence ----------
+
+    def save(self, path: str):
+        if self._delta:
+            self.compact()
+        adj = self._adj
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = path + ".tmp.npz"
+        np.savez(
+            tmp,
+            keys=np.array(self.keys, dtype=np.str_),
+            node_ids=np.array(self.node_ids, dtype=np.str_),
+            labels=np.array(self.labels, dtype=np.str_),
+            types=np.array(self.types, dtype=np.str_),
+            relation_names=np.array(self.relation_names, dtype=np.str_),
+            offsets=adj.offsets,
+            nbrs=adj.nbrs,
+            rels=adj.rels,
+            outgoing=adj.outgoing,
+            seq=np.int64(self.seq),
+        )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "KGIndex":
+        index = cls()
+        with np.load(path, allow_pickle=False) as z:
+            for key, node_id, label, type_ in zip(z["keys"].tolist(), z["node_ids"].tolist(),
+                                                  z["labels"].tolist(), z["types"].tolist()):
+                index._add_node(key, node_id, label, type_)
+            for name in z["relation_names"].tolist():
+                index._intern_relation(name)
+            index._adj = _Adjacency(z["offsets"], z["nbrs"], z["rels"], z["outgoing"], {})
+            index.seq = int(z["seq"]) if "seq" in z.files else 0
+        return index
+
+
+# ---------- per tenant + KB registry ----------
+
+_INDEXES = {}
+# Guards _KB_LOCKS and _BUILDING only; loading, building and updating an
+# index hold that KB's own lock so a cold build never blocks other KBs
+_LOCK = threading.Lock()
+_KB_LOCKS = {}
+_BUILDING = set()
+
+
+def _kb_lock(key) -> threading.Lock:
+    with _LOCK:
+        return _KB_LOCKS.setdefault(key, threading.Lock())
+
+
+def _index_path(tenant_id: str, kb_id: str) -> str:
+    return os.path.join(KG_INDEX_DIR, tenant_id, f"{kb_id}.npz")
+
+
+def _delta_path(tenant_id: str, kb_id: str) -> str:
+    return os.path.join(KG_INDEX_DIR, tenant_id, f"{kb_id}.delta.jsonl")
+
+
+def _load(tenant_id: str, kb_id: str) -> KGIndex:
+    """The saved index plus the documents logged to its delta since."""
+    index = KGIndex.load(_index_path(tenant_id, kb_id))
+    index.aliases = get_resolver(tenant_id, kb_id).aliases()
+    path = _delta_path(tenant_id, kb_id)
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            for line in f:
+                if not line.endswith("\n"):
+                    break  # torn last line from an interrupted write
+                e = json.loads(line)
+                if e["seq"] > index.seq:
+                    index.add(e["pdf"], e["nodes"], e["edges"])
+                    index.seq = e["seq"]
+    return index
+
+
+def _remove(*paths):
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def build_from_weaviate(tenant_id: str, kb_id: str) -> KGIndex:
+    index = KGIndex()
+    index.aliases = get_resolver(tenant_id, kb_id).aliases()
+    if not class_exists("KG_Node"):
+        return index
+
+    def mine(obj):
+        return obj.get("tenant_id") == tenant_id and obj.get("kb_id") == kb_id
+
+    by_pdf = {}
+    for n in iter_objects("KG_Node", ["node_id", "label", "type", "tenant_id", "kb_id", "pdf_id"]):
+        if mine(n):
+            by_pdf.setdefault(n["pdf_id"], ([], []))[0].append(
+                {"id": n["node_id"], "label": n["label"], "type": n["type"]})
+    if class_exists("KG_Edge"):
+        for e in iter_objects("KG_Edge", ["source", "target", "relation", "tenant_id", "kb_id", "pdf_id"]):
+            if mine(e):
+                by_pdf.setdefault(e["pdf_id"], ([], []))[1].append(e)
+
+    for pdf_id, (nodes, edges) in by_pdf.items():
+        index.add(pdf_id, nodes, edges)
+    index.compact()
+    return index
+
+
+def _get(tenant_id: str, kb_id: str) -> KGIndex:
+    """Memory → disk → rebuild from Weaviate."""
+    key = (tenant_id, kb_id)
+    with _kb_lock(key):
+        index = _INDEXES.get(key)
+        if index is not None:
+            return index
+        path = _index_path(tenant_id, kb_id)
+        if os.path.exists(path):
+            index = _load(tenant_id, kb_id)
+        else:
+            index = build_from_weaviate(tenant_id, kb_id)
+            index.save(path)
+            _remove(_delta_path(tenant_id, kb_id))
+        _INDEXES[key] = index
+        return index
+
+
+def _build(tenant_id: str, kb_id: str):
+    try:
+        _get(tenant_id, kb_id)
+    finally:
+        with _LOCK:
+            _BUILDING.discard((tenant_id, kb_id))
+
+
+def get_kg_index(tenant_id: str, kb_id: str, wait: bool = True) -> KGIndex:
+    """
+    Memory → disk → rebuild from Weaviate. With wait=False (the query path)
+    an index that has to be rebuilt is built in the background and None is
+    returned until it is ready.
+    """
+    key = (tenant_id, kb_id)
+    index = _INDEXES.get(key)
+    if index is not None or wait:
+        return index or _get(tenant_id, kb_id)
+    with _LOCK:
+        if key in _BUILDING:
+            return None
+        if os.path.exists(_index_path(tenant_id, kb_id)):
+            building = False
+        else:
+            building = True
+            _BUILDING.add(key)
+    if not building:
+        return _get(tenant_id, kb_id)
+    threading.Thread(target=_build, args=key, daemon=True).start()
+    return None
+
+
+def update_kg_index(tenant_id: str, kb_id: str, pdf_id: str, kg: dict, merged: set = None):
+    """
+    Called after store_kg. Only updates an index that already exists;
+    otherwise the next get_kg_index builds it from Weaviate, this document included.
+    The document is appended to the delta log; the .npz is rewritten only
+    when the delta is compacted. If entity resolution merged existing
+    entities, the index is dropped instead.
+    """
+    if merged:
+        drop_kg_index(tenant_id, kb_id)
+        return
+    key = (tenant_id, kb_id)
+    with _kb_lock(key):
+        path = _index_path(tenant_id, kb_id)
+        index = _INDEXES.get(key)
+        if index is None and os.path.exists(path):
+            index = _load(tenant_id, kb_id)
+            _INDEXES[key] = index
+        if index is None:
+            return
+        nodes = [{"id": n.get("id"), "label": n.get("label"), "type": n.get("type")} for n in kg.get("nodes", [])]
+        edges = [{"source": e.get("source"), "target": e.get("target"), "relation": e.get("relation")}
+                 for e in kg.get("edges", [])]
+        index.seq += 1
+        if index.add(pdf_id, nodes, edges):
+            index.save(path)
+            _remove(_delta_path(tenant_id, kb_id))
+        else:
+            with open(_delta_path(tenant_id, kb_id), "a") as f:
+                f.write(json.dumps({"seq": index.seq, "pdf": pdf_id, "nodes": nodes, "edges": edges}) + "\n")
+
+
+def drop_kg_index(tenant_id: str, kb_id: str):
+    with _kb_lock((tenant_id, kb_id)):
+        _INDEXES.pop((tenant_id, kb_id), None)
+        _remove(_index_path(tenant_id, kb_id), _delta_path(tenant_id, kb_id))
+
+
+def drop_kb_indexes(kb_id: str):
+    """Drops a KB's index whatever tenant it belongs to (used by the orphan GC)."""
+    tenants = {t for t, k in list(_INDEXES) if k == kb_id}
+    if os.path.isdir(KG_INDEX_DIR):
+        tenants.update(os.listdir(KG_INDEX_DIR))
+    for tenant in tenants:
+        drop_kg_index(tenant, kb_id)
@@ -0,0 +1,218 @@
+"""
+Local heuristic KG extraction: no LLM call, CPU-seconds per document.
+
+Nodes are found by surface patterns:
+  - capitalized phrases ("Acme Robotics", "Bank of England"), typed by
+    suffix / honorific (Organization, Person) or Entity; a single capitalized
+    word must also appear mid-sentence and never in lower case
+  - acronyms ("NASA", "GPT4")
+  - recurring keyphrases: 2-3 lower-case words between stopwords, names and
+    punctuation, minus a trailing past-tense verb, kept when they appear at
+    least MIN_PHRASE_COUNT times (Concept)
+
+Edges come from sentence-level co-occurrence: every mention is located in
+one pass over the text, mapped to its sentence with searchsorted, and the
+sentence x entity incidence matrix M gives all pair counts as M.T @ M. A
+pair's relation is the short verb phrase most often found between the two
+mentions ("acquired", "is part of"), else "related_to".
+
+Output has the {"nodes", "edges"} shape of the LLM extractor.
+"""
+
+import os
+import re
+from collections import Counter, defaultdict
+
+MAX_NODES = int(os.getenv("KG_LOCAL_MAX_NODES", "150"))
+MAX_EDGES = int(os.getenv("KG_LOCAL_MAX_EDGES", "300"))
+MIN_PHRASE_COUNT = 3
+# Pairs must share at least this many sentences to become an edge
+MIN_COOCCURRENCE = 2
+# Longest text between two mentions that still reads as their relation
+MAX_RELATION_WORDS = 4
+
+_STOPWORDS = frozenset("""
+a about above after again against all also am an and any are as at be because been before being below
+between both but by can could did do does doing down during each few for from further had has have having
+he her here hers herself him himself his how however i if in into is it its itself just let me more most
+my myself no nor not now of off on once only or other our ours ourselves out over own same she should so
+some such than that the their theirs them themselves then there these they this those through to too
+under until up upon very via was we were what when where which while who whom why will with within
+without would yet you your yours yourself yourselves may might must shall one two three first second new
+used using use based also figure table section page et al e g i e although though thus therefore since
+unless whether whereas moreover furthermore
+""".split())
+
+_ORG_SUFFIXES = ("inc", "inc.", "corp", "corp.", "corporation", "ltd", "ltd.", "llc", "plc", "gmbh", "ag",
+                 "company", "university", "institute", "agency", "bank", "group", "foundation",
+                 "association", "laboratory", "labs", "ministry", "department", "council", "committee")
+_PERSON_TITLES = ("mr", "mr.", "mrs", "mrs.", "ms", "ms.", "dr", "dr.", "prof", "prof.")
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+(?=[\"'(\[]?[A-Z0-9])|\n\s*\n")
+_CAPITALIZED = re.compile(
+    r"\b(?:(?:Mr|Mrs|Ms|Dr|Prof)\.?\s+)?[A-Z][A-Za-z0-9&'\-]*[a-z0-9][A-Za-z0-9&'\-]*"
+    r"(?:\s+(?:(?:of|for|and|the|de|van|von)\s+)?[A-Z][A-Za-z0-9&'\-]*)*"
+)
+_ACRONYM = re.compile(r"\b[A-Z][A-Z0-9&]{1,9}s?\b")
+_WORD = re.compile(r"[A-Za-z][A-Za-z0-9\-]+")
+_RELATION = re.compile(r"^[a-z][a-z\s\-]*$")
+
+
+def normalize_label(label: str) -> str:
+    return " ".join(label.lower().split())
+
+
+def _sentence_starts(text: str) -> list:
+    return [0] + [m.end() for m in _SENTENCE_END.finditer(text)]
+
+
+def _entity_type(label: str) -> str:
+    words = label.lower().split()
+    if words[0] in _PERSON_TITLES:
+        return "Person"
+    if words[-1] in _ORG_SUFFIXES or words[0] in _ORG_SUFFIXES:
+        return "Organization"
+    return "Entity"
+
+
+def _candidates(text: str) -> dict:
+    """normalized label → [display label, type, count]."""
+    found = {}
+    lower_words = set(w.lower() for w in _WORD.findall(text) if w[0].islower())
+    mid_sentence = set()
+
+    def add(label, kind):
+        key = normalize_label(label)
+        # Two-letter acronyms ("EU", "AI") are names; other two-letter labels are noise
+        if (len(key) < 3 and kind != "Acronym") or key in _STOPWORDS:
+            return
+        entry = found.setdefault(key, [label, kind, 0])
+        entry[2] += 1
+
+    for m in _CAPITALIZED.finditer(text):
+        label = m.group(0).strip(" -'&")
+        words = label.split()
+        # Drop stopword edges ("The Board" → "Board")
+        while words and words[0].lower() in _STOPWORDS and words[0].lower() not in _PERSON_TITLES:
+            words = words[1:]
+        while words and words[-1].lower() in _STOPWORDS:
+            words = words[:-1]
+        if not words:
+            continue
+        label = " ".join(words)
+        if label.isupper():
+            # All caps: left to the acronym pass
+            continue
+        if len(words) == 1:
+            if words[0].lower() in lower_words:
+                # Also written in lower case: a common word
+                continue
+            before = text[max(0, m.start() - 8):m.start()].rstrip()[-1:]
+            if before not in ("", ".", "!", "?", '"', "(", ":"):
+                mid_sentence.add(normalize_label(label))
+        add(label, _entity_type(label))
+
+    for m in _ACRONYM.finditer(text):
+        # Next to another all-caps word it is a shouted heading / disclaimer, not an acronym
+        around = text[max(0, m.start() - 20):m.start()].split()[-1:] + text[m.end():m.end() + 20].split()[:1]
+        if any(len(w) > 1 and w.strip(".,;:()\"'").isupper() for w in around):
+            continue
+        add(m.group(0), "Acronym")
+
+    # Keyphrases: runs of lower-case content words; names, stopwords and punctuation end a run
+    phrases = Counter()
+    for segment in re.split(r"[^\w\s\-]|\n", text):
+        run = []
+        for w in segment.split() + [""]:
+            if w and w.islower() and w not in _STOPWORDS and len(w) > 2:
+                run.append(w)
+                continue
+            if run and run[-1].endswith("ed"):
+                # "board reviewed": the verb is not part of the concept
+                run.pop()
+            if 2 <= len(run) <= 3:
+                phrases[" ".join(run)] += 1
+            run = []
+
+    entities = {}
+    for key, entry in found.items():
+        if entry[1] == "Acronym" or len(entry[0].split()) > 1:
+            entities[key] = entry
+        elif entry[2] >= 2 and key in mid_sentence:
+            entities[key] = entry
+    for phrase, count in phrases.items():
+        # A capitalized name found again in lower case keeps its name entry
+        if count >= MIN_PHRASE_COUNT and phrase not in entities:
+            entities[phrase] = [phrase, "Concept", count]
+    return entities
+
+
+def extract_kg_local(full_text: str) -> dict:
+    import numpy as np
+
+    entities = _candidates(full_text)
+    if not entities:
+        return {"nodes": [], "edges": []}
+
+    # Most frequent first; ties broken toward longer (more specific) labels
+    ranked = sorted(entities.items(), key=lambda kv: (-kv[1][2], -len(kv[0]), kv[0]))[:MAX_NODES]
+    keys = [k for k, _ in ranked]
+    nodes = [{"id": f"n{i + 1}", "label": v[0], "type": v[1]} for i, (_, v) in enumerate(ranked)]
+
+    # One pass over the text for every mention; longest labels first so
+    # "Bank of England" wins over "England" at the same position
+    index = {k: i for i, k in enumerate(keys)}
+    pattern = re.compile(r"\b(?:" + "|".join(re.escape(k) for k in sorted(keys, key=len, reverse=True))
+                         + r")\b", re.IGNORECASE)
+    positions, ids, ends = [], [], []
+    for m in pattern.finditer(full_text):
+        i = index.get(normalize_label(m.group(0)))
+        # Acronyms only in capitals: "US" is not "us"
+        if i is not None and (nodes[i]["type"] != "Acronym" or m.group(0).isupper()):
+            positions.append(m.start())
+            ends.append(m.end())
+            ids.append(i)
+    if not ids:
+        return {"nodes": nodes, "edges": []}
+
+    starts = np.asarray(_sentence_starts(full_text))
+    sentence = np.searchsorted(starts, np.asarray(positions), side="right") - 1
+    ids = np.asarray(ids)
+
+    incidence = np.zeros((len(starts), len(keys)), dtype=np.float32)
+    incidence[sentence, ids] = 1.0
+    cooccur = incidence.T @ incidence
+    np.fill_diagonal(cooccur, 0)
+    pairs = np.argwhere(np.triu(cooccur) >= MIN_COOCCURRENCE)
+    if not len(pairs):
+        return {"nodes": nodes, "edges": []}
+    weights = cooccur[pairs[:, 0], pairs[:, 1]]
+    pairs = pairs[np.argsort(-weights, kind="stable")][:MAX_EDGES]
+
+    # Text between consecutive mentions in a sentence → candidate relation, in reading order
+    wanted = set(map(tuple, pairs.tolist())) | set((b, a) for a, b in pairs.tolist())
+    between = defaultdict(Counter)
+    for j in range(len(ids) - 1):
+        if sentence[j] != sentence[j + 1]:
+            continue
+        a, b = int(ids[j]), int(ids[j + 1])
+        if (a, b) not in wanted:
+            continue
+        # "." too: the one closing "Inc." / "Corp." right after a mention
+        gap = full_text[ends[j]:positions[j + 1]].strip(" ,;:.").lower()
+        gap = " ".join(gap.split())
+        words = gap.split()
+        if (words and len(words) <= MAX_RELATION_WORDS and _RELATION.match(gap)
+                and any(w not in _STOPWORDS for w in words)):
+            between[(a, b)][gap] += 1
+
+    edges = []
+    for a, b in pairs.tolist():
+        forward, backward = between.get((a, b)), between.get((b, a))
+        if backward and (not forward or sum(backward.values()) > sum(forward.values())):
+            a, b, seen = b, a, backward
+        else:
+            seen = forward
+        relation = seen.most_common(1)[0][0].replace(" ", "_") if seen else "related_to"
+        edges.append({"source": nodes[a]["id"], "target": nodes[b]["id"], "relation": relation})
+    return {"nodes": nodes, "edges": edges}
@@ -1,16 +1,35 @@
 """
 KG Store
 Creates Weaviate schema for KG nodes & edges and stores extracted graphs.
+Node labels are embedded ("label (type)") so nodes can be found with near_vector.
 """
 
-import weaviate
 import os
+import threading
+from collections import OrderedDict
 from modules.store_weaviate import get_client
 
+# Parallel ingest workers may all try to create the classes on first run
+_SCHEMA_LOCK = threading.Lock()
+
+# The same entities recur across the documents of a KB; their label
+# embeddings are kept (bounded, least recently used dropped first)
+LABEL_CACHE_SIZE = int(os.getenv("KG_LABEL_CACHE_SIZE", "50000"))
+_LABEL_CACHE = OrderedDict()
+_CACHE_LOCK = threading.Lock()
+
+# Node matches further than this (cosine distance) from the query are dropped
+NODE_MAX_DISTANCE = float(os.getenv("KG_NODE_MAX_DISTANCE", "0.4"))
+
 
 # ---------- SCHEMA CREATION ----------
 
 def create_kg_schema():
+    with _SCHEMA_LOCK:
+        _create_kg_schema()
+
+
+def _create_kg_schema():
     client = get_client()
 
     schema = client.schema.get()
@@ -48,20 +67,82 @@ def create_kg_schema():
         })
 
 
+# ---------- NODE EMBEDDINGS ----------
+
+def node_text(node: dict) -> str:
+    label = node.get("label") or node.get("id") or ""
+    return f"{label} ({node['type']})" if node.get("type") else label
+
+
+def embed_nodes(nodes: list, tenant_id: str = None):
+    """
+    One vector per node, as an (n, dim) float32 array. Identical label texts
+    are embedded once, cached ones not at all; the rest go through the
+    batched embedding call.
+    """
+    import numpy as np
+    from modules.embedding_gemini import embed_texts_batched
+
+    texts = [node_text(n) for n in nodes]
+    with _CACHE_LOCK:
+        known = {t: _LABEL_CACHE[t] for t in set(texts) if t in _LABEL_CACHE}
+        for t in known:
+            _LABEL_CACHE.move_to_end(t)
+
+    missing = [t for t in dict.fromkeys(texts) if t not in known]
+    if missing:
+        # Row copies, so a cached vector doesn't keep its whole batch alive
+        known.update(zip(missing, (row.copy() for row in embed_texts_batched(missing, tenant_id=tenant_id))))
+        with _CACHE_LOCK:
+            for t in missing:
+                _LABEL_CACHE[t] = known[t]
+            while len(_LABEL_CACHE) > LABEL_CACHE_SIZE:
+                _LABEL_CACHE.popitem(last=False)
+
+    return np.stack([known[t] for t in texts])
+
+
+def search_nodes(query_emb: list, tenant_id: str, kb_id: str, limit: int = 5,
+                 max_distance: float = NODE_MAX_DISTANCE) -> list:
+    """near_vector over one tenant's KB nodes."""
+    client = get_client()
+    res = (
+        client.query.get("KG_Node", ["node_id", "label", "type", "pdf_id"])
+        .with_near_vector({"vector": query_emb, "distance": max_distance})
+        .with_where({
+            "operator": "And",
+            "operands": [
+                {"path": ["tenant_id"], "operator": "Equal", "valueString": tenant_id},
+                {"path": ["kb_id"], "operator": "Equal", "valueString": kb_id},
+            ],
+        })
+        .with_additional(["distance"])
+        .with_limit(limit)
+        .do()
+    )
+    return res.get("data", {}).get("Get", {}).get("KG_Node") or []
+
+
 # ---------- STORE KG DATA ----------
 
 def store_kg(kg: dict, tenant_id: str, pdf_name: str, kb_id: str, pdf_id: str):
     """
     Stores nodes & edges in Weaviate for a given tenant and PDF.
+    Node ids are first resolved to KB-wide entity ids, so an entity seen in
+    several documents is one graph node (one KG_Node object per document).
     """
+    from modules.entity_resolution import resolve_kg
+
     client = get_client()
     create_kg_schema()
 
-    nodes = kg.get("nodes", [])
-    edges = kg.get("edges", [])
+    vectors = embed_nodes(kg.get("nodes", []), tenant_id) if kg.get("nodes") else []
+    kg, vectors, merged = resolve_kg(kg, tenant_id, kb_id, pdf_id, vectors)
+    nodes = kg["nodes"]
+    edges = kg["edges"]
 
     # Store nodes
-    for n in nodes:
+    for n, vec in zip(nodes, vectors):
         data = {
             "node_id": n.get("id"),
             "label": n.get("label"),
@@ -71,7 +152,7 @@ def store_kg(kg: dict, tenant_id: str, pdf_name: str, kb_id: str, pdf_id: str):
             "pdf_id": pdf_id,
             "pdf_name": pdf_name,
         }
-        client.data_object.create(data, class_name="KG_Node")
+        client.data_object.create(data, class_name="KG_Node", vector=vec)
 
     # Store edges
     for e in edges:
@@ -86,4 +167,8 @@ def store_kg(kg: dict, tenant_id: str, pdf_name: str, kb_id: str, pdf_id: str):
         }
         client.data_object.create(data, class_name="KG_Edge")
 
+    # Keep an already-built in-memory graph index in step with Weaviate
+    from modules.kg_index import update_kg_index
+    update_kg_index(tenant_id, kb_id, pdf_id, kg, merged)
+
     return {"nodes": len(nodes), "edges": len(edges)}
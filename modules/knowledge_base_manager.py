@@ -1,9 +1,22 @@
 import json
 import os
 import uuid
+import threading
+import functools
+from datetime import datetime
 
 KB_FILE = "knowledge_bases.json"
 
+# Worker threads update the registry concurrently; serialize read-modify-write cycles
+_LOCK = threading.RLock()
+
+def _locked(fn):
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with _LOCK:
+            return fn(*args, **kwargs)
+    return wrapper
+
 # Load or init KB store
 def _load():
     if not os.path.exists(KB_FILE):
@@ -18,6 +31,7 @@ def _save(data):
         json.dump(data, f, indent=2)
 
 # Create a KB for a tenant
+@_locked
 def create_kb(tenant_id: str, kb_name: str) -> str:
     data = _load()
     kb_id = str(uuid.uuid4())
@@ -34,11 +48,13 @@ def create_kb(tenant_id: str, kb_name: str) -> str:
     return kb_id
 
 # List KBs for a tenant
+@_locked
 def list_kb(tenant_id: str):
     data = _load()
     return data.get(tenant_id, {})
 
 # Set an active KB
+@_locked
 def set_active_kb(tenant_id: str, kb_id: str):
     data = _load()
     if tenant_id not in data or kb_id not in data[tenant_id]:
@@ -52,6 +68,7 @@ def set_active_kb(tenant_id: str, kb_id: str):
     return True
 
 # Get active KB id
+@_locked
 def get_active_kb(tenant_id: str) -> str | None:
     data = _load()
     if tenant_id not in data:
@@ -64,3 +81,107 @@ def get_active_kb(tenant_id: str) -> str | None:
 # Generate a PDF ID for each ingested document
 def generate_pdf_id() -> str:
     return str(uuid.uuid4())
+
+# Remove a KB from the registry (stored vectors / graph are purged separately)
+@_locked
+def delete_kb(tenant_id: str, kb_id: str) -> bool:
+    data = _load()
+    if tenant_id not in data or kb_id not in data[tenant_id]:
+        return False
+    del data[tenant_id][kb_id]
+    _save(data)
+    return True
+
+# Every KB id known to the registry, across all tenants
+@_locked
+def all_kb_ids() -> set:
+    data = _load()
+    return {kb_id for kbs in data.values() for kb_id in kbs}
+
+# ---------- Document registry (per KB, keyed by file content hash) ----------
+
+# Every registered document across tenants and KBs: [(tenant_id, kb_id, document)]
+@_locked
+def all_documents() -> list:
+    data = _load()
+    return [(tenant_id, kb_id, doc) for tenant_id, kbs in data.items() for kb_id, kb in kbs.items()
+            for doc in kb.get("documents", {}).values()]
+
+# Look up an already-ingested document by content hash
+@_locked
+def find_document(tenant_id: str, kb_id: str, content_hash: str):
+    data = _load()
+    kb = data.get(tenant_id, {}).get(kb_id, {})
+    return kb.get("documents", {}).get(content_hash)
+
+# Every document of a KB: content hash → {"pdf_id", "pdf_name", "searchable", "graph_ready", ...}
+@_locked
+def list_documents(tenant_id: str, kb_id: str) -> dict:
+    data = _load()
+    return data.get(tenant_id, {}).get(kb_id, {}).get("documents", {})
+
+# Look up a document by pdf_id
+@_locked
+def get_document(tenant_id: str, kb_id: str, pdf_id: str):
+    for doc in list_documents(tenant_id, kb_id).values():
+        if doc.get("pdf_id") == pdf_id:
+            return doc
+    return None
+
+# Record a document whose chunks are stored: it is searchable from now on.
+# Its graph may follow later (graph_ready / graph_error, see update_document)
+@_locked
+def record_document(tenant_id: str, kb_id: str, content_hash: str, pdf_id: str, pdf_name: str, **status):
+    data = _load()
+    kb = data.get(tenant_id, {}).get(kb_id)
+    if kb is None:
+        return False
+    now = datetime.utcnow().isoformat()
+    kb.setdefault("documents", {})[content_hash] = {
+        "pdf_id": pdf_id,
+        "pdf_name": pdf_name,
+        "ingested_at": now,
+        "searchable": True,
+        "searchable_at": now,
+        "graph_ready": False,
+        "graph_ready_at": None,
+        "graph_error": None,
+        **status,
+    }
+    _save(data)
+    return True
+
+# Replace a KB's whole document registry (snapshot import)
+@_locked
+def set_documents(tenant_id: str, kb_id: str, documents: dict) -> bool:
+    data = _load()
+    kb = data.get(tenant_id, {}).get(kb_id)
+    if kb is None:
+        return False
+    kb["documents"] = documents
+    _save(data)
+    return True
+
+# Update status fields of a document by pdf_id; False if it is gone (purged meanwhile)
+@_locked
+def update_document(tenant_id: str, kb_id: str, pdf_id: str, **fields) -> bool:
+    data = _load()
+    docs = data.get(tenant_id, {}).get(kb_id, {}).get("documents", {})
+    for doc in docs.values():
+        if doc.get("pdf_id") == pdf_id:
+            doc.update(fields)
+            _save(data)
+            return True
+    return False
+
+# Forget a document by pdf_id (after its objects were purged)
+@_locked
+def remove_document(tenant_id: str, kb_id: str, pdf_id: str):
+    data = _load()
+    docs = data.get(tenant_id, {}).get(kb_id, {}).get("documents", {})
+    stale = [h for h, d in docs.items() if d.get("pdf_id") == pdf_id]
+    for h in stale:
+        del docs[h]
+    if stale:
+        _save(data)
+    return bool(stale)
@@ -1,16 +1,249 @@
+"""
+PDF reader with pluggable text-extraction backends.
+This Provides read_pdf(path) → extracted text, and extract_pages(path) → [(page text, backend)].
 
+Backends, fastest first (each only used when its package is installed):
+  pdfium      pypdfium2, the PDFium C library
+  pypdf       pure Python, quick on plain running text
+  pdfminer    pdfminer.six layout analysis, driven directly; reads columns in order
+  pdfplumber  pdfminer plus its own word/line grouping; slowest, keeps table rows together
 
+PDF_BACKEND=auto (default) routes each page on cheap PDFium layout signals:
+plain pages go to the fastest backend, ruled tables (many drawn paths) to
+pdfplumber, multi-column text to pdfminer. A page that comes back empty is
+retried on the next backend, unless PDFium saw no text on it at all (a
+scanned page).
+PDF_ROUTING=document makes one choice for the whole file instead.
+See benchmarks/pdf_extraction.py for speed and fidelity per backend.
 """
-small PDF reader using pdfplumber,
-This Provides read_pdf(path) → extracted text.
-"""
 
-import pdfplumber
+import importlib.util
+import io
+import os
+
+PDF_BACKEND = os.getenv("PDF_BACKEND", "auto").lower()
+PDF_ROUTING = os.getenv("PDF_ROUTING", "page").lower()
+# Drawn path objects (table rules, boxes) from which a page counts as a table;
+# every rule is one path (a 10-row, 4-column grid draws 16), a page border or header rule a few
+COMPLEX_PATHS = int(os.getenv("PDF_COMPLEX_PATHS", "12"))
+# Pages sampled for the per-document choice
+ROUTING_SAMPLE_PAGES = 5
+
+# ---------- backends ----------
+# Each opens a document and extracts one page at a time; packages are
+# imported on open, so query-only runs never load any of them.
+
+class _PdfiumDoc:
+    def __init__(self, path: str):
+        import pypdfium2 as pdfium
+        self._doc = pdfium.PdfDocument(path)
+
+    def __len__(self):
+        return len(self._doc)
+
+    def page_text(self, i: int) -> str:
+        page = self._doc[i]
+        textpage = page.get_textpage()
+        try:
+            return textpage.get_text_range().replace("\r\n", "\n")
+        finally:
+            textpage.close()
+            page.close()
+
+    def layout(self, i: int) -> dict:
+        """
+        Cheap layout signals for routing: text / path objects and text columns.
+        Objects inside Form XObjects count too; some generators put a page's
+        whole content in one.
+        """
+        import pypdfium2.raw as raw
+
+        page = self._doc[i]
+        try:
+            counts = {raw.FPDF_PAGEOBJ_TEXT: 0, raw.FPDF_PAGEOBJ_PATH: 0}
+            lefts = []
+            width = page.get_width()
+            for obj in page.get_objects(filter=tuple(counts)):
+                counts[obj.type] += 1
+                if obj.type == raw.FPDF_PAGEOBJ_TEXT:
+                    lefts.append(obj.get_bounds()[0])
+        finally:
+            page.close()
+        # Two or more columns: a good share of text objects start right of the middle
+        right = sum(1 for x in lefts if x > width * 0.45)
+        return {
+            "text_objects": counts[raw.FPDF_PAGEOBJ_TEXT],
+            "paths": counts[raw.FPDF_PAGEOBJ_PATH],
+            "columns": 2 if lefts and 0.25 <= right / len(lefts) <= 0.75 else 1,
+        }
+
+    def close(self):
+        self._doc.close()
+
+
+class _PypdfDoc:
+    def __init__(self, path: str):
+        from pypdf import PdfReader
+        self._reader = PdfReader(path)
+
+    def __len__(self):
+        return len(self._reader.pages)
+
+    def page_text(self, i: int) -> str:
+        return self._reader.pages[i].extract_text() or ""
+
+    def close(self):
+        self._reader.close()
+
+
+class _PdfminerDoc:
+    def __init__(self, path: str):
+        from pdfminer.converter import TextConverter
+        from pdfminer.layout import LAParams
+        from pdfminer.pdfinterp import PDFPageInterpreter, PDFResourceManager
+        from pdfminer.pdfpage import PDFPage
+
+        self._file = open(path, "rb")
+        self._pages = list(PDFPage.get_pages(self._file))
+        self._out = io.StringIO()
+        rsrc = PDFResourceManager(caching=True)
+        self._device = TextConverter(rsrc, self._out, laparams=LAParams())
+        self._interp = PDFPageInterpreter(rsrc, self._device)
+
+    def __len__(self):
+        return len(self._pages)
+
+    def page_text(self, i: int) -> str:
+        self._out.seek(0)
+        self._out.truncate()
+        self._interp.process_page(self._pages[i])
+        return self._out.getvalue().rstrip("\x0c")
+
+    def close(self):
+        self._device.close()
+        self._file.close()
+
+
+class _PlumberDoc:
+    def __init__(self, path: str):
+        import pdfplumber
+        self._pdf = pdfplumber.open(path)
+
+    def __len__(self):
+        return len(self._pdf.pages)
+
+    def page_text(self, i: int) -> str:
+        page = self._pdf.pages[i]
+        try:
+            return page.extract_text() or ""
+        finally:
+            # Drop the page's parsed objects; long PDFs otherwise keep them all
+            page.close()
+
+    def close(self):
+        self._pdf.close()
+
+
+# name → (package to detect, document class), fastest first
+BACKENDS = {
+    "pdfium": ("pypdfium2", _PdfiumDoc),
+    "pypdf": ("pypdf", _PypdfDoc),
+    "pdfminer": ("pdfminer", _PdfminerDoc),
+    "pdfplumber": ("pdfplumber", _PlumberDoc),
+}
+
+
+def available_backends() -> list:
+    return [name for name, (package, _) in BACKENDS.items() if importlib.util.find_spec(package)]
+
+
+# ---------- routing ----------
+
+# Backends to try first per page kind: pdfplumber keeps ruled table rows
+# together, pdfminer's layout analysis reads columns one after the other.
+PREFERRED = {"table": "pdfplumber", "columns": "pdfminer"}
+# Most demanding kind first, for the per-document choice
+_KIND_ORDER = ("table", "columns", "plain")
+
+
+def page_kind(layout: dict) -> str:
+    if layout["paths"] >= COMPLEX_PATHS:
+        return "table"
+    if layout["columns"] > 1:
+        return "columns"
+    return "plain"
+
+
+def _chain(kind: str, available: list) -> list:
+    first = PREFERRED.get(kind)
+    if first not in available:
+        return available
+    return [first] + [b for b in available if b != first]
+
+
+class _Docs:
+    """Backend documents for one file, opened on first use."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._open = {}
+
+    def __getitem__(self, name: str):
+        if name not in self._open:
+            self._open[name] = BACKENDS[name][1](self.path)
+        return self._open[name]
+
+    def close(self):
+        for doc in self._open.values():
+            doc.close()
+
+
+def extract_pages(path: str, backend: str = None, routing: str = None) -> list:
+    """
+    [(text, backend used)] per page. backend is a BACKENDS name or "auto"
+    (default PDF_BACKEND); a named backend is used as is, without fallback.
+    routing ("page" or "document", default PDF_ROUTING) applies to auto.
+    """
+    backend = (backend or PDF_BACKEND).lower()
+    routing = (routing or PDF_ROUTING).lower()
+    available = available_backends()
+    if not available:
+        raise RuntimeError("No PDF backend installed (pypdfium2, pypdf, pdfminer.six or pdfplumber).")
+
+    docs = _Docs(path)
+    try:
+        if backend != "auto":
+            if backend not in available:
+                raise ValueError(f"PDF backend {backend!r} is not installed (available: {', '.join(available)})")
+            doc = docs[backend]
+            return [(doc.page_text(i), backend) for i in range(len(doc))]
+
+        probe = docs["pdfium"] if "pdfium" in available else None
+        n = len(probe if probe is not None else docs[available[0]])
+        layouts = [probe.layout(i) for i in range(n)] if probe is not None else [None] * n
+        # Without PDFium there are no layout signals; every page takes the fast path
+        kinds = [page_kind(l) if l is not None else "plain" for l in layouts]
+        if routing == "document":
+            sampled = set(kinds[:ROUTING_SAMPLE_PAGES])
+            kinds = [next(k for k in _KIND_ORDER if k in sampled or k == "plain")] * n
+
+        pages = []
+        for i, (layout, kind) in enumerate(zip(layouts, kinds)):
+            if layout is not None and layout["text_objects"] == 0:
+                # Nothing to extract (scanned / image-only page); don't try every backend
+                pages.append(("", "pdfium"))
+                continue
+            # Fall through to the next backend when one returns nothing
+            text, used = "", None
+            for name in _chain(kind, available):
+                text, used = docs[name].page_text(i), name
+                if text.strip():
+                    break
+            pages.append((text, used))
+        return pages
+    finally:
+        docs.close()
+
 
-def read_pdf(path: str) -> str:
-    text_parts = []
-    with pdfplumber.open(path) as pdf:
-        for page in pdf.pages:
-            txt = page.extract_text() or ""
-            text_parts.append(txt)
-    return "\n".join(text_parts)
\ No newline at end of file
+def read_pdf(path: str, backend: str = None) -> str:
+    return "\n".join(text for text, _ in extract_pages(path, backend))
@@ -0,0 +1,262 @@
+"""
+On-demand profiling of a single ingest job or query.
+
+    with profiled(run_id, "sampling+memory", on_report=...) as report:
+        ...
+
+The spec is a profiler, optionally with "+memory":
+  cprofile  deterministic (cProfile), every call in the profiled thread → <run_id>.pstats
+  sampling  wall-clock stack samples every PROFILE_INTERVAL_MS → <run_id>.collapsed
+            (flamegraph.pl / speedscope format); PROFILE_ALL_THREADS=1 also samples
+            pool threads, each stack rooted at its thread name
+  memory    tracemalloc: allocations still held at the end of the run, by line
+            → <run_id>.tracemalloc (a tracemalloc.Snapshot dump)
+
+The default spec is PROFILE_MODE ("off"); jobs and queries can pass their
+own. Files go to PROFILE_DIR with a <run_id>.json summary of the top
+functions, which is also handed to on_report (the worker puts it on the job).
+"""
+
+import contextlib
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+PROFILE_MODE = os.getenv("PROFILE_MODE", "off").lower()
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_ALL_THREADS = os.getenv("PROFILE_ALL_THREADS", "0") == "1"
+# Functions / allocation sites listed in the summary
+PROFILE_TOP = 15
+
+PROFILERS = ("cprofile", "sampling")
+
+# One deterministic profiler at a time: from 3.12 cProfile is process-wide
+_CPROFILE_LOCK = threading.Lock()
+# tracemalloc is process-wide too; it runs while any profiled run wants it
+_TRACE_LOCK = threading.Lock()
+_tracing_runs = 0
+
+
+def parse_spec(spec: str = None) -> tuple:
+    """'sampling+memory' → ('sampling', True); 'off' / '' → (None, False)."""
+    parts = {p.strip() for p in (spec if spec is not None else PROFILE_MODE).lower().split("+")}
+    parts.discard("")
+    parts.discard("off")
+    memory = "memory" in parts
+    parts.discard("memory")
+    if len(parts) > 1 or not parts <= set(PROFILERS):
+        raise ValueError(f"Unknown profile spec {spec!r} (expected cprofile, sampling and/or memory, "
+                         f"joined with '+')")
+    return (parts.pop() if parts else None), memory
+
+
+# ---------- sampling ----------
+
+_LABELS = {}
+# Leaf frames of a thread that is waiting, not running (a query thread waiting on
+# a pool shows up here; PROFILE_ALL_THREADS=1 shows the pool's own stacks)
+_IDLE_FILES = {"threading.py", "queue.py", "selectors.py"}
+
+
+def _is_idle(label: str) -> bool:
+    return label.rpartition(" (")[2].partition(":")[0] in _IDLE_FILES
+
+
+def _label(code) -> str:
+    label = _LABELS.get(code)
+    if label is None:
+        label = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+        _LABELS[code] = label
+    return label
+
+
+class _Sampler(threading.Thread):
+    """Counts the stacks of one thread (or all) every interval seconds."""
+
+    def __init__(self, thread_id: int = None, interval: float = PROFILE_INTERVAL_MS / 1000):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.ticks = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        me = threading.get_ident()
+        names = {}
+        while not self._stop_event.wait(self.interval):
+            self.ticks += 1
+            frames = sys._current_frames()
+            if self.thread_id is not None:
+                frames = {self.thread_id: frames.get(self.thread_id)}
+            elif len(names) != len(frames):
+                names = {t.ident: t.name for t in threading.enumerate()}
+            for tid, frame in frames.items():
+                if tid == me or frame is None:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_label(frame.f_code))
+                    frame = frame.f_back
+                if self.thread_id is None:
+                    stack.append(names.get(tid, str(tid)))
+                self.stacks[tuple(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def write_collapsed(self, path: str):
+        with open(path, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{';'.join(stack)} {count}\n")
+
+    def summary(self, seconds: float) -> dict:
+        """Top functions by own samples; stacks parked in a lock / queue wait count as idle."""
+        # Samples → seconds at the interval actually achieved
+        per_sample = seconds / self.ticks if self.ticks else self.interval
+        own, total = Counter(), Counter()
+        idle = 0
+        for stack, count in self.stacks.items():
+            if _is_idle(stack[-1]):
+                idle += count
+                continue
+            own[stack[-1]] += count
+            for label in set(stack):
+                total[label] += count
+        return {
+            "samples": self.ticks,
+            "idle_seconds": round(idle * per_sample, 4),
+            "top": [{"function": label, "self_seconds": round(n * per_sample, 4),
+                     "total_seconds": round(total[label] * per_sample, 4)}
+                    for label, n in own.most_common(PROFILE_TOP)],
+        }
+
+
+# ---------- cProfile ----------
+
+def _cprofile_top(profile) -> list:
+    import pstats
+
+    stats = pstats.Stats(profile).stats
+    rows = sorted(stats.items(), key=lambda kv: kv[1][2], reverse=True)[:PROFILE_TOP]
+    return [{"function": f"{func} ({os.path.basename(file)}:{line})", "calls": nc,
+             "self_seconds": round(tt, 4), "total_seconds": round(ct, 4)}
+            for (file, line, func), (cc, nc, tt, ct, callers) in rows]
+
+
+# ---------- tracemalloc ----------
+
+def _start_tracing():
+    import tracemalloc
+
+    global _tracing_runs
+    with _TRACE_LOCK:
+        if _tracing_runs == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start(25)
+        _tracing_runs += 1
+    return tracemalloc.take_snapshot()
+
+
+def _release_tracing():
+    import tracemalloc
+
+    global _tracing_runs
+    with _TRACE_LOCK:
+        _tracing_runs -= 1
+        if _tracing_runs == 0:
+            tracemalloc.stop()
+
+
+def _stop_tracing(before, path: str) -> dict:
+    import tracemalloc
+
+    after = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    _release_tracing()
+    after.dump(path)
+    growth = [d for d in after.compare_to(before, "lineno") if d.size_diff > 0][:PROFILE_TOP]
+    return {
+        "file": path,
+        "peak_mb": round(peak / 1e6, 2),
+        "retained_mb": round(sum(d.size_diff for d in growth) / 1e6, 3),
+        "top": [{"line": str(d.traceback[0]), "kb": round(d.size_diff / 1e3, 1), "count": d.count_diff}
+                for d in growth],
+    }
+
+
+# ---------- entry point ----------
+
+@contextlib.contextmanager
+def profiled(run_id: str, spec: str = None, on_report=None):
+    """
+    Profiles the body per spec (default PROFILE_MODE). Yields the report
+    dict, filled in on exit (also when the body raises), or None when
+    profiling is off.
+    """
+    profiler, memory = parse_spec(spec)
+    if profiler is None and not memory:
+        yield None
+        return
+
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    base = os.path.join(PROFILE_DIR, run_id)
+    report = {"run_id": run_id, "profiler": profiler, "files": []}
+    if profiler == "cprofile" and not _CPROFILE_LOCK.acquire(blocking=False):
+        # Another run holds the deterministic profiler; sample this one instead
+        profiler = report["profiler"] = "sampling"
+        report["note"] = "cProfile busy with another run; sampled instead"
+
+    cprof = sampler = snapshot = None
+    try:
+        if memory:
+            snapshot = _start_tracing()
+        if profiler == "cprofile":
+            import cProfile
+            cprof = cProfile.Profile()
+        elif profiler == "sampling":
+            sampler = _Sampler(None if PROFILE_ALL_THREADS else threading.get_ident())
+            sampler.start()
+        t0 = time.perf_counter()
+        if cprof is not None:
+            cprof.enable()
+        try:
+            yield report
+        finally:
+            if cprof is not None:
+                cprof.disable()
+            if sampler is not None:
+                sampler.stop()
+            report["seconds"] = round(time.perf_counter() - t0, 3)
+
+            if cprof is not None:
+                cprof.dump_stats(base + ".pstats")
+                report["files"].append(base + ".pstats")
+                report["top"] = _cprofile_top(cprof)
+            if sampler is not None:
+                sampler.write_collapsed(base + ".collapsed")
+                report["files"].append(base + ".collapsed")
+                report.update(sampler.summary(report["seconds"]))
+            if snapshot is not None:
+                snapshot, before = None, snapshot
+                report["memory"] = _stop_tracing(before, base + ".tracemalloc")
+                report["files"].append(report["memory"]["file"])
+
+            with open(base + ".json", "w") as f:
+                json.dump(report, f, indent=2)
+            logger.info("Profile for %s: %s", run_id, ", ".join(report["files"]))
+            if on_report:
+                on_report(report)
+    finally:
+        if snapshot is not None:
+            # Failed before the memory report was written; still release tracemalloc
+            _release_tracing()
+        if profiler == "cprofile":
+            _CPROFILE_LOCK.release()
@@ -0,0 +1,205 @@
+"""
+Shared adaptive rate limiter for all Gemini traffic.
+A token bucket whose refill rate follows AIMD: additive increase while calls
+succeed, multiplicative decrease on every 429. Waiting callers are served
+round-robin per tenant, so one tenant's bulk ingest can't starve the others.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+
+class RateLimitedError(RuntimeError):
+    """Raised when a call is still throttled after all retries."""
+
+    def __init__(self, message: str, retry_after: float = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _throttle_info(exc: Exception):
+    """
+    Returns (is_throttled, retry_after_seconds) for an exception raised by
+    requests (HTTPError.response) or the google SDK (exc.code == 429).
+    """
+    response = getattr(exc, "response", None)
+    status = getattr(response, "status_code", None) or getattr(exc, "code", None)
+    if status not in (429, 503):
+        return False, None
+
+    retry_after = None
+    headers = getattr(response, "headers", None) or {}
+    try:
+        retry_after = float(headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        pass
+    return True, retry_after
+
+
+class AdaptiveRateLimiter:
+    def __init__(self, max_rate: float, min_rate: float = 0.2, burst: float = None,
+                 increase: float = None, decrease: float = 0.7, cooldown: float = 1.0):
+        self.max_rate = float(max_rate)
+        self.min_rate = min_rate
+        self.rate = self.max_rate
+        self.burst = burst or max(1.0, self.max_rate)
+        # Additive step, in requests/sec gained per second of clean traffic
+        self.increase = increase or max(0.05, self.max_rate * 0.05)
+        self.decrease = decrease
+        self.cooldown = cooldown
+
+        self._tokens = self.burst
+        self._last_refill = time.monotonic()
+        self._last_decrease = 0.0
+        self._blocked_until = 0.0
+        self._cond = threading.Condition()
+        # tenant -> deque of waiting tickets, in round-robin order
+        self._waiting = OrderedDict()
+
+        self.stats = {"granted": 0, "throttled": 0, "failed": 0}
+
+    # ---------- bucket ----------
+
+    def _refill(self, now: float):
+        elapsed = now - self._last_refill
+        self._last_refill = now
+        self._tokens = min(self.burst, self._tokens + elapsed * self.rate)
+
+    def acquire(self, tenant_id: str = None, timeout: float = None) -> bool:
+        """
+        Blocks until this caller may send one request.
+        Returns False if timeout expired first.
+        """
+        ticket = object()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._waiting.setdefault(tenant_id, deque()).append(ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    head_tenant = next(iter(self._waiting))
+                    is_head = head_tenant == tenant_id and self._waiting[tenant_id][0] is ticket
+
+                    if is_head and self._tokens >= 1 and now >= self._blocked_until:
+                        self._tokens -= 1
+                        self.stats["granted"] += 1
+                        return True
+
+                    if deadline is not None and now >= deadline:
+                        return False
+
+                    if is_head:
+                        wait = max((1 - self._tokens) / self.rate, self._blocked_until - now, 0.001)
+                    else:
+                        wait = None
+                    if deadline is not None:
+                        wait = min(wait or deadline - now, deadline - now)
+                    self._cond.wait(wait)
+            finally:
+                waiting = self._waiting[tenant_id]
+                waiting.remove(ticket)
+                if waiting:
+                    # Tenant keeps a slot but goes to the back of the rotation
+                    self._waiting.move_to_end(tenant_id)
+                else:
+                    del self._waiting[tenant_id]
+                self._cond.notify_all()
+
+    # ---------- AIMD feedback ----------
+
+    def on_success(self):
+        with self._cond:
+            self.rate = min(self.max_rate, self.rate + self.increase / self.rate)
+
+    def recover(self, seconds: float):
+        """Raises the rate as if `seconds` of clean traffic had passed."""
+        with self._cond:
+            self.rate = min(self.max_rate, self.rate + self.increase * seconds)
+
+    def on_throttle(self, retry_after: float = None):
+        with self._cond:
+            now = time.monotonic()
+            self.stats["throttled"] += 1
+            # One cut per cooldown window: a burst of 429s is one congestion event
+            if now - self._last_decrease >= self.cooldown:
+                self.rate = max(self.min_rate, self.rate * self.decrease)
+                self._last_decrease = now
+            self._tokens = min(self._tokens, 0.0)
+            if retry_after:
+                self._blocked_until = max(self._blocked_until, now + retry_after)
+
+    @property
+    def pressure(self) -> float:
+        """0.0 when running at full rate, approaching 1.0 when heavily throttled."""
+        return 1.0 - self.rate / self.max_rate
+
+    def wait_until_healthy(self, max_pressure: float = 0.5, timeout: float = 30.0) -> bool:
+        """
+        Backpressure hook for queue consumers: waits while the limiter is
+        cut below (1 - max_pressure) of its max rate.
+        """
+        deadline = time.monotonic() + timeout
+        while self.pressure > max_pressure:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.5)
+            # Idle time counts as clean traffic, otherwise nothing would raise the rate again
+            self.recover(0.5)
+        return True
+
+    # ---------- call wrapper ----------
+
+    def call(self, fn, tenant_id: str = None, retries: int = 6, timeout: float = None):
+        """
+        Runs fn() under the limiter, retrying throttled calls with the adapted rate.
+        Non-throttle errors are raised unchanged.
+        """
+        retry_after = None
+        for _ in range(retries + 1):
+            if not self.acquire(tenant_id, timeout=timeout):
+                break
+            try:
+                result = fn()
+            except Exception as e:
+                throttled, retry_after = _throttle_info(e)
+                if not throttled:
+                    raise
+                self.on_throttle(retry_after)
+                continue
+            self.on_success()
+            return result
+
+        with self._cond:
+            self.stats["failed"] += 1
+        raise RateLimitedError("Gemini quota exhausted, still throttled after retries", retry_after)
+
+
+_LIMITERS = {}
+_LIMITERS_LOCK = threading.Lock()
+
+# Requests per minute per traffic kind, overridable through the environment
+_DEFAULT_RPM = {
+    "embed": ("GEMINI_EMBED_RPM", 1500),
+    "generate": ("GEMINI_GENERATE_RPM", 1000),
+}
+
+
+def get_limiter(kind: str) -> AdaptiveRateLimiter:
+    """
+    Process-wide limiter for a kind of Gemini traffic ("embed" or "generate").
+    """
+    with _LIMITERS_LOCK:
+        if kind not in _LIMITERS:
+            env_name, default = _DEFAULT_RPM[kind]
+            rpm = float(os.getenv(env_name, default))
+            _LIMITERS[kind] = AdaptiveRateLimiter(max_rate=rpm / 60.0)
+        return _LIMITERS[kind]
+
+
+def max_pressure() -> float:
+    with _LIMITERS_LOCK:
+        limiters = list(_LIMITERS.values())
+    return max((l.pressure for l in limiters), default=0.0)
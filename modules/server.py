@@ -0,0 +1,439 @@
+"""
+HTTP service mode (python haystackapp.py --serve).
+
+An aiohttp app over the same pipelines as the CLI. One long-lived process
+keeps the Weaviate client, the pooled Gemini session, the KG / dedup indexes
+and the ingestion worker queue warm for every client. Pipeline calls are
+blocking, so handlers run them on a thread pool (SERVER_THREADS).
+
+  POST   /login               {"tenant_id", "password"} → {"token"}
+  POST   /logout
+  GET    /health
+  GET    /kbs                 → {kb_id: {"kb_name", "active", ...}}
+  POST   /kbs                 {"name", "activate": true} → {"kb_id"}
+  POST   /kbs/{kb_id}/activate
+  DELETE /kbs/{kb_id}         → {"job_id"} of the purge job
+  GET    /kbs/{kb_id}/documents → {content_hash: {"pdf_id", "pdf_name", "searchable", "graph_ready",
+                                "graph_error", "time_to_searchable", ...}}
+  POST   /ingest              multipart "file" (PDF), ?kb_id= &priority= &deadline=<seconds> &profile=
+                              → 202 {"job_id"}; a profiled job's summary shows up on it as "profile".
+                              The job completes once the document is searchable; its result
+                              names the background "kg" job that builds its graph (kg_job_id)
+  GET    /jobs                → the tenant's jobs, queued ones with queue_position / estimated_start
+  GET    /jobs/{job_id}       ?wait=<seconds> long-polls until the job finishes
+  DELETE /jobs/{job_id}       cancels the job (a running one stops at its next checkpoint)
+  POST   /query               {"question", "top_k", "stream", "budget", "profile"} → {"answer", "profile"},
+                              or text/event-stream of {"text": ...} events when stream is true
+                              (then a "profile" event when profiled)
+
+Every route except /login and /health needs "Authorization: Bearer <token>".
+Profiling (?profile= on /ingest, "profile" on /query) is process-wide and its
+summary names source files, so clients may only ask for it when the operator
+sets PROFILE_ALLOW_REMOTE=1; otherwise it is a 403.
+"""
+
+import asyncio
+import contextlib
+import functools
+import hashlib
+import json
+import math
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from aiohttp import web
+
+from modules.auth import verify_tenant, create_session, session_tenant, end_session
+from modules.profiling import parse_spec
+from modules.knowledge_base_manager import (create_kb, list_kb, set_active_kb, get_active_kb, delete_kb,
+                                            find_document, list_documents)
+from modules.rate_limiter import RateLimitedError
+from modules.worker import (start_worker, submit_job, submit_purge_job, get_job, list_jobs, cancel_job,
+                            add_job_watcher, remove_job_watcher, JOBS_CHANGED, FINISHED_STATES, PRIORITIES)
+from pipelines.querying import answer_query, answer_query_stream
+
+# Threads for blocking pipeline calls. A query holds its thread for the whole
+# generation, so this caps concurrent queries (benchmarks/server_load.py)
+SERVER_THREADS = int(os.getenv("SERVER_THREADS", "64"))
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads")
+MAX_UPLOAD_MB = int(os.getenv("MAX_UPLOAD_MB", "200"))
+# Longest ?wait= a job status request may block for
+MAX_JOB_WAIT = 60.0
+# Lets clients profile their own ingests / queries (see modules/profiling.py)
+PROFILE_ALLOW_REMOTE = os.getenv("PROFILE_ALLOW_REMOTE", "0") == "1"
+
+_PUBLIC = {"/login", "/health"}
+_END = object()
+_REGISTRY_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="haystack-registry")
+
+
+def _error(status: int, message: str, **headers) -> web.Response:
+    return web.json_response({"error": message}, status=status, headers=headers or None)
+
+
+def _run(fn, *args, **kwargs):
+    """Blocking pipeline call (embedding, search, generation) on the main pool."""
+    return asyncio.get_running_loop().run_in_executor(None, functools.partial(fn, *args, **kwargs))
+
+
+def _registry(fn, *args, **kwargs):
+    """
+    Short registry / auth file I/O on its own small pool, so it never queues
+    behind slow generations on the main pool.
+    """
+    return asyncio.get_running_loop().run_in_executor(_REGISTRY_POOL, functools.partial(fn, *args, **kwargs))
+
+
+def _token(request) -> str:
+    header = request.headers.get("Authorization", "")
+    return header[7:].strip() if header.startswith("Bearer ") else ""
+
+
+@web.middleware
+async def _middleware(request, handler):
+    if request.path not in _PUBLIC:
+        tenant_id = session_tenant(_token(request))
+        if tenant_id is None:
+            return _error(401, "Missing or expired session token")
+        request["tenant_id"] = tenant_id
+    try:
+        return await handler(request)
+    except web.HTTPException:
+        raise
+    except RateLimitedError as e:
+        return _error(429, str(e), **({"Retry-After": str(int(e.retry_after))} if e.retry_after else {}))
+    except Exception as e:
+        return _error(500, str(e))
+
+
+def _seconds(value) -> float:
+    """A finite, positive number of seconds; ValueError otherwise."""
+    seconds = float(value)
+    if not math.isfinite(seconds) or seconds <= 0:
+        raise ValueError(value)
+    return seconds
+
+
+async def _json_body(request) -> dict:
+    try:
+        body = await request.json()
+    except ValueError:
+        raise web.HTTPBadRequest(text=json.dumps({"error": "Body must be JSON"}), content_type="application/json")
+    if not isinstance(body, dict):
+        raise web.HTTPBadRequest(text=json.dumps({"error": "Body must be a JSON object"}), content_type="application/json")
+    return body
+
+
+# ---------- auth ----------
+
+async def login(request):
+    body = await _json_body(request)
+    tenant_id, password = body.get("tenant_id", ""), body.get("password", "")
+    if not await _registry(verify_tenant, tenant_id, password):
+        return _error(401, "Invalid tenant id or password")
+    return web.json_response({"token": create_session(tenant_id), "tenant_id": tenant_id})
+
+
+async def logout(request):
+    end_session(_token(request))
+    return web.json_response({"ok": True})
+
+
+async def health(request):
+    return web.json_response({"ok": True})
+
+
+# ---------- knowledge bases ----------
+
+async def get_kbs(request):
+    return web.json_response(await _registry(list_kb, request["tenant_id"]))
+
+
+async def post_kb(request):
+    body = await _json_body(request)
+    name = (body.get("name") or "").strip()
+    if not name:
+        return _error(400, "name is required")
+    tenant_id = request["tenant_id"]
+    kb_id = await _registry(create_kb, tenant_id, name)
+    if body.get("activate", True):
+        await _registry(set_active_kb, tenant_id, kb_id)
+    return web.json_response({"kb_id": kb_id}, status=201)
+
+
+async def activate_kb(request):
+    if not await _registry(set_active_kb, request["tenant_id"], request.match_info["kb_id"]):
+        return _error(404, "Unknown KB")
+    return web.json_response({"ok": True})
+
+
+async def remove_kb(request):
+    tenant_id, kb_id = request["tenant_id"], request.match_info["kb_id"]
+    if not await _registry(delete_kb, tenant_id, kb_id):
+        return _error(404, "Unknown KB")
+    return web.json_response({"job_id": submit_purge_job(tenant_id, kb_id)}, status=202)
+
+
+async def get_documents(request):
+    tenant_id, kb_id = request["tenant_id"], request.match_info["kb_id"]
+    if kb_id not in await _registry(list_kb, tenant_id):
+        return _error(404, "Unknown KB")
+    return web.json_response(await _registry(list_documents, tenant_id, kb_id))
+
+
+# ---------- ingestion and jobs ----------
+
+async def _save_upload(field) -> tuple:
+    """Streams an uploaded file to UPLOAD_DIR. Returns (path, sha256)."""
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    path = os.path.join(UPLOAD_DIR, f"{uuid.uuid4()}.pdf")
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, "wb") as f:
+        while True:
+            block = await field.read_chunk(1 << 20)
+            if not block:
+                break
+            size += len(block)
+            if size > MAX_UPLOAD_MB << 20:
+                f.close()
+                os.remove(path)
+                raise web.HTTPRequestEntityTooLarge(max_size=MAX_UPLOAD_MB << 20, actual_size=size)
+            digest.update(block)
+            f.write(block)
+    return path, digest.hexdigest()
+
+
+async def ingest(request):
+    tenant_id = request["tenant_id"]
+    kb_id = request.query.get("kb_id") or await _registry(get_active_kb, tenant_id)
+    if kb_id is None:
+        return _error(409, "No active Knowledge Base selected. Create or activate a KB first.")
+    if kb_id not in await _registry(list_kb, tenant_id):
+        return _error(404, "Unknown KB")
+    priority = request.query.get("priority", "interactive")
+    if priority not in PRIORITIES:
+        return _error(400, f"priority must be one of {', '.join(PRIORITIES)}")
+    try:
+        deadline = _seconds(request.query["deadline"]) if request.query.get("deadline") else None
+    except ValueError:
+        return _error(400, "deadline must be a positive number of seconds")
+    profile = request.query.get("profile")
+    if profile:
+        if not PROFILE_ALLOW_REMOTE:
+            return _error(403, "Profiling is disabled on this server")
+        try:
+            parse_spec(profile)
+        except ValueError as e:
+            return _error(400, str(e))
+    if not request.content_type.startswith("multipart/"):
+        return _error(400, "Upload the PDF as multipart/form-data field 'file'")
+
+    reader = await request.multipart()
+    field = await reader.next()
+    while field is not None and field.name != "file":
+        field = await reader.next()
+    if field is None:
+        return _error(400, "Missing 'file' field")
+
+    path, content_hash = await _save_upload(field)
+    existing = await _registry(find_document, tenant_id, kb_id, content_hash)
+    if existing:
+        os.remove(path)
+        return web.json_response({"duplicate": True, "kb_id": kb_id, **existing})
+
+    job_id = submit_job(path, tenant_id, kb_id=kb_id, content_hash=content_hash,
+                        priority=priority, deadline=deadline, profile=profile)
+    return web.json_response({"job_id": job_id, "kb_id": kb_id}, status=202)
+
+
+def _public_job(job: dict) -> dict:
+    with JOBS_CHANGED:
+        return {k: v for k, v in job.items() if not k.startswith("_")}
+
+
+async def get_jobs(request):
+    return web.json_response([_public_job(j) for j in list_jobs(request["tenant_id"])])
+
+
+async def _wait_finished(job_id: str, timeout: float):
+    """
+    Returns once the job has finished or timeout passed. Waits on the event
+    loop (a job watcher resolves a future), so long polls hold no pool thread.
+    """
+    loop = asyncio.get_running_loop()
+    finished = loop.create_future()
+
+    def resolve():
+        if not finished.done():
+            finished.set_result(None)
+
+    def watch(changed_id, fields):
+        if changed_id == job_id and fields.get("status") in FINISHED_STATES:
+            loop.call_soon_threadsafe(resolve)
+
+    add_job_watcher(watch)
+    try:
+        if get_job(job_id)["status"] not in FINISHED_STATES:
+            await asyncio.wait_for(finished, timeout)
+    except asyncio.TimeoutError:
+        pass
+    finally:
+        remove_job_watcher(watch)
+
+
+async def get_job_status(request):
+    job_id = request.match_info["job_id"]
+    job = get_job(job_id)
+    if job is None or job["tenant_id"] != request["tenant_id"]:
+        return _error(404, "Unknown job")
+    try:
+        wait = min(float(request.query.get("wait", 0) or 0), MAX_JOB_WAIT)
+    except ValueError:
+        return _error(400, "wait must be a number of seconds")
+    if wait > 0:
+        await _wait_finished(job_id, wait)
+    return web.json_response(_public_job(job))
+
+
+async def delete_job(request):
+    job_id = request.match_info["job_id"]
+    job = get_job(job_id)
+    if job is None or job["tenant_id"] != request["tenant_id"]:
+        return _error(404, "Unknown job")
+    if not cancel_job(job_id):
+        return _error(409, f"Job already {job['status']}")
+    return web.json_response(_public_job(job), status=202)
+
+
+# ---------- querying ----------
+
+async def _iterate_in_thread(gen_fn, *args):
+    """
+    Runs a blocking generator on the thread pool and yields its items here.
+    The small queue pushes back on the generator when the client reads slowly;
+    leaving the loop early (client gone) stops it at the next item.
+    """
+    loop = asyncio.get_running_loop()
+    items = asyncio.Queue(maxsize=16)
+    stop = threading.Event()
+
+    def produce():
+        gen = gen_fn(*args)
+        try:
+            for item in gen:
+                if stop.is_set():
+                    return
+                asyncio.run_coroutine_threadsafe(items.put((item, None)), loop).result()
+            asyncio.run_coroutine_threadsafe(items.put((_END, None)), loop).result()
+        except Exception as e:
+            asyncio.run_coroutine_threadsafe(items.put((_END, e)), loop).result()
+        finally:
+            gen.close()
+
+    loop.run_in_executor(None, produce)
+    try:
+        while True:
+            item, error = await items.get()
+            if error is not None:
+                raise error
+            if item is _END:
+                return
+            yield item
+    finally:
+        stop.set()
+        # Unblock a producer waiting on a full queue so it sees `stop`
+        while not items.empty():
+            items.get_nowait()
+
+
+def _sse(data: dict, event: str = None) -> bytes:
+    head = f"event: {event}\n" if event else ""
+    return f"{head}data: {json.dumps(data)}\n\n".encode()
+
+
+async def query(request):
+    body = await _json_body(request)
+    question = (body.get("question") or body.get("query") or "").strip()
+    if not question:
+        return _error(400, "question is required")
+    try:
+        top_k = int(body.get("top_k", 5))
+    except (TypeError, ValueError):
+        top_k = 0
+    if top_k < 1:
+        return _error(400, "top_k must be a positive integer")
+    # Seconds the answer may take (default QUERY_BUDGET_SECONDS); past it the top passages come back instead
+    try:
+        budget = _seconds(body["budget"]) if body.get("budget") else None
+    except (TypeError, ValueError):
+        return _error(400, "budget must be a positive number of seconds")
+    profile = body.get("profile")
+    if profile:
+        if not PROFILE_ALLOW_REMOTE:
+            return _error(403, "Profiling is disabled on this server")
+        try:
+            parse_spec(profile)
+        except ValueError as e:
+            return _error(400, str(e))
+    tenant_id = request["tenant_id"]
+
+    if not body.get("stream"):
+        reports = []
+        answer = await _run(answer_query, question, tenant_id, top_k, budget, profile, reports.append)
+        return web.json_response({"answer": answer, **({"profile": reports[0]} if reports else {})})
+
+    resp = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+    await resp.prepare(request)
+    try:
+        reports = []
+        stream = _iterate_in_thread(answer_query_stream, question, tenant_id, top_k, budget, profile, reports.append)
+        async with contextlib.aclosing(stream) as pieces:
+            async for piece in pieces:
+                await resp.write(_sse({"text": piece}))
+        if reports:
+            await resp.write(_sse(reports[0], event="profile"))
+        await resp.write(_sse({}, event="done"))
+    except (ConnectionResetError, asyncio.CancelledError):
+        raise
+    except Exception as e:
+        # Headers are already sent; report the failure in-band
+        await resp.write(_sse({"error": str(e)}, event="error"))
+    await resp.write_eof()
+    return resp
+
+
+# ---------- app ----------
+
+async def _on_startup(app):
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=SERVER_THREADS, thread_name_prefix="haystack-http")
+    )
+
+
+def create_app() -> web.Application:
+    app = web.Application(middlewares=[_middleware], client_max_size=(MAX_UPLOAD_MB + 1) << 20)
+    app.on_startup.append(_on_startup)
+    app.add_routes([
+        web.post("/login", login),
+        web.post("/logout", logout),
+        web.get("/health", health),
+        web.get("/kbs", get_kbs),
+        web.post("/kbs", post_kb),
+        web.post("/kbs/{kb_id}/activate", activate_kb),
+        web.delete("/kbs/{kb_id}", remove_kb),
+        web.get("/kbs/{kb_id}/documents", get_documents),
+        web.post("/ingest", ingest),
+        web.get("/jobs", get_jobs),
+        web.get("/jobs/{job_id}", get_job_status),
+        web.delete("/jobs/{job_id}", delete_job),
+        web.post("/query", query),
+    ])
+    return app
+
+
+def run_server(host: str = "127.0.0.1", port: int = 8000, workers: int = 1):
+    start_worker(workers)
+    web.run_app(create_app(), host=host, port=port)
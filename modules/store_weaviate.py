@@ -1,10 +1,13 @@
 """
 local Weaviate store helper,
-This Provides create_schema(), store_documents(docs), and query_embeddings().
+This Provides create_schema(), store_documents(docs) (streamed through modules/chunk_writer.py), query_embeddings(),
+filtered count / batch delete helpers, cursor iteration (snapshot export, KG index rebuilds) and HNSW parameter overrides.
 """
 
 import os
-import weaviate
+import json
+import itertools
+import threading
 from dotenv import load_dotenv
 from typing import List, Dict, Any
 
@@ -15,12 +18,41 @@ _client = None
 def get_client():
     global _client
     if _client is None:
+        # The weaviate client pulls in a large dependency tree; import on first use
+        import weaviate
         _client = weaviate.Client(url=WEAVIATE_URL)
     return _client
 
 CLASS_NAME = "DocumentChunk"
 
+# Vector compression for the chunk index: "none", "pq" (product quantization)
+# or "bq" (binary quantization). Compressed vectors stay in memory, the full
+# vectors on disk. See benchmarks/vector_compression.py for memory vs recall.
+VECTOR_COMPRESSION = os.getenv("VECTOR_COMPRESSION", "none").lower()
+# PQ segments per vector (one byte each); 0 lets Weaviate choose
+PQ_SEGMENTS = int(os.getenv("PQ_SEGMENTS", "0"))
+# With compression on, search over-fetches top_k * RESCORE_FACTOR candidates
+# and re-ranks them against the full-precision vectors
+RESCORE_FACTOR = int(os.getenv("VECTOR_RESCORE_FACTOR", "4"))
+
+# Tuned HNSW parameters per class (written by pipelines/hnsw_tuning.py)
+HNSW_CONFIG_FILE = os.getenv("HNSW_CONFIG_FILE", "hnsw_config.json")
+DEFAULT_HNSW_PARAMS = {
+    "efConstruction": 128,
+    "maxConnections": 64,
+    "ef": 32,
+}
+# Fixed when the class is created; changing them needs a re-index
+IMMUTABLE_HNSW_PARAMS = ("efConstruction", "maxConnections")
+
+# Parallel ingest workers may all try to create the class on first run
+_SCHEMA_LOCK = threading.Lock()
+
 def create_schema():
+    with _SCHEMA_LOCK:
+        _create_schema()
+
+def _create_schema():
     client = get_client()
     existing = client.schema.get()
     classes = [c["class"] for c in existing.get("classes", [])]
@@ -33,11 +65,7 @@ def create_schema():
                 "class": CLASS_NAME,
                 "vectorizer": "none",
                 "vectorIndexType": "hnsw",
-                "vectorIndexConfig": {
-                    "efConstruction": 128,
-                    "maxConnections": 64,
-                    "ef": 32
-                },
+                "vectorIndexConfig": vector_index_config(),
                 "replicationConfig": {
                     "factor": 1
                 },
@@ -54,25 +82,113 @@ def create_schema():
     client.schema.create(schema)
 
 
-def store_documents(chunks: List[str], embeddings: List[List[float]], tenant_id: str, kb_id: str, pdf_id: str):
+def _compression_config(compression: str) -> Dict[str, Any]:
+    if compression == "pq":
+        return {"pq": {
+            "enabled": True,
+            "segments": PQ_SEGMENTS,
+            "centroids": 256,
+            "trainingLimit": 100000,
+            "encoder": {"type": "kmeans", "distribution": "log-normal"},
+        }}
+    if compression == "bq":
+        return {"bq": {"enabled": True}}
+    if compression == "none":
+        return {}
+    raise ValueError(f"Unknown vector compression: {compression}")
+
+
+def _load_hnsw_file() -> Dict[str, Any]:
+    if not os.path.exists(HNSW_CONFIG_FILE):
+        return {}
+    with open(HNSW_CONFIG_FILE, "r") as f:
+        return json.load(f)
+
+
+def load_hnsw_params(class_name: str = CLASS_NAME) -> Dict[str, Any]:
+    params = dict(DEFAULT_HNSW_PARAMS)
+    params.update(_load_hnsw_file().get(class_name, {}).get("params", {}))
+    return params
+
+
+def apply_hnsw_params(class_name: str, params: Dict[str, Any], report: Dict[str, Any] = None) -> List[str]:
+    """
+    Saves tuned parameters for a class and applies what Weaviate allows live (ef).
+    Returns the names of saved parameters that only take effect once the class is re-created.
+    """
+    data = _load_hnsw_file()
+    data[class_name] = {"params": params, "report": report}
+    with open(HNSW_CONFIG_FILE, "w") as f:
+        json.dump(data, f, indent=2)
+
+    if not class_exists(class_name):
+        return []
+
+    client = get_client()
+    current = client.schema.get(class_name).get("vectorIndexConfig", {})
+    if "ef" in params and current.get("ef") != params["ef"]:
+        client.schema.update_config(class_name, {"vectorIndexConfig": {"ef": params["ef"]}})
+    return [p for p in IMMUTABLE_HNSW_PARAMS if p in params and current.get(p) != params[p]]
+
+
+def vector_index_config(compression: str = None, class_name: str = CLASS_NAME) -> Dict[str, Any]:
+    config = load_hnsw_params(class_name)
+    config.update(_compression_config(compression or VECTOR_COMPRESSION))
+    return config
+
+
+def enable_compression(compression: str = None):
+    """
+    Turns compression on for an existing DocumentChunk class (PQ trains on the stored vectors).
+    Reducing the embedding size is not possible in place; that needs a re-ingest into a fresh class.
+    """
+    client = get_client()
+    client.schema.update_config(CLASS_NAME, {"vectorIndexConfig": _compression_config(compression or VECTOR_COMPRESSION)})
+
+
+def store_documents(chunks: List[str], embeddings: List[List[float]], tenant_id: str, kb_id: str, pdf_id: str,
+                    uuids: List[str] = None) -> Dict[str, Any]:
+    """
+    Stores chunks through a ChunkWriter; chunks and embeddings may be any
+    iterables, consumed lazily. Returns the writer summary (inserted / failed / errors).
+    """
+    from modules.chunk_writer import ChunkWriter
+
+    meta = {"tenant_id": tenant_id, "kb_id": kb_id, "pdf_id": pdf_id}
+    ids = uuids if uuids is not None else itertools.repeat(None)
+    return ChunkWriter().write((txt, emb, meta, u) for txt, emb, u in zip(chunks, embeddings, ids))
+
+
+def reassign_chunks(moves: Dict[str, str]):
+    """Hands stored chunks {uuid: pdf_id} over to another document."""
     client = get_client()
-    with client.batch as batch:
-        for txt, emb in zip(chunks, embeddings):
-            batch.add_data_object(
-                data_object={"text": txt, "tenant_id": tenant_id, "kb_id": kb_id, "pdf_id": pdf_id},
-                class_name=CLASS_NAME,
-                vector=emb,
-            )
+    for chunk_id, pdf_id in moves.items():
+        client.data_object.update({"pdf_id": pdf_id}, class_name=CLASS_NAME, uuid=chunk_id)
+
+
+def _rescore(query_emb: List[float], hits: List[Dict[str, Any]], top_k: int) -> List[Dict[str, Any]]:
+    import numpy as np
+
+    if not hits:
+        return hits
+    q = np.asarray(query_emb, dtype=np.float32)
+    vecs = np.asarray([h["_additional"]["vector"] for h in hits], dtype=np.float32)
+    sims = vecs @ q / (np.linalg.norm(vecs, axis=1) * np.linalg.norm(q) + 1e-12)
+    order = np.argsort(-sims)[:top_k]
+    return [hits[i] for i in order]
 
 
 def query_embeddings(query_emb: List[float], top_k: int = 5, tenant_id:str = None) -> List[Dict[str, Any]]:
     client = get_client()
+    rescore = VECTOR_COMPRESSION != "none" and RESCORE_FACTOR > 1
     q = (
         client.query
         .get(CLASS_NAME, ["text"])
         .with_near_vector({"vector": query_emb})
-        .with_limit(top_k)
+        .with_limit(top_k * RESCORE_FACTOR if rescore else top_k)
     )
+    if rescore:
+        q = q.with_additional(["vector"])
 
     if tenant_id:
         q = q.with_where({
@@ -82,4 +198,85 @@ def query_embeddings(query_emb: List[float], top_k: int = 5, tenant_id:str = Non
         })
 
     result = q.do()
-    return result.get("data", {}).get("Get", {}).get(CLASS_NAME, [])
\ No newline at end of file
+    hits = result.get("data", {}).get("Get", {}).get(CLASS_NAME, [])
+    return _rescore(query_emb, hits, top_k) if rescore else hits
+
+
+def class_exists(class_name: str) -> bool:
+    client = get_client()
+    existing = client.schema.get()
+    return class_name in [c["class"] for c in existing.get("classes", [])]
+
+
+def class_properties(class_name: str) -> List[str]:
+    """Property names of a class, in schema order."""
+    client = get_client()
+    return [p["name"] for p in client.schema.get(class_name).get("properties", [])]
+
+
+def count_where(class_name: str, where: Dict[str, Any] = None) -> int:
+    client = get_client()
+    q = client.query.aggregate(class_name).with_meta_count()
+    if where:
+        q = q.with_where(where)
+    result = q.do()
+    groups = result.get("data", {}).get("Aggregate", {}).get(class_name) or [{}]
+    return groups[0].get("meta", {}).get("count", 0)
+
+
+def count_by(class_name: str, prop: str) -> Dict[str, int]:
+    """
+    Returns {value: object count} for every distinct value of a property.
+    """
+    client = get_client()
+    result = (
+        client.query.aggregate(class_name)
+        .with_group_by_filter([prop])
+        .with_fields("groupedBy { value } meta { count }")
+        .do()
+    )
+    groups = result.get("data", {}).get("Aggregate", {}).get(class_name) or []
+    return {g["groupedBy"]["value"]: g["meta"]["count"] for g in groups}
+
+
+def delete_where(class_name: str, where: Dict[str, Any], on_progress=None) -> int:
+    """
+    Batch-deletes every object of a class matching a where filter.
+    Weaviate caps one batch delete at QUERY_MAXIMUM_RESULTS objects,
+    so keep going until a round matches fewer than the limit.
+    Returns the number of deleted objects.
+    """
+    client = get_client()
+    deleted = 0
+    while True:
+        res = client.batch.delete_objects(class_name=class_name, where=where, output="minimal")
+        results = res.get("results", {})
+        successful = results.get("successful", 0)
+        deleted += successful
+        if on_progress:
+            on_progress(deleted)
+        if successful == 0 or results.get("matches", 0) < results.get("limit", 0):
+            break
+    return deleted
+
+
+def iter_objects(class_name: str, properties: List[str], with_vector: bool = False, page_size: int = 500):
+    """
+    Yields every object of a class using cursor pagination (after=<last id>).
+    Weaviate cursors can't be combined with a where filter, so callers filter client-side.
+    """
+    client = get_client()
+    additional = ["id", "vector"] if with_vector else ["id"]
+    after = None
+    while True:
+        q = client.query.get(class_name, properties).with_additional(additional).with_limit(page_size)
+        if after:
+            q = q.with_after(after)
+        result = q.do()
+        if result.get("errors"):
+            raise RuntimeError(f"Weaviate cursor query failed: {result['errors']}")
+        objs = result.get("data", {}).get("Get", {}).get(class_name) or []
+        if not objs:
+            return
+        yield from objs
+        after = objs[-1]["_additional"]["id"]
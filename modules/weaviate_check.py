@@ -3,25 +3,61 @@
 """
 Weaviate readiness and auto-start helper.
 Used to ensure local Weaviate (Docker) is running before pipeline starts.
+
+A successful check is cached on disk for READY_CACHE_TTL seconds, so
+back-to-back CLI runs skip both the HTTP probe and `docker ps`.
 """
 
+import os
 import subprocess
+import tempfile
 import time
 import requests
 
 WEAVIATE_PORT = 4560
 WEAVIATE_URL = f"http://localhost:{WEAVIATE_PORT}"
 
+READY_CACHE_TTL = float(os.getenv("WEAVIATE_READY_CACHE_TTL", "60"))
+_READY_CACHE_FILE = os.path.join(tempfile.gettempdir(), f"haystack_weaviate_ready_{WEAVIATE_PORT}")
+
+_ready = False
+
+
+def _cached_ready() -> bool:
+    try:
+        return time.time() - os.path.getmtime(_READY_CACHE_FILE) < READY_CACHE_TTL
+    except OSError:
+        return False
+
+
+def _mark_ready():
+    global _ready
+    _ready = True
+    try:
+        with open(_READY_CACHE_FILE, "w") as f:
+            f.write(WEAVIATE_URL)
+    except OSError:
+        pass
+
 
-def is_weaviate_ready():
+def is_weaviate_ready(timeout: float = 1):
     try:
-        r = requests.get(f"{WEAVIATE_URL}/v1/.well-known/live", timeout=1)
+        r = requests.get(f"{WEAVIATE_URL}/v1/.well-known/live", timeout=timeout)
         return r.status_code == 200
     except Exception:
         return False
 
 
 def ensure_weaviate_running():
+    # Fast paths: already confirmed in this process or by a recent run
+    if _ready or _cached_ready():
+        return True
+
+    # A live Weaviate needs no docker check at all
+    if is_weaviate_ready(timeout=0.3):
+        _mark_ready()
+        return True
+
     # Check if container is running
     try:
         out = subprocess.check_output(
@@ -48,8 +84,9 @@ def ensure_weaviate_running():
     for _ in range(20):  # up to ~20 seconds
         if is_weaviate_ready():
             print("Weaviate is ready.")
+            _mark_ready()
             return True
         time.sleep(1)
 
     print("Weaviate did not start up in time.")
-    return False
\ No newline at end of file
+    return False
@@ -3,84 +3,464 @@ Background ingestion worker.
 Handles job queue, job status, and async ingestion execution.
 basic shabdo me ingestion thoda fast krta hai.
 
+Besides ingestion, the same queue runs KB/document purge jobs and
+the orphan garbage-collection sweep, with progress reported on the job.
+Every job status change notifies JOBS_CHANGED, so callers can wait
+for jobs (wait_for_jobs) instead of polling get_job.
+
+Jobs are dispatched by JobScheduler (modules/job_scheduler.py): priority
+class (interactive / bulk / background), then weighted fair share per
+tenant. A job may carry a deadline (seconds from submission); one still
+queued when it passes is "expired", one running stops at its next
+checkpoint. cancel_job stops a queued job at once and a running one at its
+next checkpoint (between pipeline stages and embedding / delete batches).
+
+An ingest job completes once the document is searchable; its knowledge graph
+is built by a follow-up "kg" job at background priority. Documents ingested
+into a KB while its KG job is still queued join that job (up to KG_BATCH_MAX),
+so one job builds many graphs, and a KG failure never fails the ingest.
+KG jobs live in memory only: start_worker re-queues the graph builds a
+previous process left behind (documents still spooled), and documents of a
+KG job that is cancelled, expires or fails get a graph_error.
 """
 
+import heapq
+import os
 import threading
-import queue
 import uuid
 import time
-from datetime import datetime
-from pipelines.ingestion import do_ingest
+from datetime import datetime, timedelta
+from pipelines.ingestion import do_ingest, build_graphs, drop_spooled_text, has_spooled_text
+from pipelines.deletion import purge_kb, purge_document, gc_orphans
 from pipelines.monitor import log_job_start, log_job_end
 from pipelines.monitor import log_ingestion
+from modules.rate_limiter import get_limiter, RateLimitedError
+from modules.knowledge_base_manager import get_active_kb, generate_pdf_id, remove_document, all_documents
+from modules.knowledge_base_manager import update_document
+from modules.job_scheduler import JobScheduler, JobCancelled, PRIORITIES
+from modules.profiling import profiled, parse_spec
+
+# A job that keeps hitting the Gemini quota is requeued this many times before failing
+MAX_REQUEUES = 10
+
+FINISHED_STATES = ("completed", "failed", "cancelled", "expired")
 
 # Job queue
-_JOB_QUEUE = queue.Queue()
+_SCHEDULER = JobScheduler()
+
+# job_id → job, for jobs a worker is running
+_RUNNING = {}
+
+# Seconds per unit of job cost (MB for ingests), per job type; a moving
+# average of finished jobs, used for the estimated start of queued ones
+_SECONDS_PER_COST = {"ingest": 10.0}
+_DEFAULT_SECONDS = 10.0
+
+# Documents one KG job builds graphs for; later ones start the next job
+KG_BATCH_MAX = int(os.getenv("KG_BATCH_MAX", "20"))
+# (tenant_id, kb_id) → (job_id, documents) of the KB's queued KG job, which
+# new documents join until a worker takes it
+_KG_PENDING = {}
 
 # In-memory job registry
 JOBS = {}
 
+# Notified on every job status / progress change
+JOBS_CHANGED = threading.Condition()
+
+# Called (under JOBS_CHANGED) as fn(job_id, fields) on every job update
+_WATCHERS = []
+
+
+def _update_job(job_id: str, **fields):
+    with JOBS_CHANGED:
+        JOBS[job_id].update(fields)
+        for fn in _WATCHERS:
+            fn(job_id, fields)
+        JOBS_CHANGED.notify_all()
+
+
+def _checkpoint(job: dict):
+    """Raises JobCancelled once the job is cancelled or past its deadline."""
+    def check():
+        if JOBS[job["job_id"]].get("cancel_requested"):
+            raise JobCancelled("Cancelled")
+        if job.get("_deadline") is not None and time.monotonic() > job["_deadline"]:
+            raise JobCancelled("Deadline passed while running", status="expired")
+    return check
+
+
+def _progress_callback(job: dict):
+    check = _checkpoint(job)
+
+    def update(progress):
+        _update_job(job["job_id"], progress=progress)
+        check()
+    return update
+
+
+def _run_job(job: dict) -> dict:
+    tenant_id = job["tenant_id"]
+    kind = job["type"]
+
+    if kind == "ingest":
+        # Pin KB and document ids on the first run so a requeued job
+        # can clean up whatever its throttled attempt already stored.
+        if job.get("attempts"):
+            purge_document(tenant_id, job["kb_id"], job["pdf_id"])
+        if not job.get("kb_id"):
+            job["kb_id"] = get_active_kb(tenant_id)
+        job.setdefault("pdf_id", generate_pdf_id())
+        res = do_ingest(job["path"], tenant_id, kb_id=job["kb_id"], pdf_id=job["pdf_id"],
+                        content_hash=job.get("content_hash"), checkpoint=_checkpoint(job),
+                        kg="deferred", started=job["_submitted"])
+        log_ingestion(tenant_id, res.get("chunks", 0), job["path"])
+        if res.get("graph") == "pending":
+            res["kg_job_id"] = submit_kg_job(tenant_id, job["kb_id"], job["pdf_id"], res["pdf_name"])
+        return res
+    if kind == "kg":
+        return build_graphs(tenant_id, job["kb_id"], job["documents"], progress=_progress_callback(job))
+    if kind == "purge_kb":
+        return purge_kb(tenant_id, job["kb_id"], progress=_progress_callback(job))
+    if kind == "purge_document":
+        res = purge_document(tenant_id, job["kb_id"], job["pdf_id"], progress=_progress_callback(job))
+        remove_document(tenant_id, job["kb_id"], job["pdf_id"])
+        drop_spooled_text(job["pdf_id"])
+        return res
+    if kind == "gc":
+        return gc_orphans(dry_run=job.get("dry_run", False), progress=_progress_callback(job))
+    raise ValueError(f"Unknown job type: {kind}")
+
+
+def _wait_for_quota():
+    # Backpressure: while Gemini is throttling us, don't start new work
+    for kind in ("embed", "generate"):
+        get_limiter(kind).wait_until_healthy()
+
+
+def _requeue(job: dict, error: RateLimitedError):
+    job["attempts"] = job.get("attempts", 0) + 1
+    _update_job(job["job_id"], attempts=job["attempts"], status="queued",
+                error=f"Throttled, requeued: {error}")
+    delay = error.retry_after or min(60, 5 * job["attempts"])
+    threading.Timer(delay, _release, args=(job,)).start()
+
+
+def _release(job: dict):
+    # A job cancelled while it waited out the throttle never goes back in the queue
+    if JOBS[job["job_id"]].get("cancel_requested"):
+        _finish(job, "cancelled", "Cancelled")
+    else:
+        _SCHEDULER.put(job)
+
+
+def _finish(job: dict, status: str, error: str):
+    """Ends a job that did not complete: failed, cancelled or expired."""
+    started = job.get("_t0")
+    _update_job(job["job_id"], status=status, error=error, finished_at=datetime.utcnow().isoformat(),
+                duration=None if started is None else time.monotonic() - started)
+    if job["type"] == "kg":
+        _abandon_graphs(job, status, error)
+    if job["tenant_id"]:
+        log_job_end(job["tenant_id"], job["job_id"], False, error_message=error)
+
+
+def _abandon_graphs(job: dict, status: str, error: str):
+    """Records graph_error on the documents a KG job ended without building; their text stays spooled."""
+    key = (job["tenant_id"], job["kb_id"])
+    with JOBS_CHANGED:
+        pending = _KG_PENDING.get(key)
+        if pending is not None and pending[0] == job["job_id"]:
+            del _KG_PENDING[key]
+    for doc in job["documents"]:
+        if doc.get("graph") is None:
+            update_document(job["tenant_id"], job["kb_id"], doc["pdf_id"], graph_error=f"KG job {status}: {error}")
+
+
+def _fail(job: dict, error: Exception):
+    _finish(job, "failed", str(error))
+
+
+def _cancelled(job: dict, error: JobCancelled):
+    if job["type"] == "ingest" and job.get("pdf_id"):
+        # Drop whatever chunks / graph the stopped run already stored
+        try:
+            purge_document(job["tenant_id"], job["kb_id"], job["pdf_id"])
+            drop_spooled_text(job["pdf_id"])
+        except Exception as e:
+            _finish(job, error.status, f"{error}; cleanup failed: {e}")
+            return
+    _finish(job, error.status, str(error))
+
+
+def _record_duration(job: dict, seconds: float):
+    rate = seconds / job["_cost"]
+    previous = _SECONDS_PER_COST.get(job["type"])
+    _SECONDS_PER_COST[job["type"]] = rate if previous is None else 0.8 * previous + 0.2 * rate
+
 
 def _worker_loop():
     while True:
-        job = _JOB_QUEUE.get()
-        if job is None:
-            break
+        job = _SCHEDULER.get()
+        _wait_for_quota()
         job_id = job["job_id"]
         tenant_id = job["tenant_id"]
-        path = job["path"]
+        label = job.get("path") or job["type"]
 
-        JOBS[job_id]["status"] = "running"
-        JOBS[job_id]["started_at"] = datetime.utcnow().isoformat()
+        job["_t0"] = time.monotonic()
+        with JOBS_CHANGED:
+            _RUNNING[job_id] = job
+            pending = _KG_PENDING.get((tenant_id, job.get("kb_id")))
+            if pending is not None and pending[0] == job_id:
+                # From here on its document list is fixed
+                del _KG_PENDING[(tenant_id, job["kb_id"])]
+        _update_job(job_id, status="running", started_at=datetime.utcnow().isoformat())
 
-        log_job_start(tenant_id, job_id, path)
+        if tenant_id:
+            log_job_start(tenant_id, job_id, label)
 
         try:
-            res = do_ingest(path, tenant_id)
-            log_ingestion(tenant_id, res.get("chunks", 0), path)
-            JOBS[job_id]["status"] = "completed"
-            JOBS[job_id]["finished_at"] = datetime.utcnow().isoformat()
-            log_job_end(tenant_id, job_id, True, chunks=res.get("chunks", 0))
+            _checkpoint(job)()
+            # Off unless the job asks for it (profile=...) or PROFILE_MODE is set
+            with profiled(job_id, job.get("profile"), on_report=lambda r: _update_job(job_id, profile=r)):
+                res = _run_job(job)
+            duration = time.monotonic() - job["_t0"]
+            _update_job(job_id, status="completed", result=res,
+                        finished_at=datetime.utcnow().isoformat(), duration=duration)
+            _record_duration(job, duration)
+            if tenant_id:
+                log_job_end(tenant_id, job_id, True, chunks=res.get("chunks"))
+        except JobCancelled as e:
+            _cancelled(job, e)
+        except RateLimitedError as e:
+            if job.get("attempts", 0) < MAX_REQUEUES:
+                _requeue(job, e)
+            else:
+                _fail(job, e)
         except Exception as e:
-            JOBS[job_id]["status"] = "failed"
-            JOBS[job_id]["error"] = str(e)
-            JOBS[job_id]["finished_at"] = datetime.utcnow().isoformat()
-            log_job_end(tenant_id, job_id, False, error_message=str(e))
+            _fail(job, e)
+        finally:
+            with JOBS_CHANGED:
+                del _RUNNING[job_id]
+
+
+def _expiry_loop():
+    while True:
+        for job in _SCHEDULER.wait_expired():
+            _finish(job, "expired", "Deadline passed before the job started")
 
-        _JOB_QUEUE.task_done()
 
+_worker_threads = []
 
-_worker_thread = None
 
+def _resume_kg_jobs():
+    """
+    Re-queues deferred graph builds lost with a previous process: searchable
+    documents without a graph whose text is still spooled.
+    """
+    for tenant_id, kb_id, doc in all_documents():
+        if doc.get("searchable") and not doc.get("graph_ready") and has_spooled_text(doc["pdf_id"]):
+            submit_kg_job(tenant_id, kb_id, doc["pdf_id"], doc["pdf_name"])
 
-def start_worker():
-    global _worker_thread
-    if _worker_thread is None:
-        _worker_thread = threading.Thread(target=_worker_loop, daemon=True)
-        _worker_thread.start()
 
+def start_worker(workers: int = 1):
+    """
+    Starts the worker pool; calling again with a larger number adds threads.
+    The first call also re-queues KG builds a previous process left behind.
+    """
+    if not _worker_threads:
+        threading.Thread(target=_expiry_loop, daemon=True).start()
+        _resume_kg_jobs()
+    while len(_worker_threads) < workers:
+        t = threading.Thread(target=_worker_loop, daemon=True)
+        t.start()
+        _worker_threads.append(t)
 
-def submit_job(path: str, tenant_id: str):
+
+def _submit(kind: str, tenant_id: str = None, priority: str = "interactive", deadline: float = None,
+            **params):
+    if priority not in PRIORITIES:
+        raise ValueError(f"Unknown priority {priority!r} (expected one of {', '.join(PRIORITIES)})")
     job_id = str(uuid.uuid4())
-    JOBS[job_id] = {
-        "job_id": job_id,
-        "tenant_id": tenant_id,
-        "path": path,
-        "status": "queued",
-        "created_at": datetime.utcnow().isoformat(),
-        "started_at": None,
-        "finished_at": None,
-        "error": None,
-    }
-    _JOB_QUEUE.put({"job_id": job_id, "tenant_id": tenant_id, "path": path})
+    job = {"job_id": job_id, "type": kind, "tenant_id": tenant_id, "priority": priority,
+           "_submitted": time.monotonic(), **params}
+    if deadline is not None:
+        job["_deadline"] = time.monotonic() + deadline
+    with JOBS_CHANGED:
+        JOBS[job_id] = {
+            "job_id": job_id,
+            "type": kind,
+            "tenant_id": tenant_id,
+            "path": params.get("path"),
+            "priority": priority,
+            "status": "queued",
+            "created_at": datetime.utcnow().isoformat(),
+            "deadline": None if deadline is None else (datetime.utcnow() + timedelta(seconds=deadline)).isoformat(),
+            "started_at": None,
+            "finished_at": None,
+            "duration": None,
+            "progress": None,
+            "result": None,
+            "error": None,
+        }
+    _SCHEDULER.put(job)
+    return job_id
+
+
+def submit_job(path: str, tenant_id: str, kb_id: str = None, content_hash: str = None,
+               priority: str = "interactive", deadline: float = None, profile: str = None):
+    """
+    Queues a PDF ingest. kb_id pins the target KB at submit time
+    (default: whatever KB is active when the job starts). priority is
+    "interactive" (default), "bulk" or "background"; deadline is seconds
+    from now after which the job is dropped (queued) or stopped (running).
+    profile ("cprofile", "sampling", "+memory"; see modules/profiling.py)
+    profiles this job; the summary lands on the job as "profile".
+    """
+    if profile is not None:
+        parse_spec(profile)
+    return _submit("ingest", tenant_id, priority, deadline, path=path, kb_id=kb_id, content_hash=content_hash,
+                   profile=profile)
+
+
+def submit_purge_job(tenant_id: str, kb_id: str, pdf_id: str = None, priority: str = "bulk"):
+    """
+    Queues deletion of a whole KB, or of one document when pdf_id is given.
+    """
+    if pdf_id:
+        return _submit("purge_document", tenant_id, priority, kb_id=kb_id, pdf_id=pdf_id)
+    return _submit("purge_kb", tenant_id, priority, kb_id=kb_id)
+
+
+def submit_kg_job(tenant_id: str, kb_id: str, pdf_id: str, pdf_name: str):
+    """
+    Queues the deferred graph build of an ingested (spooled) document at
+    background priority. It joins the KB's KG job if one is still queued
+    with room, else starts a new one. Returns the job id.
+    """
+    doc = {"pdf_id": pdf_id, "pdf_name": pdf_name}
+    with JOBS_CHANGED:
+        pending = _KG_PENDING.get((tenant_id, kb_id))
+        if pending is not None:
+            job_id, documents = pending
+            if JOBS[job_id]["status"] == "queued" and len(documents) < KG_BATCH_MAX:
+                documents.append(doc)
+                JOBS[job_id]["documents"] = len(documents)
+                JOBS_CHANGED.notify_all()
+                return job_id
+        documents = [doc]
+        job_id = _submit("kg", tenant_id, "background", kb_id=kb_id, documents=documents)
+        JOBS[job_id]["documents"] = 1
+        _KG_PENDING[(tenant_id, kb_id)] = (job_id, documents)
     return job_id
 
 
+def submit_gc_job(dry_run: bool = False):
+    return _submit("gc", None, "background", dry_run=dry_run)
+
+
+def cancel_job(job_id: str) -> bool:
+    """
+    Cancels a job: a queued one at once, a running one at its next
+    checkpoint (it then ends "cancelled" and its partial output is purged).
+    Returns False if the job is unknown or already finished.
+    """
+    job = _SCHEDULER.remove(job_id)
+    if job is not None:
+        _finish(job, "cancelled", "Cancelled before it started")
+        return True
+    with JOBS_CHANGED:
+        record = JOBS.get(job_id)
+        if record is None or record["status"] in FINISHED_STATES:
+            return False
+        # Running, or waiting out a throttle before going back in the queue
+        record["cancel_requested"] = True
+        JOBS_CHANGED.notify_all()
+    return True
+
+
 def get_job(job_id: str):
     return JOBS.get(job_id)
 
 
+def _estimated_starts() -> dict:
+    """
+    job_id → (queue position, estimated start) for queued jobs. Simulates
+    the workers taking jobs in scheduler order, each job lasting its type's
+    average seconds per cost unit times its cost.
+    """
+    order = _SCHEDULER.order()
+    if not order:
+        return {}
+    now = time.monotonic()
+
+    def expected(job):
+        return _SECONDS_PER_COST.get(job["type"], _DEFAULT_SECONDS) * job["_cost"]
+
+    with JOBS_CHANGED:
+        running = list(_RUNNING.values())
+    free_at = [now + max(0.0, expected(job) - (now - job["_t0"])) for job in running]
+    free_at += [now] * max(0, len(_worker_threads) - len(free_at))
+    heapq.heapify(free_at)
+    wall = datetime.utcnow()
+    starts = {}
+    for position, job in enumerate(order, start=1):
+        start = heapq.heappop(free_at) if free_at else None
+        eta = None if start is None else (wall + timedelta(seconds=start - now)).isoformat()
+        starts[job["job_id"]] = (position, eta)
+        if start is not None:
+            heapq.heappush(free_at, start + expected(job))
+    return starts
+
+
 def list_jobs(tenant_id: str = None):
-    if tenant_id:
-        return [job for job in JOBS.values() if job["tenant_id"] == tenant_id]
-    return list(JOBS.values())
\ No newline at end of file
+    """
+    Snapshots of the jobs (all, or one tenant's); queued ones carry
+    queue_position (1 = next to start) and estimated_start.
+    """
+    starts = _estimated_starts()
+    with JOBS_CHANGED:
+        jobs = [dict(job) for job in JOBS.values() if not tenant_id or job["tenant_id"] == tenant_id]
+    for job in jobs:
+        if job["job_id"] in starts:
+            job["queue_position"], job["estimated_start"] = starts[job["job_id"]]
+    return jobs
+
+
+def wait_for_jobs(job_ids: list, on_change=None, timeout: float = None) -> bool:
+    """
+    Blocks until every job has finished, without polling.
+    on_change(jobs) is called (under the lock) each time any job changes.
+    Returns False if timeout expired first.
+    """
+    deadline = None if timeout is None else time.monotonic() + timeout
+    with JOBS_CHANGED:
+        while True:
+            jobs = [JOBS[j] for j in job_ids]
+            if on_change:
+                on_change(jobs)
+            if all(j["status"] in FINISHED_STATES for j in jobs):
+                return True
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return False
+            JOBS_CHANGED.wait(remaining)
+
+
+def add_job_watcher(fn):
+    """
+    fn(job_id, fields) is called under JOBS_CHANGED with the fields of every
+    job update from now on, so callers can track many jobs incrementally.
+    """
+    with JOBS_CHANGED:
+        _WATCHERS.append(fn)
+
+
+def remove_job_watcher(fn):
+    with JOBS_CHANGED:
+        _WATCHERS.remove(fn)
+
+
+def wait_for_job(job_id: str, timeout: float = None):
+    wait_for_jobs([job_id], timeout=timeout)
+    return get_job(job_id)
@@ -0,0 +1,185 @@
+"""
+Bulk ingestion: a directory or glob of PDFs → worker pool, largest files first.
+Files already ingested into the KB (same content hash) are skipped.
+Progress and ETA are pushed from job status changes; no polling.
+"""
+
+import glob
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from modules.knowledge_base_manager import get_active_kb, list_documents
+from modules.worker import submit_job, get_job, add_job_watcher, remove_job_watcher, JOBS_CHANGED, FINISHED_STATES
+from pipelines.ingestion import file_hash
+
+
+def collect_pdfs(source: str) -> list:
+    """
+    A directory is searched recursively for *.pdf; anything else is treated as a glob.
+    """
+    if os.path.isdir(source):
+        pattern = os.path.join(source, "**", "*.pdf")
+    else:
+        pattern = source
+    paths = [p for p in glob.glob(pattern, recursive=True) if os.path.isfile(p)]
+    return sorted(set(os.path.abspath(p) for p in paths))
+
+
+class _Tracker:
+    """
+    Status counts and finished bytes of a bulk run's jobs, kept up to date
+    from job updates (a worker watcher), so a change costs O(1) whatever
+    the number of files.
+    """
+
+    def __init__(self, files: list, job_ids: list):
+        self.size = {job_id: f["size"] for f, job_id in zip(files, job_ids)}
+        self.status = {}
+        self.counts = {"queued": 0, "running": 0, "completed": 0, "failed": 0}
+        self.total_bytes = sum(self.size.values())
+        self.done_bytes = 0
+        self.unfinished = len(self.size)
+        self.changed = True
+
+    def __call__(self, job_id: str, fields: dict):
+        status = fields.get("status")
+        if status is None or job_id not in self.size:
+            return
+        old = self.status.get(job_id)
+        if old == status:
+            return
+        self.status[job_id] = status
+        if old is not None:
+            self.counts[old] -= 1
+        self.counts[status] = self.counts.get(status, 0) + 1
+        if status in FINISHED_STATES and old not in FINISHED_STATES:
+            self.done_bytes += self.size[job_id]
+            self.unfinished -= 1
+        self.changed = True
+
+
+def _progress(tracker: _Tracker, started: float) -> dict:
+    elapsed = time.monotonic() - started
+    done_bytes, total_bytes = tracker.done_bytes, tracker.total_bytes
+    # Bytes are a better proxy than file count when sizes vary this much
+    eta = elapsed * (total_bytes - done_bytes) / done_bytes if done_bytes else None
+    return {
+        **tracker.counts,
+        "total": len(tracker.size),
+        "done_bytes": done_bytes,
+        "total_bytes": total_bytes,
+        "elapsed": elapsed,
+        "eta": eta,
+    }
+
+
+def bulk_ingest(source: str, tenant_id: str, kb_id: str = None, on_progress=None, hash_workers: int = 8) -> dict:
+    """
+    Ingests every PDF under source into a KB (default: the active one) and
+    waits for all jobs, i.e. until every document is searchable; their graphs
+    are built afterwards by background KG jobs (kg_job_id per file).
+    Returns a report with per-file timings and failures.
+    The worker pool must already be running (start_worker(n)).
+    """
+    kb_id = kb_id or get_active_kb(tenant_id)
+    if kb_id is None:
+        raise Exception("No active Knowledge Base selected. Create or activate a KB first.")
+
+    paths = collect_pdfs(source)
+    with ThreadPoolExecutor(max_workers=hash_workers) as ex:
+        hashes = list(ex.map(file_hash, paths))
+
+    files, skipped = [], []
+    # Content hashes already in the KB, read once rather than per file
+    seen = set(list_documents(tenant_id, kb_id))
+    for path, h in zip(paths, hashes):
+        if h in seen:
+            skipped.append({"path": path, "content_hash": h})
+            continue
+        seen.add(h)
+        files.append({"path": path, "content_hash": h, "size": os.path.getsize(path)})
+
+    # Largest first: the long jobs start early instead of becoming the tail
+    files.sort(key=lambda f: f["size"], reverse=True)
+
+    started = time.monotonic()
+    # Bulk priority: interactive ingests (and other tenants' share) go ahead of this backlog
+    job_ids = [submit_job(f["path"], tenant_id, kb_id=kb_id, content_hash=f["content_hash"], priority="bulk")
+               for f in files]
+
+    tracker = _Tracker(files, job_ids)
+    add_job_watcher(tracker)
+    try:
+        with JOBS_CHANGED:
+            # Jobs may have moved on before the watcher was added
+            for job_id in job_ids:
+                tracker(job_id, {"status": get_job(job_id)["status"]})
+        while True:
+            with JOBS_CHANGED:
+                while not tracker.changed:
+                    JOBS_CHANGED.wait()
+                tracker.changed = False
+                progress = _progress(tracker, started)
+                unfinished = tracker.unfinished
+            # Outside the lock: a slow callback doesn't hold up the workers
+            if on_progress:
+                on_progress(progress)
+            if not unfinished:
+                break
+    finally:
+        remove_job_watcher(tracker)
+
+    report_files = []
+    with JOBS_CHANGED:
+        final_jobs = [dict(get_job(job_id)) for job_id in job_ids]
+    for f, job in zip(files, final_jobs):
+        result = job.get("result") or {}
+        report_files.append({
+            "path": f["path"],
+            "size": f["size"],
+            "job_id": job["job_id"],
+            "status": job["status"],
+            "seconds": job.get("duration"),
+            "chunks": result.get("chunks"),
+            "duplicate_chunks": result.get("duplicate_chunks"),
+            "pdf_id": result.get("pdf_id"),
+            "time_to_searchable": result.get("time_to_searchable"),
+            "kg_job_id": result.get("kg_job_id"),
+            "error": job.get("error") if job["status"] != "completed" else None,
+        })
+
+    return {
+        "kb_id": kb_id,
+        "files": report_files,
+        "skipped": skipped,
+        "completed": sum(1 for f in report_files if f["status"] == "completed"),
+        "failed": sum(1 for f in report_files if f["status"] == "failed"),
+        "cancelled": sum(1 for f in report_files if f["status"] in ("cancelled", "expired")),
+        "elapsed": time.monotonic() - started,
+    }
+
+
+def format_report(report: dict, slowest: int = 10) -> str:
+    lines = [
+        f"Bulk ingest into KB {report['kb_id']}: "
+        f"{report['completed']} completed, {report['failed']} failed, {report['cancelled']} cancelled, "
+        f"{len(report['skipped'])} skipped (already ingested) in {report['elapsed']:.1f}s"
+    ]
+    chunks = sum(f["chunks"] or 0 for f in report["files"])
+    duplicates = sum(f["duplicate_chunks"] or 0 for f in report["files"])
+    if chunks:
+        lines.append(f"Chunks: {chunks}, {duplicates} near duplicates reused instead of embedded "
+                     f"({duplicates / chunks:.0%})")
+    timed = sorted((f for f in report["files"] if f["seconds"] is not None),
+                   key=lambda f: f["seconds"], reverse=True)
+    if timed:
+        lines.append("Slowest files:")
+        for f in timed[:slowest]:
+            lines.append(f"  {f['seconds']:8.1f}s  {f['size'] / 1e6:8.2f} MB  {f['path']}")
+    failures = [f for f in report["files"] if f["status"] != "completed"]
+    if failures:
+        lines.append("Failures:")
+        for f in failures:
+            lines.append(f"  {f['path']}: {f['status']}: {f['error']}")
+    return "\n".join(lines)
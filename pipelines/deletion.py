@@ -0,0 +1,126 @@
+"""
+Deletion pipeline: purges a KB's or a document's chunks and graph from Weaviate.
+Also provides a garbage-collection sweep for objects whose KB is gone from the registry.
+"""
+
+from modules.store_weaviate import CLASS_NAME, class_exists, count_where, count_by, delete_where
+from modules.knowledge_base_manager import all_kb_ids
+
+# Every class that carries kb_id / pdf_id properties
+PURGE_CLASSES = [CLASS_NAME, "KG_Node", "KG_Edge"]
+GRAPH_CLASSES = ["KG_Node", "KG_Edge"]
+
+
+def _filter(tenant_id: str = None, kb_id: str = None, pdf_id: str = None) -> dict:
+    operands = []
+    for path, value in (("tenant_id", tenant_id), ("kb_id", kb_id), ("pdf_id", pdf_id)):
+        if value is not None:
+            operands.append({"path": [path], "operator": "Equal", "valueString": value})
+    if len(operands) == 1:
+        return operands[0]
+    return {"operator": "And", "operands": operands}
+
+
+def _purge(where: dict, progress=None, classes: list = PURGE_CLASSES) -> dict:
+    """
+    Deletes matching objects from every KB class (or just `classes`).
+    progress(report) is called after each batch with per-class deleted/total counts.
+    """
+    report = {}
+    classes = [c for c in classes if class_exists(c)]
+    for c in classes:
+        report[c] = {"deleted": 0, "total": count_where(c, where)}
+
+    for c in classes:
+        def on_batch(deleted, c=c):
+            report[c]["deleted"] = deleted
+            if progress:
+                progress(report)
+
+        delete_where(c, where, on_progress=on_batch)
+
+    return report
+
+
+def purge_kb(tenant_id: str, kb_id: str, progress=None) -> dict:
+    from modules.chunk_dedup import drop_dedup_index
+    from modules.entity_resolution import drop_resolver
+    from modules.kg_index import drop_kg_index
+
+    report = _purge(_filter(tenant_id, kb_id), progress)
+    drop_kg_index(tenant_id, kb_id)
+    drop_resolver(tenant_id, kb_id)
+    drop_dedup_index(tenant_id, kb_id)
+    return report
+
+
+def purge_document(tenant_id: str, kb_id: str, pdf_id: str, progress=None) -> dict:
+    from modules.chunk_dedup import get_dedup_index
+    from modules.entity_resolution import forget_document
+    from modules.kg_index import drop_kg_index
+    from modules.store_weaviate import reassign_chunks
+
+    # Chunks other documents reuse as near duplicates move to one of them instead of being deleted
+    reassign_chunks(get_dedup_index(tenant_id, kb_id).release(pdf_id))
+    report = _purge(_filter(tenant_id, kb_id, pdf_id), progress)
+    forget_document(tenant_id, kb_id, pdf_id)
+    # Rebuilt from Weaviate on next use, without this document
+    drop_kg_index(tenant_id, kb_id)
+    return report
+
+
+def purge_document_graph(tenant_id: str, kb_id: str, pdf_id: str) -> dict:
+    """
+    Only the document's KG objects; its chunks stay searchable. Clears a
+    half-stored graph after a failed KG build.
+    """
+    from modules.entity_resolution import forget_document
+    from modules.kg_index import drop_kg_index
+
+    report = _purge(_filter(tenant_id, kb_id, pdf_id), classes=GRAPH_CLASSES)
+    forget_document(tenant_id, kb_id, pdf_id)
+    drop_kg_index(tenant_id, kb_id)
+    return report
+
+
+def find_orphans() -> dict:
+    """
+    Returns {class_name: {kb_id: object count}} for objects whose kb_id
+    no longer exists in the KB registry.
+    """
+    known = all_kb_ids()
+    orphans = {}
+    for c in PURGE_CLASSES:
+        if not class_exists(c):
+            continue
+        stale = {kb_id: n for kb_id, n in count_by(c, "kb_id").items() if kb_id not in known}
+        if stale:
+            orphans[c] = stale
+    return orphans
+
+
+def gc_orphans(dry_run: bool = False, progress=None) -> dict:
+    """
+    Garbage-collection sweep: purges everything belonging to unknown KBs.
+    """
+    orphans = find_orphans()
+    if dry_run:
+        return {"orphans": orphans, "deleted": {}}
+
+    from modules.chunk_dedup import drop_kb_dedup_indexes
+    from modules.entity_resolution import drop_kb_resolvers
+    from modules.kg_index import drop_kb_indexes
+
+    deleted = {}
+    kb_ids = sorted({kb_id for per_kb in orphans.values() for kb_id in per_kb})
+    for i, kb_id in enumerate(kb_ids):
+        def on_batch(report, kb_id=kb_id, i=i):
+            if progress:
+                progress({"kb_id": kb_id, "kb_done": i, "kb_total": len(kb_ids), "classes": report})
+
+        deleted[kb_id] = _purge(_filter(kb_id=kb_id), on_batch)
+        drop_kb_indexes(kb_id)
+        drop_kb_resolvers(kb_id)
+        drop_kb_dedup_indexes(kb_id)
+
+    return {"orphans": orphans, "deleted": deleted}
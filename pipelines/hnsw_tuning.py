@@ -0,0 +1,316 @@
+"""
+HNSW parameter tuning: sample stored vectors → exact ground truth → sweep → frontier → apply.
+
+Ground truth comes from a vectorized brute-force search over the sample.
+Each (maxConnections, efConstruction) pair builds one index, and every ef
+value is measured on it for recall@k and per-query latency. The recall vs
+p95-latency Pareto frontier is printed, and the fastest setting that reaches
+the target recall can be saved / applied to the class.
+
+Backends: "weaviate" builds throwaway classes in the running Weaviate,
+"hnswlib" builds an in-process index with the same M / efConstruction / ef
+semantics. hnswlib is an optional dependency: pip install ".[tuning]".
+
+    python -m pipelines.hnsw_tuning --backend hnswlib --sample 20000 --queries 200
+    python -m pipelines.hnsw_tuning --backend weaviate --kb <kb_id> --target-recall 0.97 --apply
+"""
+
+import argparse
+import json
+import time
+import uuid
+
+import numpy as np
+
+from modules.store_weaviate import CLASS_NAME, get_client, iter_objects, load_hnsw_params, apply_hnsw_params
+
+
+# ---------- data ----------
+
+# Objects whose vectors one filtered sample query fetches
+_FETCH_IDS = 100
+
+
+def _vectors_by_id(class_name: str, ids: list) -> list:
+    """Vectors of the given objects, in the given order."""
+    client = get_client()
+    found = {}
+    for start in range(0, len(ids), _FETCH_IDS):
+        where = {"operator": "Or", "operands": [{"path": ["id"], "operator": "Equal", "valueString": i}
+                                                for i in ids[start:start + _FETCH_IDS]]}
+        result = (client.query.get(class_name, ["kb_id"]).with_additional(["id", "vector"])
+                  .with_where(where).with_limit(_FETCH_IDS).do())
+        if result.get("errors"):
+            raise RuntimeError(f"Weaviate query failed: {result['errors']}")
+        for obj in result.get("data", {}).get("Get", {}).get(class_name) or []:
+            found[obj["_additional"]["id"]] = obj["_additional"]["vector"]
+    return [found[i] for i in ids if i in found]
+
+
+def sample_vectors(class_name: str = CLASS_NAME, n: int = 20000, tenant_id: str = None, kb_id: str = None) -> np.ndarray:
+    """
+    Up to n stored vectors of a class, optionally restricted to one tenant / KB.
+    Cursor order is by uuid, so the first n objects are an unbiased sample.
+    With a filter, the cursor pass reads ids only and stops at the n-th
+    match; only the matches' vectors are fetched.
+    """
+    props = ["tenant_id", "kb_id"]
+    filtered = bool(tenant_id or kb_id)
+    rows = []
+    for obj in iter_objects(class_name, props, with_vector=not filtered):
+        if tenant_id and obj.get("tenant_id") != tenant_id:
+            continue
+        if kb_id and obj.get("kb_id") != kb_id:
+            continue
+        rows.append(obj["_additional"]["id"] if filtered else obj["_additional"]["vector"])
+        if len(rows) >= n:
+            break
+    if filtered:
+        rows = _vectors_by_id(class_name, rows)
+    if not rows:
+        raise RuntimeError(f"No vectors found in {class_name} for the given filter.")
+    return np.asarray(rows, dtype=np.float32)
+
+
+def load_query_vectors(path: str, tenant_id: str = None) -> np.ndarray:
+    """
+    Embeds the questions of a JSONL file ({"question": ...} per line, same format as --queries-file).
+    """
+    from modules.embedding_gemini import embed_texts_batched
+
+    questions = []
+    with open(path, "r") as f:
+        for line in f:
+            if line.strip():
+                item = json.loads(line)
+                questions.append(item if isinstance(item, str) else item.get("question") or item.get("query"))
+    return np.asarray(embed_texts_batched(questions, tenant_id=tenant_id), dtype=np.float32)
+
+
+def _normalize(v: np.ndarray) -> np.ndarray:
+    return v / (np.linalg.norm(v, axis=1, keepdims=True) + 1e-12)
+
+
+def exact_neighbours(data: np.ndarray, queries: np.ndarray, k: int, block: int = 256) -> np.ndarray:
+    """
+    Brute-force cosine top-k, one matrix product per block of queries.
+    """
+    d = _normalize(data)
+    q = _normalize(queries)
+    out = np.empty((len(q), k), dtype=np.int64)
+    for start in range(0, len(q), block):
+        sims = q[start:start + block] @ d.T
+        idx = np.argpartition(-sims, k, axis=1)[:, :k]
+        order = np.take_along_axis(sims, idx, axis=1).argsort(axis=1)[:, ::-1]
+        out[start:start + block] = np.take_along_axis(idx, order, axis=1)
+    return out
+
+
+# ---------- backends ----------
+
+class HnswlibBackend:
+    """In-process stand-in for Weaviate's HNSW index."""
+
+    def __init__(self):
+        try:
+            import hnswlib
+        except ImportError:
+            raise RuntimeError('The hnswlib backend needs hnswlib, an optional dependency: pip install ".[tuning]" '
+                               '(or pip install hnswlib), or use --backend weaviate.')
+        self._hnswlib = hnswlib
+        self._index = None
+
+    def build(self, data: np.ndarray, max_connections: int, ef_construction: int):
+        index = self._hnswlib.Index(space="cosine", dim=data.shape[1])
+        index.init_index(max_elements=len(data), ef_construction=ef_construction, M=max_connections)
+        index.add_items(data, np.arange(len(data)))
+        self._index = index
+
+    def search(self, queries: np.ndarray, k: int, ef: int):
+        self._index.set_ef(max(ef, k))
+        found = np.empty((len(queries), k), dtype=np.int64)
+        latencies = np.empty(len(queries))
+        for i, q in enumerate(queries):
+            t0 = time.perf_counter()
+            labels, _ = self._index.knn_query(q, k=k)
+            latencies[i] = time.perf_counter() - t0
+            found[i] = labels[0]
+        return found, latencies
+
+    def close(self):
+        self._index = None
+
+
+class WeaviateBackend:
+    """Builds a throwaway class per graph setting in the running Weaviate."""
+
+    def __init__(self, batch_size: int = 500):
+        self.client = get_client()
+        self.batch_size = batch_size
+        self.class_name = None
+
+    def build(self, data: np.ndarray, max_connections: int, ef_construction: int):
+        self.close()
+        self.class_name = f"HnswTune_{uuid.uuid4().hex[:8]}"
+        self.client.schema.create_class({
+            "class": self.class_name,
+            "vectorizer": "none",
+            "vectorIndexType": "hnsw",
+            "vectorIndexConfig": {
+                "efConstruction": ef_construction,
+                "maxConnections": max_connections,
+                "ef": 64,
+            },
+            "properties": [{"name": "row", "dataType": ["int"]}],
+        })
+        self.client.batch.configure(batch_size=self.batch_size)
+        with self.client.batch as batch:
+            for row, vec in enumerate(data):
+                batch.add_data_object({"row": row}, self.class_name, vector=vec.tolist())
+
+    def search(self, queries: np.ndarray, k: int, ef: int):
+        self.client.schema.update_config(self.class_name, {"vectorIndexConfig": {"ef": max(ef, k)}})
+        found = np.full((len(queries), k), -1, dtype=np.int64)
+        latencies = np.empty(len(queries))
+        for i, q in enumerate(queries):
+            t0 = time.perf_counter()
+            res = (
+                self.client.query.get(self.class_name, ["row"])
+                .with_near_vector({"vector": q.tolist()})
+                .with_limit(k)
+                .do()
+            )
+            latencies[i] = time.perf_counter() - t0
+            hits = res.get("data", {}).get("Get", {}).get(self.class_name) or []
+            found[i, :len(hits)] = [h["row"] for h in hits]
+        return found, latencies
+
+    def close(self):
+        if self.class_name:
+            self.client.schema.delete_class(self.class_name)
+            self.class_name = None
+
+
+BACKENDS = {"hnswlib": HnswlibBackend, "weaviate": WeaviateBackend}
+
+
+# ---------- sweep ----------
+
+def _recall(found: np.ndarray, truth: np.ndarray) -> float:
+    hits = sum(len(set(f) & set(t)) for f, t in zip(found.tolist(), truth.tolist()))
+    return hits / truth.size
+
+
+def sweep(backend, data: np.ndarray, queries: np.ndarray, k: int = 10,
+          max_connections=(16, 32, 64), ef_constructions=(128,), efs=(16, 32, 64, 128, 256)) -> list:
+    truth = exact_neighbours(data, queries, k)
+    results = []
+    try:
+        for m in max_connections:
+            for efc in ef_constructions:
+                t0 = time.perf_counter()
+                backend.build(data, m, efc)
+                build_s = time.perf_counter() - t0
+                for ef in efs:
+                    found, lat = backend.search(queries, k, ef)
+                    results.append({
+                        "maxConnections": m,
+                        "efConstruction": efc,
+                        "ef": ef,
+                        "recall": _recall(found, truth),
+                        "p50_ms": float(np.percentile(lat, 50) * 1000),
+                        "p95_ms": float(np.percentile(lat, 95) * 1000),
+                        "build_s": build_s,
+                    })
+    finally:
+        backend.close()
+    return results
+
+
+def pareto_frontier(results: list) -> list:
+    """Settings not beaten on both recall and p95 latency by any other setting."""
+    frontier = []
+    best_recall = -1.0
+    for r in sorted(results, key=lambda r: (r["p95_ms"], -r["recall"])):
+        if r["recall"] > best_recall:
+            frontier.append(r)
+            best_recall = r["recall"]
+    return frontier
+
+
+def choose(results: list, target_recall: float):
+    """Fastest (p95) setting meeting the recall target; the most accurate one if none does."""
+    ok = [r for r in results if r["recall"] >= target_recall]
+    if ok:
+        return min(ok, key=lambda r: (r["p95_ms"], r["maxConnections"]))
+    return max(results, key=lambda r: (r["recall"], -r["p95_ms"]))
+
+
+def format_results(results: list, frontier: list) -> str:
+    on_frontier = {id(r) for r in frontier}
+    lines = [f"{'M':>4} {'efC':>5} {'ef':>5} {'recall':>7} {'p50 ms':>8} {'p95 ms':>8} {'build s':>8}"]
+    for r in results:
+        mark = " *" if id(r) in on_frontier else ""
+        lines.append(
+            f"{r['maxConnections']:>4} {r['efConstruction']:>5} {r['ef']:>5} {r['recall']:>7.3f} "
+            f"{r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['build_s']:>8.1f}{mark}"
+        )
+    lines.append("* = on the recall / p95 latency frontier")
+    return "\n".join(lines)
+
+
+def _ints(csv: str):
+    return tuple(int(v) for v in csv.split(","))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tune HNSW parameters against a sample of stored vectors.")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="hnswlib")
+    parser.add_argument("--class-name", default=CLASS_NAME)
+    parser.add_argument("--tenant", default=None, help="Only sample this tenant's vectors")
+    parser.add_argument("--kb", default=None, help="Only sample this KB's vectors")
+    parser.add_argument("--sample", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200, help="Held-out stored vectors used as queries")
+    parser.add_argument("--queries-file", default=None, help="JSONL questions to embed and use as queries instead")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--max-connections", default="16,32,64")
+    parser.add_argument("--ef-construction", default="128")
+    parser.add_argument("--ef", default="16,32,64,128,256")
+    parser.add_argument("--target-recall", type=float, default=0.95)
+    parser.add_argument("--apply", action="store_true", help="Save the chosen setting and apply ef live")
+    args = parser.parse_args()
+    # Before sampling, which can take a while
+    try:
+        backend = BACKENDS[args.backend]()
+    except RuntimeError as e:
+        parser.error(str(e))
+
+    vectors = sample_vectors(args.class_name, args.sample + args.queries, args.tenant, args.kb)
+    if args.queries_file:
+        data, queries = vectors, load_query_vectors(args.queries_file, args.tenant)
+    else:
+        data, queries = vectors[args.queries:], vectors[:args.queries]
+    print(f"Sampled {len(data)} vectors ({data.shape[1]} dims) and {len(queries)} queries from {args.class_name}")
+
+    results = sweep(backend, data, queries, k=args.k,
+                    max_connections=_ints(args.max_connections),
+                    ef_constructions=_ints(args.ef_construction), efs=_ints(args.ef))
+    frontier = pareto_frontier(results)
+    print(format_results(results, frontier))
+
+    best = choose(results, args.target_recall)
+    params = {p: best[p] for p in ("efConstruction", "maxConnections", "ef")}
+    print(f"Chosen for recall >= {args.target_recall}: {params} "
+          f"(recall {best['recall']:.3f}, p95 {best['p95_ms']:.2f} ms); current: {load_hnsw_params(args.class_name)}")
+
+    if args.apply:
+        report = {"backend": args.backend, "sample": len(data), "queries": len(queries),
+                  "tenant_id": args.tenant, "kb_id": args.kb, "frontier": frontier}
+        pending = apply_hnsw_params(args.class_name, params, report)
+        print(f"Saved to {args.class_name}; ef applied live.")
+        if pending:
+            print(f"{', '.join(pending)} only take effect when {args.class_name} is re-created and re-ingested.")
+
+
+if __name__ == "__main__":
+    main()
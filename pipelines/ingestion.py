@@ -1,43 +1,239 @@
 """
-Ingestion pipeline: PDF → text → chunks → embeddings → Weaviate.
+Ingestion pipeline: PDF → text → chunks → near-duplicate check → embeddings → Weaviate (streamed).
+The document is searchable once its chunks are stored; its knowledge graph is
+built after that, inline or as a deferred job (build_graphs), and a KG failure
+never undoes the ingest.
 """
 
 from modules.pdf_reader import read_pdf
 from modules.splitter import split_text
 from modules.embedding_gemini import embed_texts
-from modules.store_weaviate import create_schema, store_documents
-from pipelines.monitor import log_ingestion
+from modules.store_weaviate import CLASS_NAME, create_schema, delete_where
+from pipelines.monitor import log_ingestion, log_time_to_searchable
 import os
+import time
+import hashlib
+from datetime import datetime
 from modules.kg_extractor import extract_kg
 from modules.kg_store import store_kg
-from modules.knowledge_base_manager import get_active_kb, generate_pdf_id
+from modules.knowledge_base_manager import (get_active_kb, generate_pdf_id, record_document, update_document,
+                                            get_document)
+from modules.profiling import profiled
+from modules.rate_limiter import RateLimitedError
 
-def do_ingest(path: str, tenant_id: str, chunk_size: int = 800, overlap: int = 100):
+def file_hash(path: str) -> str:
+    """sha256 of the file contents, used to recognise already-ingested PDFs."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+# Chunks embedded per step while streaming into Weaviate
+EMBED_SLICE = int(os.getenv("INGEST_EMBED_SLICE", "256"))
+# Text of documents waiting for their deferred KG build, one file per pdf_id
+KG_SPOOL_DIR = os.getenv("KG_SPOOL_DIR", "kg_spool")
+
+
+def _spool_path(pdf_id: str) -> str:
+    return os.path.join(KG_SPOOL_DIR, f"{pdf_id}.txt")
+
+
+def has_spooled_text(pdf_id: str) -> bool:
+    return os.path.exists(_spool_path(pdf_id))
+
+
+def drop_spooled_text(pdf_id: str):
+    try:
+        os.remove(_spool_path(pdf_id))
+    except FileNotFoundError:
+        pass
+
+
+def _embedded(chunks: list, uuids: list, meta: dict, tenant_id: str, checkpoint=None):
+    """Yields (chunk, vector, metadata, uuid), embedding EMBED_SLICE chunks at a time."""
+    for start in range(0, len(chunks), EMBED_SLICE):
+        if checkpoint:
+            checkpoint()
+        part = chunks[start:start + EMBED_SLICE]
+        vectors = embed_texts(part, tenant_id=tenant_id)
+        for txt, vec, u in zip(part, vectors, uuids[start:start + EMBED_SLICE]):
+            yield txt, vec, meta, u
+
+
+def _store_chunks(chunks: list, tenant_id: str, kb_id: str, pdf_id: str, checkpoint=None):
+    """
+    Embeds and stores only the chunks that are not near duplicates of chunks
+    already in the KB (or earlier in this document). Embedding overlaps with
+    writing; the writer's bounded queue holds embedding back when Weaviate
+    is the slower side. New chunks become reusable by other documents only
+    once they are stored. On failure, whatever was stored for the document
+    is deleted again. Returns (stored, duplicates).
+    """
+    from modules.chunk_dedup import chunk_uuid, fingerprint, get_dedup_index
+    from modules.chunk_writer import ChunkWriter
+
+    dedup = get_dedup_index(tenant_id, kb_id)
+    uuids = [chunk_uuid(tenant_id, kb_id, pdf_id, i) for i in range(len(chunks))]
+    dup_of = dedup.assign(pdf_id, fingerprint(chunks), uuids, checkpoint)
+    new = [i for i, d in enumerate(dup_of) if d is None]
+
+    meta = {"tenant_id": tenant_id, "kb_id": kb_id, "pdf_id": pdf_id}
+    try:
+        writer = ChunkWriter()
+        try:
+            summary = writer.write(_embedded([chunks[i] for i in new], [uuids[i] for i in new], meta, tenant_id,
+                                             checkpoint))
+        finally:
+            writer.close()
+        if summary["failed"]:
+            first = summary["errors"][0]["error"] if summary["errors"] else "unknown error"
+            raise RuntimeError(f"{summary['failed']} of {len(new)} chunks failed to store: {first}")
+    except Exception:
+        # The writer flushes what it had queued, so some chunks may be stored
+        # under a pdf_id that is never recorded; they would still be searched
+        try:
+            delete_where(CLASS_NAME, {"operator": "And", "operands": [
+                {"path": [path], "operator": "Equal", "valueString": value}
+                for path, value in (("tenant_id", tenant_id), ("kb_id", kb_id), ("pdf_id", pdf_id))]})
+        finally:
+            # Otherwise later documents would be deduplicated against chunks never stored
+            dedup.release(pdf_id)
+        raise
+    dedup.commit(pdf_id)
+    return len(new), len(chunks) - len(new)
+
+
+def do_ingest(path: str, tenant_id: str, chunk_size: int = 800, overlap: int = 100,
+              kb_id: str = None, pdf_id: str = None, content_hash: str = None, checkpoint=None,
+              kg: str = "inline", started: float = None):
+    """
+    checkpoint(), if given, is called between stages and embedding slices;
+    it raises to stop the ingest (the worker's cancellation and deadlines).
+    The document is recorded searchable as soon as its chunks are stored;
+    time to searchable counts from `started` (time.monotonic(), default now).
+    kg="inline" then builds the graph here, a failure landing in "kg_error"
+    instead of failing the ingest; kg="deferred" spools the text for
+    build_graphs and returns graph="pending".
+    """
+    if kg not in ("inline", "deferred"):
+        raise ValueError(f"Unknown kg mode {kg!r} (expected inline or deferred)")
+    started = time.monotonic() if started is None else started
+    checkpoint = checkpoint or (lambda: None)
     create_schema()
-    kb_id = get_active_kb(tenant_id)
+    kb_id = kb_id or get_active_kb(tenant_id)
     if kb_id is None:
         raise Exception("No active Knowledge Base selected. Create or activate a KB first.")
 
-    pdf_id = generate_pdf_id()
+    pdf_id = pdf_id or generate_pdf_id()
 
     full_text = read_pdf(path)
+    checkpoint()
     chunks = split_text(full_text, chunk_size, overlap)
-    embeddings = embed_texts(chunks)
-    store_documents(chunks, embeddings, tenant_id, kb_id=kb_id, pdf_id=pdf_id)
-    # Knowledge Graph extraction
+    new, duplicates = _store_chunks(chunks, tenant_id, kb_id, pdf_id, checkpoint)
+    checkpoint()
+
     pdf_name = os.path.basename(path)
-    kg = extract_kg(full_text)
-    kg_result = store_kg(kg, tenant_id, pdf_name, kb_id=kb_id, pdf_id=pdf_id)
-    return {
+    if kg == "deferred":
+        os.makedirs(KG_SPOOL_DIR, exist_ok=True)
+        with open(_spool_path(pdf_id), "w", encoding="utf-8") as f:
+            f.write(full_text)
+    searchable_after = time.monotonic() - started
+    record_document(tenant_id, kb_id, content_hash or file_hash(path), pdf_id, pdf_name,
+                    time_to_searchable=round(searchable_after, 3))
+    log_time_to_searchable(tenant_id, searchable_after)
+    res = {
         "chunks": len(chunks),
+        "stored_chunks": new,
+        "duplicate_chunks": duplicates,
+        "dedup_ratio": duplicates / len(chunks) if chunks else 0.0,
         "kb_id": kb_id,
         "pdf_id": pdf_id,
-        "kg_nodes": kg_result.get("nodes", 0),
-        "kg_edges": kg_result.get("edges", 0),
+        "pdf_name": pdf_name,
+        "time_to_searchable": searchable_after,
+        "graph": "pending",
         "status": "ok"
     }
+    if kg == "inline":
+        try:
+            kg_result = build_graph(full_text, tenant_id, kb_id, pdf_id, pdf_name)
+            res.update(graph="ready", kg_nodes=kg_result.get("nodes", 0), kg_edges=kg_result.get("edges", 0))
+        except Exception as e:
+            res.update(graph="failed", kg_error=str(e))
+    return res
+
+
+def build_graph(full_text: str, tenant_id: str, kb_id: str, pdf_id: str, pdf_name: str) -> dict:
+    """
+    KG stage of one stored document: extract, store, mark it graph_ready.
+    On failure the half-stored graph is purged and the error recorded on the
+    document (graph_error) before re-raising; it stays searchable either way.
+    """
+    from pipelines.deletion import purge_document_graph
+
+    try:
+        kg = extract_kg(full_text, tenant_id=tenant_id)
+        result = store_kg(kg, tenant_id, pdf_name, kb_id=kb_id, pdf_id=pdf_id)
+    except Exception as e:
+        try:
+            purge_document_graph(tenant_id, kb_id, pdf_id)
+        finally:
+            update_document(tenant_id, kb_id, pdf_id, graph_error=str(e))
+        raise
+    if not update_document(tenant_id, kb_id, pdf_id, graph_ready=True,
+                           graph_ready_at=datetime.utcnow().isoformat(), graph_error=None):
+        # Purged while its graph was being built; don't leave the graph behind
+        purge_document_graph(tenant_id, kb_id, pdf_id)
+    return result
+
+
+def build_graphs(tenant_id: str, kb_id: str, documents: list, progress=None) -> dict:
+    """
+    Deferred KG stage for documents do_ingest(kg="deferred") spooled, one
+    after the other. documents: [{"pdf_id", "pdf_name"}]; each gets a
+    "graph" outcome (ready / failed / skipped) and is not redone when the
+    batch runs again after a throttle. A failed document doesn't stop the
+    others; its text stays spooled so the build can be retried.
+    progress(report) is called before each document.
+    """
+    report = {"documents": len(documents), "ready": 0, "failed": 0, "skipped": 0,
+              "kg_nodes": 0, "kg_edges": 0, "errors": []}
+    for i, doc in enumerate(documents):
+        if progress:
+            progress({**report, "done": i})
+        if doc.get("graph") is None:
+            _build_spooled(tenant_id, kb_id, doc)
+        report[doc["graph"]] += 1
+        report["kg_nodes"] += doc.get("kg_nodes", 0)
+        report["kg_edges"] += doc.get("kg_edges", 0)
+        if doc.get("error"):
+            report["errors"].append({"pdf_id": doc["pdf_id"], "error": doc["error"]})
+    return report
+
+
+def _build_spooled(tenant_id: str, kb_id: str, doc: dict):
+    pdf_id = doc["pdf_id"]
+    if get_document(tenant_id, kb_id, pdf_id) is None:
+        # Purged (or its KB deleted) since it was ingested
+        drop_spooled_text(pdf_id)
+        doc["graph"] = "skipped"
+        return
+    try:
+        with open(_spool_path(pdf_id), "r", encoding="utf-8") as f:
+            full_text = f.read()
+        result = build_graph(full_text, tenant_id, kb_id, pdf_id, doc["pdf_name"])
+    except RateLimitedError:
+        # The whole job is requeued; this document is built again then
+        raise
+    except Exception as e:
+        doc.update(graph="failed", error=str(e))
+        return
+    drop_spooled_text(pdf_id)
+    doc.update(graph="ready", kg_nodes=result.get("nodes", 0), kg_edges=result.get("edges", 0))
+
 
-def ingest_pdf(path: str, tenant_id: str, chunk_size: int = 800, overlap: int = 100):
-    res = do_ingest(path, tenant_id, chunk_size, overlap)
+def ingest_pdf(path: str, tenant_id: str, chunk_size: int = 800, overlap: int = 100, profile: str = None):
+    with profiled(f"ingest-{os.path.splitext(os.path.basename(path))[0]}", profile):
+        res = do_ingest(path, tenant_id, chunk_size, overlap)
     log_ingestion(tenant_id, res["chunks"], os.path.basename(path), kb_id=res["kb_id"], pdf_id=res["pdf_id"])
     return res
\ No newline at end of file
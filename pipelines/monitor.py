@@ -1,14 +1,32 @@
 """
 Tenant-level monitoring utilities.
-Tracks per-tenant ingestion count, query count, chunk volume, and timestamps.
+Tracks per-tenant ingestion count, query count, chunk volume, and timestamps,
+and time-to-searchable: seconds from an ingest being submitted to its chunks
+being queryable (the knowledge graph is built after that, see pipelines/ingestion.py).
 """
 
 import json
 import os
+import threading
+import functools
 from datetime import datetime
 
 MONITOR_FILE = os.path.join(os.path.dirname(__file__), "monitor_data.json")
 
+# Time-to-searchable samples kept per tenant for the percentiles
+SEARCHABLE_SAMPLES = 200
+
+# Several worker threads log concurrently; serialize the read-modify-write cycles
+_LOCK = threading.RLock()
+
+
+def _locked(fn):
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with _LOCK:
+            return fn(*args, **kwargs)
+    return wrapper
+
 
 def _load():
     if not os.path.exists(MONITOR_FILE):
@@ -22,6 +40,7 @@ def _save(data):
         json.dump(data, f, indent=2)
 
 
+@_locked
 def log_ingestion(tenant_id: str, chunks: int, filename: str):
     data = _load()
     if tenant_id not in data:
@@ -42,7 +61,8 @@ def log_ingestion(tenant_id: str, chunks: int, filename: str):
     _save(data)
 
 
-def log_query(tenant_id: str, query_text: str):
+@_locked
+def log_query(tenant_id: str, query_text: str, count: int = 1):
     data = _load()
     if tenant_id not in data:
         data[tenant_id] = {
@@ -55,12 +75,13 @@ def log_query(tenant_id: str, query_text: str):
         }
 
     entry = data[tenant_id]
-    entry["queries"] += 1
+    entry["queries"] += count
     entry["last_query"] = f"{datetime.utcnow().isoformat()} | {query_text[:80]}"
 
     _save(data)
 
 
+@_locked
 def log_job_start(tenant_id: str, job_id: str, filename: str):
     data = _load()
     if tenant_id not in data:
@@ -89,6 +110,7 @@ def log_job_start(tenant_id: str, job_id: str, filename: str):
     _save(data)
 
 
+@_locked
 def log_job_end(tenant_id: str, job_id: str, success: bool, error_message: str = None, chunks: int = None):
     data = _load()
     if tenant_id not in data or "jobs" not in data[tenant_id] or job_id not in data[tenant_id]["jobs"]:
@@ -103,5 +125,32 @@ def log_job_end(tenant_id: str, job_id: str, success: bool, error_message: str =
     _save(data)
 
 
+@_locked
+def log_time_to_searchable(tenant_id: str, seconds: float):
+    data = _load()
+    if tenant_id not in data:
+        data[tenant_id] = {
+            "ingestions": 0,
+            "queries": 0,
+            "chunks": 0,
+            "last_ingest": None,
+            "last_query": None,
+            "jobs": {}
+        }
+
+    entry = data[tenant_id].setdefault("time_to_searchable", {"count": 0, "recent": []})
+    entry["count"] += 1
+    recent = (entry["recent"] + [round(seconds, 3)])[-SEARCHABLE_SAMPLES:]
+    ordered = sorted(recent)
+    entry["recent"] = recent
+    entry["last"] = recent[-1]
+    entry["p50"] = ordered[len(ordered) // 2]
+    entry["p95"] = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    entry["max"] = max(entry.get("max", 0.0), recent[-1])
+
+    _save(data)
+
+
+@_locked
 def get_stats():
     return _load()
\ No newline at end of file
@@ -1,94 +1,325 @@
 """
-Query pipeline: query → embedding → vector search → LLM answer.
+Query pipeline: query → embedding → vector search (+ linked KG facts) → LLM answer.
+answer_query_stream yields the answer as it is generated;
+answer_queries / answer_queries_file run the same pipeline over many questions at once.
+A single question runs within a latency budget (QUERY_BUDGET_SECONDS); if
+generation can't answer in time, the answer falls back to the top passages.
 """
 
-from modules.embedding_gemini import embed_texts
+import json
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from modules.embedding_gemini import embed_query, embed_texts_batched, BATCH_LIMIT
 from modules.store_weaviate import query_embeddings
-from modules.generator_gemini import generate_answer
+from modules.generator_gemini import generate_answer, generate_answer_stream, DeadlineExceeded
+from modules.knowledge_base_manager import get_active_kb
+from modules.profiling import profiled
 from pipelines.monitor import log_query
-from modules.store_weaviate import get_client
 
+# Prompt context budget (characters): chunks fill what the KG facts leave over
+PROMPT_CONTEXT_CHARS = int(os.getenv("PROMPT_CONTEXT_CHARS", "6000"))
+KG_FACTS_CHARS = int(os.getenv("KG_FACTS_CHARS", "1200"))
+# Seconds answer_query may take end to end, retrieval included
+QUERY_BUDGET = float(os.getenv("QUERY_BUDGET_SECONDS", "30"))
+# Passages returned instead of an answer when generation misses the budget
+FALLBACK_PASSAGES = 3
+FALLBACK_PASSAGE_CHARS = 600
+# Questions per embedding call in answer_queries; a failed call only fails its own questions
+EMBED_BATCH = BATCH_LIMIT
 
-def query_kg(term: str, tenant_id: str) -> str:
-    client = get_client()
 
-    # Semantic search for KG_Node
-    node_res = (
-        client.query.get("KG_Node", ["node_id", "label", "type"])
-        .with_where({
-            "path": ["tenant_id"],
-            "operator": "Equal",
-            "valueString": tenant_id,
-        })
-        .with_near_text({"concepts": [term]})
-        .with_limit(5)
-        .do()
-    )
+def query_kg(term: str, tenant_id: str, kb_id: str = None, hops: int = 1, limit: int = 5) -> str:
+    """
+    Finds the nodes for a term in the active KB: exact label matches from the
+    in-memory graph index first, then near_vector over the embedded node
+    labels. Lists them with the edges within `hops` of them.
+    """
+    from modules.kg_index import get_kg_index
+    from modules.kg_store import search_nodes
 
-    nodes = node_res.get("data", {}).get("Get", {}).get("KG_Node", [])
+    kb_id = kb_id or get_active_kb(tenant_id)
+    if kb_id is None:
+        return "No active Knowledge Base selected."
 
-    if not nodes:
+    index = get_kg_index(tenant_id, kb_id, wait=False)
+    if index is None:
+        return "The KG index for this Knowledge Base is being rebuilt; try again shortly."
+    seeds = index.lookup(term, limit=limit)
+
+    if len(seeds) < limit:
+        term_emb = embed_query(term, tenant_id=tenant_id)
+        for n in search_nodes(term_emb, tenant_id, kb_id, limit=limit):
+            idx = index.find(n.get("pdf_id"), n.get("node_id"))
+            if idx is not None and idx not in seeds:
+                seeds.append(idx)
+        seeds = seeds[:limit]
+
+    if not seeds:
         return "No KG information found for this term."
 
-    node_lines = [f"Node: {n.get('label')} (id={n.get('node_id')})" for n in nodes]
-
-    # Fetch edges for each node
-    edge_lines = []
-    for n in nodes:
-        nid = n.get("node_id")
-
-        edge_res = (
-            client.query.get("KG_Edge", ["source", "target", "relation"])
-            .with_where({
-                "operator": "And",
-                "operands": [
-                    {
-                        "path": ["tenant_id"],
-                        "operator": "Equal",
-                        "valueString": tenant_id,
-                    },
-                    {
-                        "operator": "Or",
-                        "operands": [
-                            {
-                                "path": ["source"],
-                                "operator": "Equal",
-                                "valueString": nid,
-                            },
-                            {
-                                "path": ["target"],
-                                "operator": "Equal",
-                                "valueString": nid,
-                            },
-                        ],
-                    },
-                ],
-            })
-            .do()
-        )
-
-        edges = edge_res.get("data", {}).get("Get", {}).get("KG_Edge", [])
-
-        for e in edges:
-            edge_lines.append(
-                f"{e.get('source')} -[{e.get('relation')}]-> {e.get('target')}"
-            )
+    node_lines = [f"Node: {index.labels[i]} (id={index.node_ids[i]})" for i in seeds]
+
+    # Edges touching anything within hops - 1 of the seeds reach out to `hops`
+    nodes = list(index.k_hop(seeds, k=hops - 1))
+    edge_lines = [
+        f"{index.node_ids[s]} -[{rel}]-> {index.node_ids[t]}"
+        for s, rel, t in dict.fromkeys(index.facts(nodes))
+    ]
 
     return "\n".join(node_lines + edge_lines)
 
 
-def answer_query(query: str, tenant_id: str, top_k: int = 5) -> str:
+def kg_facts(query: str, tenant_id: str, kb_id: str = None, budget: int = KG_FACTS_CHARS) -> list:
+    """
+    1-hop facts about the KG entities mentioned in the question, as
+    "label -[relation]-> label" lines, up to `budget` characters. Empty while
+    the KB's graph index is being rebuilt.
+    """
+    from modules.entity_linker import link_entities
+    from modules.kg_index import get_kg_index
+
+    kb_id = kb_id or get_active_kb(tenant_id)
+    if kb_id is None or budget <= 0:
+        return []
+
+    # A cold index is rebuilt in the background rather than within the query budget
+    index = get_kg_index(tenant_id, kb_id, wait=False)
+    if index is None:
+        return []
+    seeds = link_entities(index, query)
+    if not seeds:
+        return []
+
+    lines, used = [], 0
+    for s, rel, t in dict.fromkeys(index.facts(seeds, limit=200)):
+        line = f"{index.labels[s]} -[{rel}]-> {index.labels[t]}"
+        if used + len(line) + 1 > budget:
+            break
+        lines.append(line)
+        used += len(line) + 1
+    return lines
+
+
+def answer_query(query: str, tenant_id: str, top_k: int = 5, budget: float = None,
+                 profile: str = None, on_profile=None) -> str:
+    """
+    budget: seconds for the whole question (default QUERY_BUDGET). When
+    generation misses it, the top retrieved passages are returned instead.
+    profile (default PROFILE_MODE) profiles this call; on_profile(report)
+    receives the summary (see modules/profiling.py).
+    """
+    with profiled(f"query-{uuid.uuid4().hex[:12]}", profile, on_report=on_profile):
+        return _answer_query(query, tenant_id, top_k, budget)
+
+
+def _answer_query(query: str, tenant_id: str, top_k: int, budget: float) -> str:
+    deadline = time.monotonic() + (budget or QUERY_BUDGET)
     if query.lower().startswith("kg "):
         term = query[3:].strip()
         return query_kg(term, tenant_id)
 
-    q_emb = embed_texts([query])[0]
+    prompt, hits = _retrieve_prompt(query, tenant_id, top_k)
+    log_query(tenant_id, query)
+    try:
+        return generate_answer(prompt, tenant_id=tenant_id, deadline=deadline)
+    except DeadlineExceeded:
+        return _fallback_answer(hits)
+
+
+def answer_query_stream(query: str, tenant_id: str, top_k: int = 5, budget: float = None,
+                        profile: str = None, on_profile=None):
+    """
+    Same as answer_query, but yields the answer in pieces as Gemini generates it.
+    The budget covers the time to the first piece.
+    """
+    deadline = time.monotonic() + (budget or QUERY_BUDGET)
+    with profiled(f"query-{uuid.uuid4().hex[:12]}", profile, on_report=on_profile):
+        if query.lower().startswith("kg "):
+            yield query_kg(query[3:].strip(), tenant_id)
+            return
+
+        prompt, hits = _retrieve_prompt(query, tenant_id, top_k)
+        log_query(tenant_id, query)
+        try:
+            # Only raised before the first piece, so there is nothing to take back
+            yield from generate_answer_stream(prompt, tenant_id=tenant_id, deadline=deadline)
+        except DeadlineExceeded:
+            yield _fallback_answer(hits)
+
 
+def _retrieve_prompt(query: str, tenant_id: str, top_k: int) -> tuple:
+    q_emb = embed_query(query, tenant_id=tenant_id)
     hits = query_embeddings(q_emb, top_k=top_k, tenant_id=tenant_id)
+    return _build_prompt(query, hits, kg_facts(query, tenant_id)), hits
 
-    context = "\n".join([h.get("text", "") for h in hits])
 
-    prompt = f"Use the context below to answer the question.\n\nContext:\n{context}\n\nQuestion: {query}\nAnswer:"
+def _fallback_answer(hits: list) -> str:
+    passages = [h.get("text", "").strip() for h in hits[:FALLBACK_PASSAGES]]
+    passages = [p for p in passages if p]
+    if not passages:
+        return "No answer could be generated in time, and no matching passages were found."
+    lines = ["No answer could be generated in time. The most relevant passages:"]
+    for i, p in enumerate(passages, start=1):
+        cut = p if len(p) <= FALLBACK_PASSAGE_CHARS else p[:FALLBACK_PASSAGE_CHARS].rstrip() + " …"
+        lines.append(f"\n[{i}] {cut}")
+    return "\n".join(lines)
 
-    log_query(tenant_id, query)
-    return generate_answer(prompt)
+
+def _build_prompt(query: str, hits: list, facts: list = None) -> str:
+    facts = facts or []
+    budget = PROMPT_CONTEXT_CHARS - sum(len(f) + 1 for f in facts)
+    texts = []
+    for h in hits:
+        if budget <= 0:
+            break
+        text = h.get("text", "")[:budget]
+        texts.append(text)
+        budget -= len(text) + 1
+    context = "\n".join(texts)
+    if facts:
+        context += "\n\nKnown facts:\n" + "\n".join(facts)
+    return f"Use the context below to answer the question.\n\nContext:\n{context}\n\nQuestion: {query}\nAnswer:"
+
+
+def _normalize_question(query: str) -> str:
+    return " ".join(query.split()).lower()
+
+
+def answer_queries(queries: list, tenant_id: str, top_k: int = 5,
+                   search_workers: int = 8, generate_workers: int = 4):
+    """
+    Batch version of answer_query.
+    Identical questions (ignoring case / whitespace) are answered once, all
+    question embeddings go out in batched calls, vector searches run
+    concurrently and generation runs with bounded concurrency.
+    Yields (index, answer, error) as soon as each answer is ready, in completion order.
+    A failure (a missing question, a failed embedding batch, search or
+    generation) only fails the questions it concerns.
+    """
+    groups = {}
+    for i, q in enumerate(queries):
+        if not isinstance(q, str) or not q.strip():
+            yield i, None, "question is required"
+            continue
+        groups.setdefault(_normalize_question(q), []).append(i)
+
+    kg_keys = [k for k in groups if k.startswith("kg ")]
+    vec_keys = [k for k in groups if not k.startswith("kg ")]
+    # Whitespace-normalized, case kept: the same text the key was derived from
+    texts = {k: " ".join(queries[groups[k][0]].split()) for k in groups}
+    kb_id = get_active_kb(tenant_id)
+
+    def search_and_answer(key, q_emb):
+        hits = query_embeddings(q_emb, top_k=top_k, tenant_id=tenant_id)
+        prompt = _build_prompt(texts[key], hits, kg_facts(texts[key], tenant_id, kb_id))
+        return gen_pool.submit(generate_answer, prompt, tenant_id=tenant_id)
+
+    with ThreadPoolExecutor(max_workers=search_workers) as search_pool, \
+            ThreadPoolExecutor(max_workers=generate_workers) as gen_pool:
+        # future → (is an embedding batch, the question keys it covers)
+        pending = {}
+        for start in range(0, len(vec_keys), EMBED_BATCH):
+            keys = vec_keys[start:start + EMBED_BATCH]
+            fut = search_pool.submit(embed_texts_batched, [texts[k] for k in keys], tenant_id=tenant_id)
+            pending[fut] = (True, keys)
+        for key in kg_keys:
+            pending[search_pool.submit(query_kg, texts[key][3:].strip(), tenant_id)] = (False, [key])
+
+        # A finished embedding batch starts its searches, a finished search
+        # hands back the generation future; wait on those next
+        while pending:
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                embedded, keys = pending.pop(fut)
+                try:
+                    result = fut.result()
+                except Exception as e:
+                    for key in keys:
+                        for i in groups[key]:
+                            yield i, None, str(e)
+                    continue
+                if embedded:
+                    for key, q_emb in zip(keys, result):
+                        pending[search_pool.submit(search_and_answer, key, q_emb)] = (False, [key])
+                    continue
+                if isinstance(result, Future):
+                    pending[result] = (False, keys)
+                    continue
+                for i in groups[keys[0]]:
+                    yield i, result, None
+
+    log_query(tenant_id, f"[batch] {len(queries)} questions", count=len(queries))
+
+
+def _resume_output(out_path: str) -> set:
+    """
+    Ids already answered in an existing output file. A torn last line from
+    an interrupted run is cut off, and rows with an error are removed: those
+    questions are retried and their new rows take the old ones' place.
+    """
+    if not os.path.exists(out_path):
+        return set()
+
+    with open(out_path, "rb") as f:
+        data = f.read()
+    keep = data.rfind(b"\n") + 1
+
+    done, rows, dropped = set(), [], keep < len(data)
+    for line in data[:keep].decode("utf-8").splitlines(keepends=True):
+        if not line.strip():
+            continue
+        row = json.loads(line)
+        if row.get("error") is None:
+            done.add(row["id"])
+            rows.append(line)
+        else:
+            dropped = True
+
+    if dropped:
+        tmp = out_path + ".tmp"
+        with open(tmp, "w") as f:
+            f.writelines(rows)
+        os.replace(tmp, out_path)
+    return done
+
+
+def answer_queries_file(in_path: str, out_path: str, tenant_id: str, top_k: int = 5,
+                        generate_workers: int = 4, on_answer=None) -> dict:
+    """
+    JSONL in, JSONL out. Each input line is {"id": ..., "question": ...}
+    (a bare string or a missing id is also accepted; the line number becomes the id).
+    Results are appended as they complete, so an interrupted run resumes
+    where it stopped when called again with the same output file.
+    """
+    rows = []
+    with open(in_path, "r") as f:
+        for line_no, line in enumerate(f):
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            if isinstance(item, str):
+                item = {"question": item}
+            question = item.get("question") or item.get("query")
+            rows.append({"id": item.get("id", line_no), "question": question})
+
+    done = _resume_output(out_path)
+    todo = [r for r in rows if r["id"] not in done]
+
+    summary = {"total": len(rows), "skipped": len(rows) - len(todo), "answered": 0, "failed": 0}
+    if not todo:
+        return summary
+
+    with open(out_path, "a") as out:
+        results = answer_queries([r["question"] for r in todo], tenant_id, top_k=top_k,
+                                 generate_workers=generate_workers)
+        for i, answer, error in results:
+            row = {"id": todo[i]["id"], "question": todo[i]["question"], "answer": answer, "error": error}
+            out.write(json.dumps(row) + "\n")
+            out.flush()
+            summary["failed" if error else "answered"] += 1
+            if on_answer:
+                on_answer(summary)
+
+    return summary
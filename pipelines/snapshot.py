@@ -0,0 +1,290 @@
+"""
+KB snapshots: a knowledge base's Weaviate objects exported to a directory and
+imported into another KB or environment, with no re-embedding or KG extraction.
+
+A snapshot directory holds:
+  <Class>.jsonl     one object per line, {"id", properties...} without tenant_id / kb_id
+  <Class>.npy       float32 (count, dim) vectors, row i belongs to line i
+                    (DocumentChunk and KG_Node; KG_Edge has no vectors)
+  documents.json    the KB's document registry
+  state/            the KB's entity resolver and near-duplicate index files
+  manifest.json     format version, source tenant / KB, per-class counts and the
+                    byte size of every file. Written last: no manifest, no snapshot.
+
+Export walks each class with cursor pagination; vectors go straight into a
+memory-mapped .npy sized from a count taken first, so memory stays at one
+page. Import streams the files back through ChunkWriter's batched writes.
+Object ids are kept when restoring into the source KB, and re-derived
+(uuid5 of the target KB and the old id) otherwise, so importing a copy never
+overwrites the original. Run it with no ingests into the KB in progress.
+"""
+
+import json
+import os
+import shutil
+import time
+import uuid
+from datetime import datetime
+
+from modules.store_weaviate import (CLASS_NAME, create_schema, class_exists, class_properties, count_where,
+                                    iter_objects)
+from modules.knowledge_base_manager import create_kb, delete_kb, list_kb, list_documents, set_documents
+from pipelines.deletion import purge_kb
+
+SNAPSHOT_FORMAT = "haystack-kb-snapshot"
+SNAPSHOT_VERSION = 1
+# Objects per cursor page on export
+EXPORT_PAGE_SIZE = int(os.getenv("SNAPSHOT_PAGE_SIZE", "1000"))
+
+# (class, has vectors)
+SNAPSHOT_CLASSES = [(CLASS_NAME, True), ("KG_Node", True), ("KG_Edge", False)]
+# Set from the target on import
+_SCOPE = ("tenant_id", "kb_id")
+MANIFEST = "manifest.json"
+DOCUMENTS = "documents.json"
+
+
+def _kb_filter(tenant_id: str, kb_id: str) -> dict:
+    return {"operator": "And", "operands": [
+        {"path": ["tenant_id"], "operator": "Equal", "valueString": tenant_id},
+        {"path": ["kb_id"], "operator": "Equal", "valueString": kb_id},
+    ]}
+
+
+def _state_files(tenant_id: str, kb_id: str) -> dict:
+    """Snapshot name → local path of the KB's resolver and dedup index files."""
+    from modules.chunk_dedup import DEDUP_DIR
+    from modules.entity_resolution import KG_ENTITY_DIR
+
+    entities = os.path.join(KG_ENTITY_DIR, tenant_id, kb_id)
+    dedup = os.path.join(DEDUP_DIR, tenant_id, kb_id)
+    return {
+        "state/entities.json": entities + ".json",
+        "state/entities.npz": entities + ".npz",
+        "state/dedup.sig": dedup + ".sig",
+        "state/dedup.jsonl": dedup + ".jsonl",
+    }
+
+
+# ---------- export ----------
+
+def _export_class(class_name: str, with_vector: bool, tenant_id: str, kb_id: str, out_dir: str,
+                  progress=None) -> dict:
+    import numpy as np
+    from numpy.lib.format import open_memmap
+
+    total = count_where(class_name, _kb_filter(tenant_id, kb_id))
+    entry = {"count": 0, "objects": f"{class_name}.jsonl", "vectors": None, "dim": None}
+    vec_path = os.path.join(out_dir, f"{class_name}.npy")
+    vectors = None
+    with open(os.path.join(out_dir, entry["objects"]), "w", encoding="utf-8") as f:
+        for obj in iter_objects(class_name, class_properties(class_name), with_vector=with_vector,
+                                page_size=EXPORT_PAGE_SIZE):
+            # Cursors can't filter; the class holds every tenant's KBs
+            if obj.get("tenant_id") != tenant_id or obj.get("kb_id") != kb_id:
+                continue
+            extra = obj.pop("_additional")
+            row = entry["count"]
+            if with_vector:
+                if vectors is None:
+                    entry["vectors"], entry["dim"] = os.path.basename(vec_path), len(extra["vector"])
+                    vectors = open_memmap(vec_path, mode="w+", dtype=np.float32, shape=(total, entry["dim"]))
+                if row >= total:
+                    raise RuntimeError(f"{class_name} objects were added to the KB during export; run it again "
+                                       f"with no ingests in progress")
+                vectors[row] = extra["vector"]
+            record = {"id": extra["id"], **{k: v for k, v in obj.items() if k not in _SCOPE}}
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            entry["count"] += 1
+            if progress and entry["count"] % EXPORT_PAGE_SIZE == 0:
+                progress({"class": class_name, "done": entry["count"], "total": total})
+
+    if vectors is not None:
+        vectors.flush()
+        del vectors
+        if entry["count"] < total:
+            # Objects deleted since the count: cut the unused rows off
+            rows = np.load(vec_path, mmap_mode="r")[:entry["count"]]
+            np.save(vec_path + ".tmp.npy", rows)
+            del rows
+            os.replace(vec_path + ".tmp.npy", vec_path)
+    if progress:
+        progress({"class": class_name, "done": entry["count"], "total": entry["count"]})
+    return entry
+
+
+def _export_state(tenant_id: str, kb_id: str, out_dir: str) -> list:
+    from modules.chunk_dedup import get_dedup_index
+    from modules.entity_resolution import get_resolver
+
+    copied = []
+    os.makedirs(os.path.join(out_dir, "state"), exist_ok=True)
+    resolver = get_resolver(tenant_id, kb_id)
+    # Under their locks, so a concurrent save / append can't tear the copy
+    with resolver.lock, get_dedup_index(tenant_id, kb_id).lock:
+        if resolver.logged:
+            # Fold the resolver's log into its state files, which are what a snapshot carries
+            resolver.save()
+        for name, path in _state_files(tenant_id, kb_id).items():
+            if os.path.exists(path):
+                shutil.copyfile(path, os.path.join(out_dir, name))
+                copied.append(name)
+    return copied
+
+
+def export_kb(tenant_id: str, kb_id: str, out_dir: str, progress=None) -> dict:
+    """
+    Writes a snapshot of the KB to out_dir (created; must not already hold
+    one). progress({"class", "done", "total"}) is called per page.
+    Returns the manifest plus "seconds".
+    """
+    kb = list_kb(tenant_id).get(kb_id)
+    if kb is None:
+        raise ValueError(f"Unknown KB {kb_id!r}")
+    if os.path.exists(os.path.join(out_dir, MANIFEST)):
+        raise FileExistsError(f"{out_dir} already holds a snapshot")
+    os.makedirs(out_dir, exist_ok=True)
+
+    t0 = time.monotonic()
+    classes = {}
+    for class_name, with_vector in SNAPSHOT_CLASSES:
+        if class_exists(class_name):
+            classes[class_name] = _export_class(class_name, with_vector, tenant_id, kb_id, out_dir, progress)
+    with open(os.path.join(out_dir, DOCUMENTS), "w", encoding="utf-8") as f:
+        json.dump(list_documents(tenant_id, kb_id), f)
+    state = _export_state(tenant_id, kb_id, out_dir)
+
+    names = [DOCUMENTS] + state + [n for e in classes.values() for n in (e["objects"], e["vectors"]) if n]
+    manifest = {
+        "format": SNAPSHOT_FORMAT,
+        "version": SNAPSHOT_VERSION,
+        "created_at": datetime.utcnow().isoformat(),
+        "tenant_id": tenant_id,
+        "kb_id": kb_id,
+        "kb_name": kb.get("kb_name"),
+        "classes": classes,
+        "files": {n: os.path.getsize(os.path.join(out_dir, n)) for n in names},
+    }
+    with open(os.path.join(out_dir, MANIFEST + ".tmp"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(os.path.join(out_dir, MANIFEST + ".tmp"), os.path.join(out_dir, MANIFEST))
+    return {**manifest, "seconds": time.monotonic() - t0}
+
+
+# ---------- import ----------
+
+def read_manifest(snapshot_dir: str) -> dict:
+    """The snapshot's manifest, after checking format, version and file sizes."""
+    path = os.path.join(snapshot_dir, MANIFEST)
+    if not os.path.exists(path):
+        raise ValueError(f"{snapshot_dir} is not a complete snapshot (no {MANIFEST})")
+    with open(path, "r") as f:
+        manifest = json.load(f)
+    if manifest.get("format") != SNAPSHOT_FORMAT or manifest.get("version") != SNAPSHOT_VERSION:
+        raise ValueError(f"Unsupported snapshot format {manifest.get('format')!r} "
+                         f"version {manifest.get('version')!r}")
+    for name, size in manifest["files"].items():
+        file_path = os.path.join(snapshot_dir, name)
+        if not os.path.exists(file_path) or os.path.getsize(file_path) != size:
+            raise ValueError(f"Snapshot file {name} is missing or truncated")
+    return manifest
+
+
+def _import_class(class_name: str, entry: dict, snapshot_dir: str, tenant_id: str, kb_id: str, remap,
+                  progress=None) -> int:
+    import numpy as np
+    from modules.chunk_writer import ChunkWriter
+
+    vectors = None
+    if entry["vectors"]:
+        vectors = np.load(os.path.join(snapshot_dir, entry["vectors"]), mmap_mode="r")
+    writer = ChunkWriter(class_name=class_name)
+    try:
+        with open(os.path.join(snapshot_dir, entry["objects"]), "r", encoding="utf-8") as f:
+            for row, line in enumerate(f):
+                record = json.loads(line)
+                object_id = remap(record.pop("id"))
+                record.update(tenant_id=tenant_id, kb_id=kb_id)
+                writer.add(record, None if vectors is None else vectors[row], object_id)
+                if progress and (row + 1) % EXPORT_PAGE_SIZE == 0:
+                    progress({"class": class_name, "done": row + 1, "total": entry["count"]})
+    finally:
+        summary = writer.close()
+    if summary["failed"]:
+        first = summary["errors"][0]["error"] if summary["errors"] else "unknown error"
+        raise RuntimeError(f"{summary['failed']} of {entry['count']} {class_name} objects failed to import: {first}")
+    if progress:
+        progress({"class": class_name, "done": entry["count"], "total": entry["count"]})
+    return summary["inserted"]
+
+
+def _import_state(snapshot_dir: str, names: list, tenant_id: str, kb_id: str, remap):
+    targets = _state_files(tenant_id, kb_id)
+    for name in names:
+        source, target = os.path.join(snapshot_dir, name), targets[name]
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        if name != "state/dedup.jsonl":
+            shutil.copyfile(source, target)
+            continue
+        # The dedup log names stored chunks by object id
+        with open(source, "r") as src, open(target, "w") as dst:
+            for line in src:
+                if not line.endswith("\n"):
+                    break  # torn last line, as the index itself would skip it
+                event = json.loads(line)
+                for key in ("add", "ref"):
+                    if key in event:
+                        event[key] = remap(event[key])
+                dst.write(json.dumps(event) + "\n")
+
+
+def import_kb(snapshot_dir: str, tenant_id: str, kb_id: str = None, kb_name: str = None, progress=None) -> dict:
+    """
+    Loads a snapshot into a new KB of the tenant (named kb_name, default the
+    source KB's name), or restores it into an existing kb_id, whose current
+    objects, graph index and state are purged first. If the import fails,
+    the target KB is left empty (a KB created for it is deleted again).
+    Returns {"kb_id", "classes": {class: objects}, "bytes", "seconds"}.
+    """
+    from modules.kg_index import drop_kg_index
+    from modules.kg_store import create_kg_schema
+
+    manifest = read_manifest(snapshot_dir)
+    t0 = time.monotonic()
+    created = kb_id is None
+    if created:
+        kb_id = create_kb(tenant_id, kb_name or manifest["kb_name"] or "imported")
+    elif kb_id not in list_kb(tenant_id):
+        raise ValueError(f"Unknown KB {kb_id!r}")
+
+    if (tenant_id, kb_id) == (manifest["tenant_id"], manifest["kb_id"]):
+        def remap(object_id):
+            return object_id
+    else:
+        def remap(object_id):
+            return str(uuid.uuid5(uuid.NAMESPACE_URL, f"{tenant_id}/{kb_id}/{object_id}"))
+
+    try:
+        if not created:
+            purge_kb(tenant_id, kb_id)
+        create_schema()
+        create_kg_schema()
+        imported = {}
+        for class_name, entry in manifest["classes"].items():
+            imported[class_name] = _import_class(class_name, entry, snapshot_dir, tenant_id, kb_id, remap, progress)
+
+        _import_state(snapshot_dir, [n for n in manifest["files"] if n.startswith("state/")], tenant_id, kb_id, remap)
+        with open(os.path.join(snapshot_dir, DOCUMENTS), "r", encoding="utf-8") as f:
+            set_documents(tenant_id, kb_id, json.load(f))
+    except Exception:
+        # A half-imported KB would otherwise pass for a complete one
+        purge_kb(tenant_id, kb_id)
+        if created:
+            delete_kb(tenant_id, kb_id)
+        else:
+            set_documents(tenant_id, kb_id, {})
+        raise
+    # Rebuilt from the imported objects on next use
+    drop_kg_index(tenant_id, kb_id)
+    return {"kb_id": kb_id, "classes": imported, "bytes": sum(manifest["files"].values()),
+            "seconds": time.monotonic() - t0}